@@ -10,23 +10,48 @@
 # distributed on an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF
 # ANY KIND, either express or implied. See the License for the specific
 # language governing permissions and limitations under the License.
+import ast
+import asyncio
+import collections
 import contextlib
 import errno
+import fcntl
+import gc
+import hashlib
+import http.client
+import http.server
 import importlib
+import importlib.abc
+import importlib.metadata
+import importlib.util
+import io
 import threading
 import inspect
 import os
 import json
+import py_compile
+import resource
 import runpy
 import shutil
+import signal
+import statistics
 import subprocess
 import sys
+import sysconfig
+import tarfile
+import tempfile
+import time
 import multiprocessing
+import multiprocessing.connection
+import multiprocessing.forkserver
+import typing
+import urllib.request
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from multiprocessing import shared_memory
 from pathlib import Path
-from urllib.parse import urlparse
-from typing import Tuple, Callable, Any
-
-import boto3
+from urllib.parse import unquote, urlparse
+from typing import Tuple, Callable, Any, Optional
 
 OPT_ML = os.path.join("/opt", "ml")
 OPT_BRAKET = os.path.join("/opt", "braket")
@@ -35,32 +60,171 @@ ORIGINAL_CUSTOMER_CODE_PATH = os.path.join(CUSTOMER_CODE_PATH, "original")
 EXTRACTED_CUSTOMER_CODE_PATH = os.path.join(CUSTOMER_CODE_PATH, "extracted")
 ERROR_LOG_PATH = os.path.join(OPT_ML, "output")
 ERROR_LOG_FILE = os.path.join(ERROR_LOG_PATH, "failure")
+TIMING_REPORT_FILE = os.path.join(ERROR_LOG_PATH, "braket_container_timings.json")
+RESOURCE_SAMPLES_FILE = os.path.join(ERROR_LOG_PATH, "braket_container_resources.jsonl")
+IMPORT_PROFILE_FILE = os.path.join(ERROR_LOG_PATH, "braket_container_imports.json")
+PROFILE_OUTPUT_PATH = os.path.join(ERROR_LOG_PATH, "data", "profile")
 SETUP_SCRIPT_PATH = os.path.join(OPT_BRAKET, "additional_setup")
+RESOURCE_CONFIG_FILE = os.path.join(OPT_ML, "input", "config", "resourceconfig.json")
+ARCHIVE_COMPRESSION_TYPES = ["gzip", "zip"]
+STREAM_CHUNK_SIZE = 8 * 1024 * 1024
+WARM_POOL_CACHE_PATH = os.path.join(OPT_ML, "sagemaker", "warmpoolcache")
+CACHE_ENTRY_FILE = "entry.json"
+DEFAULT_CODE_CACHE_MAX_BYTES = 10 * 1024 ** 3
+DEFAULT_DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+DEFAULT_DOWNLOAD_CONCURRENCY = 8
+DOWNLOAD_RANGE_ATTEMPTS = 5
+DOWNLOAD_PROGRESS_SUFFIX = ".parts"
+DOWNLOAD_ETAG_SUFFIX = ".etag"
+DEFAULT_REQUIREMENTS_CACHE_MAX_BYTES = 10 * 1024 ** 3
+DEFAULT_PREIMPORT_MODULES = "braket.aws,pennylane,torch,tensorflow,cudaq"
+DEFAULT_WARM_UP_TIMEOUT = 300
+ZYGOTE_FREEZE_MODULE = "_braket_zygote_freeze"
+FICLONE = 0x40049409
+FAILURE_JOURNAL_KEEP_RECORDS = 20
+FAILURE_LOG_MAX_BYTES = 64 * 1024
+EXTRACT_INLINE_FILE_SIZE = 64 * 1024 * 1024
+EXTRACT_MAX_PENDING_BYTES = 256 * 1024 * 1024
+DEFAULT_SHARED_MEMORY_MIN_BYTES = 1024 * 1024
+RESOURCE_SAMPLES_IN_FAILURE_LOG = 3
+DEFAULT_SHUTDOWN_GRACE_PERIOD = 60
+SHUTDOWN_SIGNALS = (signal.SIGTERM, signal.SIGINT)
+DEFAULT_SETUP_BARRIER_TIMEOUT = 3600
+DEFAULT_LOOP_LAG_INTERVAL = 0.1
+DEFAULT_IMPORT_PROFILE_TOP = 20
+PROFILERS = ["cprofile", "sampler", "tracemalloc"]
+DEFAULT_PROFILER_INTERVAL = 0.01
+DEFAULT_TRACEMALLOC_FRAMES = 10
+TRACEMALLOC_TOP_ALLOCATIONS = 50
+DEFAULT_DISTRIBUTION_PORT = 8471
+DEFAULT_DISTRIBUTION_TIMEOUT = 600
+DISTRIBUTION_FETCH_ATTEMPTS = 3
 
 _local = threading.local()
-_error_log_lock = threading.Lock()
 _path_lock = threading.Lock()
 _chdir_lock = threading.Lock()
 _unpack_lock = threading.Lock()
+_phase_lock = threading.Lock()
+_phase_timings = []
+_code_manifest = None
+_customer_launch = {}
+_shared_memory_blocks = []
+_attached_shared_memory = []
+_shutdown_hooks = []
+_event_loop_monitors = []
+_import_profiler = None
+_warm_up_lock = threading.Lock()
+_warm_up_processes = set()
+_warm_ups_stopped = threading.Event()
+
+# boto3 is imported on first use, so that jobs with local code sources never pay for it.
+boto3 = None
 
-print("Boto3 Version: ", boto3.__version__)
+
+def _failure_journal_file() -> str:
+    return f"{ERROR_LOG_FILE}.journal"
 
 
 def _log_failure(*args, display=True):
     """
     Log failures to a file so that it can be parsed by the backend service and included in
-    failure messages for a job.
+    failure messages for a job. Each failure is appended to a journal as a single record tagged
+    with the MPI rank, process and setup phase, so that concurrent writers in other processes
+    do not interleave, and the journal is then compacted into the failure file.
 
     Args:
         args: variable list of text to write to the file.
     """
-    with _error_log_lock:
-        Path(ERROR_LOG_PATH).mkdir(parents=True, exist_ok=True)
-        with open(ERROR_LOG_FILE, 'a') as error_log:
-            for text in args:
-                error_log.write(text)
-                if display:
-                    print(text)
+    if display:
+        for text in args:
+            print(text)
+    record = {
+        "time": time.time(),
+        "rank": os.getenv("OMPI_COMM_WORLD_RANK"),
+        "pid": os.getpid(),
+        "phase": getattr(_local, "phase", None),
+        "text": "".join(args)[:FAILURE_LOG_MAX_BYTES],
+    }
+    Path(ERROR_LOG_PATH).mkdir(parents=True, exist_ok=True)
+    fd = os.open(_failure_journal_file(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        # Compaction rewrites the journal in place under an exclusive lock.
+        fcntl.flock(fd, fcntl.LOCK_SH)
+        os.write(fd, (json.dumps(record) + "\n").encode())
+    finally:
+        os.close(fd)
+    compact_failure_journal()
+
+
+def _bound_failure_records(records: list) -> Tuple[list, list, int]:
+    head = records[:FAILURE_JOURNAL_KEEP_RECORDS]
+    tail = records[FAILURE_JOURNAL_KEEP_RECORDS:][-FAILURE_JOURNAL_KEEP_RECORDS:]
+    dropped = len(records) - len(head) - len(tail)
+    while (
+        len(head) + len(tail) > 1
+        and sum(len(record["text"]) for record in head + tail) > FAILURE_LOG_MAX_BYTES
+    ):
+        if len(tail) >= len(head):
+            tail.pop(0)
+        else:
+            head.pop()
+        dropped += 1
+    return head, tail, dropped
+
+
+def compact_failure_journal() -> None:
+    """
+    Compacts the failure journal, keeping the first and last FAILURE_JOURNAL_KEEP_RECORDS
+    records within FAILURE_LOG_MAX_BYTES, and renders it into the failure file in the format
+    the backend service parses. Anything written to the failure file by others (e.g. the
+    customer) is kept ahead of the rendered records: the journal tracks where the rendered
+    records start and how long they are, so text appended after them since the last
+    compaction is moved ahead of them instead of being overwritten.
+    """
+    try:
+        journal = open(_failure_journal_file(), "r+b")
+    except FileNotFoundError:
+        return
+    with journal:
+        fcntl.flock(journal.fileno(), fcntl.LOCK_EX)
+        records = []
+        for line in journal.read().splitlines():
+            with contextlib.suppress(ValueError):
+                records.append(json.loads(line))
+        layout = next((record for record in records if "failure_log_base" in record), None)
+        try:
+            with open(ERROR_LOG_FILE, "rb") as log:
+                current = log.read()
+        except OSError:
+            current = b""
+        if layout is None:
+            foreign = current
+        else:
+            base = min(layout["failure_log_base"], len(current))
+            rendered_end = base + layout.get("rendered", 0)
+            foreign = current[:base] + current[rendered_end:]
+        omitted = sum(record.get("omitted", 0) for record in records)
+        head, tail, dropped = _bound_failure_records(
+            [record for record in records if "text" in record]
+        )
+        omitted += dropped
+        text = "".join(record["text"] for record in head)
+        if omitted:
+            text += f"\n... {omitted} failure records omitted ...\n"
+        text += "".join(record["text"] for record in tail)
+        rendered = text.encode()
+
+        marker = [{"omitted": omitted}] if omitted else []
+        layout = {"failure_log_base": len(foreign), "rendered": len(rendered)}
+        journal.seek(0)
+        journal.truncate()
+        for record in [layout] + head + marker + tail:
+            journal.write((json.dumps(record) + "\n").encode())
+        journal.flush()
+
+        with os.fdopen(os.open(ERROR_LOG_FILE, os.O_WRONLY | os.O_CREAT, 0o644), "wb") as log:
+            log.truncate(0)
+            log.write(foreign + rendered)
 
 
 def log_failure_and_exit(*args):
@@ -75,6 +239,322 @@ def log_failure_and_exit(*args):
     sys.exit(0)
 
 
+def _get_setting(name: str, default: Optional[str] = None) -> Optional[str]:
+    """
+    Returns a container setting. Settings are stored in environment variables, however, we also
+    allow the storing of these values in the hyperparameters to facilitate testing in local mode.
+
+    Args:
+        name (str): the name of the setting.
+        default (Optional[str]): the value to return if the setting is not specified.
+    Returns:
+        Optional[str]: the value of the setting.
+    """
+    value = os.getenv(name)
+    if value:
+        return value
+    hyperparameters_env = os.getenv("SM_HPS")
+    if hyperparameters_env:
+        try:
+            value = json.loads(hyperparameters_env).get(name)
+        except (ValueError, AttributeError):
+            value = None
+        if value not in (None, ""):
+            return str(value)
+    return default
+
+
+def _is_setting_enabled(name: str) -> bool:
+    return (_get_setting(name) or "").strip().lower() in ["1", "true", "yes", "on"]
+
+
+def _record_phase(name: str, start: float, end: float, **details) -> None:
+    with _phase_lock:
+        _phase_timings.append(
+            {"phase": name, "start": start, "end": end, "duration": end - start, **details}
+        )
+
+
+@contextlib.contextmanager
+def _timed_phase(name: str):
+    start = time.time()
+    previous_phase = getattr(_local, "phase", None)
+    _local.phase = name
+    try:
+        yield
+    finally:
+        _local.phase = previous_phase
+        _record_phase(name, start, time.time())
+
+
+def _rank_output_path(path: str) -> str:
+    """
+    Returns the path a report is written to by this process. Under mpirun every rank on the
+    node writes its own reports, so ranks other than local rank 0 tag the file name with their
+    rank.
+    """
+    local_rank = _get_local_rank()
+    if not local_rank:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.rank{local_rank}{extension}"
+
+
+def _write_json_atomic(path: str, data: Any, **kwargs) -> None:
+    """
+    Writes a JSON document through a temporary file in the same directory, so that readers
+    never see a partially written document.
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(
+        "w", dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", delete=False
+    ) as temp_file:
+        try:
+            json.dump(data, temp_file, **kwargs)
+        except BaseException:
+            os.remove(temp_file.name)
+            raise
+    os.replace(temp_file.name, path)
+
+
+def write_timing_report() -> Optional[dict]:
+    """
+    Writes the recorded phase timings as a JSON document under /opt/ml/output and prints each
+    phase as a Braket metric line, so that startup latency can be tracked across jobs and
+    image versions. Under mpirun, each rank writes its own report and only local rank 0 prints
+    the metrics.
+
+    Returns:
+        Optional[dict]: the report, or None if no phases were recorded.
+    """
+    with _phase_lock:
+        phases = sorted(_phase_timings, key=lambda timing: timing["start"])
+    if not phases:
+        return None
+    try:
+        braket_sdk_version = importlib.metadata.version("amazon-braket-sdk")
+    except importlib.metadata.PackageNotFoundError:
+        braket_sdk_version = None
+    start = phases[0]["start"]
+    end = max(timing["end"] for timing in phases)
+    report = {
+        "python_version": sys.version.split()[0],
+        "braket_sdk_version": braket_sdk_version,
+        "start": start,
+        "end": end,
+        "duration": end - start,
+        "phases": phases,
+    }
+    if _get_local_rank() is not None:
+        report["local_rank"] = _get_local_rank()
+    if not _get_local_rank():
+        for timing in phases:
+            print(
+                f"Metrics - timestamp={timing['end']}; "
+                f"container_{timing['phase']}_seconds={timing['duration']:.6f};"
+            )
+    try:
+        _write_json_atomic(_rank_output_path(TIMING_REPORT_FILE), report, indent=2)
+    except OSError as e:
+        print(f"Unable to write timing report.\nException: {e}")
+    return report
+
+
+class _ImportProfiler(importlib.abc.MetaPathFinder):
+    """
+    Times module imports like `python -X importtime`. Placed first on sys.meta_path, it finds
+    each module through the other finders and wraps the loader of the module to time its
+    creation and execution, attributing the time spent in nested imports to the importer's
+    cumulative time but not its self time.
+    """
+
+    def __init__(self):
+        self.modules = {}
+        self.packages = {}
+        self._local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        loader = spec.loader
+        if loader is not None and not isinstance(loader, type):
+            with contextlib.suppress(AttributeError, TypeError):
+                if not getattr(loader, "_braket_import_timed", False):
+                    for method_name in ("create_module", "exec_module"):
+                        method = getattr(loader, method_name, None)
+                        if method is not None:
+                            setattr(loader, method_name, self._timed(method))
+                    loader._braket_import_timed = True
+        return spec
+
+    def _timed(self, method: Callable) -> Callable:
+        # Loaders may be shared by many modules, so the module is taken from the spec passed to
+        # create_module or the module passed to exec_module rather than fixed when wrapping.
+        def timed(target):
+            spec = getattr(target, "__spec__", None) or target
+            name = getattr(spec, "name", None) or getattr(target, "__name__", "<unknown>")
+            stack = self._local.__dict__.setdefault("stack", [])
+            stack.append([name, 0.0])
+            start = time.perf_counter()
+            try:
+                return method(target)
+            finally:
+                cumulative = time.perf_counter() - start
+                _, children = stack.pop()
+                package = name.partition(".")[0]
+                module = self.modules.setdefault(name, {"self": 0.0, "cumulative": 0.0})
+                module["self"] += cumulative - children
+                module["cumulative"] += cumulative
+                package_times = self.packages.setdefault(
+                    package, {"self": 0.0, "cumulative": 0.0}
+                )
+                package_times["self"] += cumulative - children
+                if stack:
+                    stack[-1][1] += cumulative
+                if not stack or stack[-1][0].partition(".")[0] != package:
+                    package_times["cumulative"] += cumulative
+
+        return timed
+
+    def snapshot(self) -> dict:
+        return json.loads(json.dumps({"modules": self.modules, "packages": self.packages}))
+
+
+def _import_profile_since(profiler: _ImportProfiler, snapshot: dict) -> dict:
+    current = profiler.snapshot()
+    for kind, times in current.items():
+        for name, previous in snapshot[kind].items():
+            if times.get(name) == previous:
+                del times[name]
+            elif name in times:
+                times[name] = {
+                    key: times[name][key] - previous[key] for key in ("self", "cumulative")
+                }
+    return current
+
+
+def start_import_profiler() -> Optional[_ImportProfiler]:
+    """
+    Starts timing module imports in this process with AMZN_BRAKET_IMPORT_PROFILE enabled.
+
+    Returns:
+        Optional[_ImportProfiler]: the profiler, or None if import profiling is disabled.
+    """
+    global _import_profiler
+    if not _is_setting_enabled("AMZN_BRAKET_IMPORT_PROFILE"):
+        return None
+    if _import_profiler is None:
+        _import_profiler = _ImportProfiler()
+    if _import_profiler not in sys.meta_path:
+        sys.meta_path.insert(0, _import_profiler)
+    return _import_profiler
+
+
+def _customer_import_profile_file() -> str:
+    return _rank_output_path(
+        os.path.join(os.path.dirname(EXTRACTED_CUSTOMER_CODE_PATH), "customer_imports.json")
+    )
+
+
+def _summarize_import_profile(profile: dict, top: int) -> dict:
+    def slowest(kind: str, key: str) -> list:
+        ranked = sorted(
+            profile[kind].items(), key=lambda item: item[1]["cumulative"], reverse=True
+        )
+        return [
+            {
+                key: name,
+                "self_seconds": times["self"],
+                "cumulative_seconds": times["cumulative"],
+            }
+            for name, times in ranked[:top]
+        ]
+
+    return {
+        "total_seconds": sum(times["self"] for times in profile["modules"].values()),
+        "packages": slowest("packages", "package"),
+        "modules": slowest("modules", "module"),
+    }
+
+
+def write_import_profile() -> Optional[dict]:
+    """
+    Writes the slowest imports, by module and by top-level package, of the container setup
+    (including loading the entry point) and of the customer process as a JSON report under
+    /opt/ml/output, one per rank under mpirun. The number of entries is set by
+    AMZN_BRAKET_IMPORT_PROFILE_TOP.
+
+    Returns:
+        Optional[dict]: the report, or None if import profiling is disabled.
+    """
+    if _import_profiler is None:
+        return None
+    top = int(_get_setting("AMZN_BRAKET_IMPORT_PROFILE_TOP") or DEFAULT_IMPORT_PROFILE_TOP)
+    report = {"container": _summarize_import_profile(_import_profiler.snapshot(), top)}
+    with contextlib.suppress(OSError, ValueError), open(
+        _customer_import_profile_file()
+    ) as customer_profile:
+        report["customer"] = _summarize_import_profile(json.load(customer_profile), top)
+    for section, summary in report.items():
+        for package in summary["packages"][:5]:
+            print(
+                f"Slow {section} import: {package['package']} "
+                f"{package['cumulative_seconds']:.3f}s cumulative"
+            )
+    try:
+        _write_json_atomic(_rank_output_path(IMPORT_PROFILE_FILE), report, indent=2)
+    except OSError as e:
+        print(f"Unable to write import profile.\nException: {e}")
+    return report
+
+
+def benchmark_startup(iterations: int = 5) -> dict:
+    """
+    Compares interpreter startup for a local code source, which never imports boto3, against an
+    S3 code source, which imports boto3 and creates an S3 client. Each path is run in a fresh
+    interpreter.
+
+    Args:
+        iterations (int): the number of runs per path.
+    Returns:
+        dict: the median wall time in seconds, keyed by path.
+    """
+    module_dir, module_file = os.path.split(os.path.abspath(__file__))
+    prelude = (
+        f"import sys; sys.path.insert(0, {module_dir!r}); "
+        f"import {os.path.splitext(module_file)[0]} as container; "
+    )
+    results = {}
+    with tempfile.NamedTemporaryFile(suffix=".py") as code_file:
+        scripts = {
+            "local": prelude + f"container.download_customer_code({code_file.name!r})",
+            "s3": prelude + "container.get_s3_client()",
+        }
+        for name, script in scripts.items():
+            durations = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                subprocess.run([sys.executable, "-c", script], check=True,
+                               stdout=subprocess.DEVNULL)
+                durations.append(time.perf_counter() - start)
+            results[name] = statistics.median(durations)
+    for name, duration in results.items():
+        print(f"Startup with {name} code source: {duration:.3f}s")
+    return results
+
+
 def create_paths():
     """
     These paths are created early on so that the rest of the code can assume that the directories
@@ -99,12 +579,42 @@ def create_symlink():
             log_failure_and_exit(f"Symlink failure.\n Exception: {e}")
 
 
+def _get_boto3():
+    global boto3
+    if boto3 is None:
+        with _timed_phase("boto3_import"):
+            import boto3 as boto3_module
+        boto3 = boto3_module
+        print("Boto3 Version: ", boto3.__version__)
+    return boto3
+
+
 def get_s3_client():
     if not hasattr(_local, 's3_client'):
-        _local.s3_client = boto3.client("s3")
+        _local.s3_client = _get_boto3().client("s3")
     return _local.s3_client
 
 
+def get_local_code_path(code_uri: str) -> Optional[str]:
+    """
+    Returns the local path of a code source given as a file:// URI or an absolute path, or None
+    if the code is stored in S3.
+
+    Args:
+        code_uri (str): the location of the code.
+    Returns:
+        Optional[str]: the local path of the code.
+    """
+    if os.path.isabs(code_uri):
+        return code_uri
+    parsed_url = urlparse(code_uri, allow_fragments=False)
+    if parsed_url.scheme != "file":
+        return None
+    if parsed_url.netloc not in ["", "localhost"]:
+        raise ValueError(f"Unsupported file URI host: {parsed_url.netloc}")
+    return unquote(parsed_url.path)
+
+
 def download_s3_file(s3_uri: str, local_path: str) -> str:
     """
     Downloads a file to a local path.
@@ -121,15 +631,170 @@ def download_s3_file(s3_uri: str, local_path: str) -> str:
     s3_bucket = parsed_url.netloc
     s3_key = parsed_url.path.lstrip("/")
     local_s3_file = os.path.join(local_path, os.path.basename(s3_key))
-    if not os.path.exists(local_s3_file):
+    etag_file = local_s3_file + DOWNLOAD_ETAG_SUFFIX
+    partially_downloaded = os.path.exists(local_s3_file + DOWNLOAD_PROGRESS_SUFFIX)
+    etag = None
+    if os.path.exists(local_s3_file) and not partially_downloaded:
+        # A file left by an earlier download is only reused while it is still the current
+        # version of the object.
+        etag = s3_client.head_object(Bucket=s3_bucket, Key=s3_key).get("ETag")
+        with contextlib.suppress(OSError):
+            with open(etag_file) as f:
+                if etag and f.read() == etag:
+                    return local_s3_file
+        os.remove(local_s3_file)
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(etag_file)
+    if _is_setting_enabled("AMZN_BRAKET_RANGED_DOWNLOAD"):
+        download_s3_file_ranged(s3_bucket, s3_key, local_s3_file)
+    else:
         s3_client.download_file(s3_bucket, s3_key, local_s3_file)
+        if etag:
+            with open(etag_file, "w") as f:
+                f.write(etag)
     return local_s3_file
 
 
+def _download_range(s3_client, s3_bucket: str, s3_key: str, fd: int, start: int, end: int):
+    """
+    Downloads the inclusive byte range [start, end] of an S3 object into an open file. A failed
+    attempt resumes from the last byte written rather than restarting the range.
+    """
+    offset = start
+    for attempt in range(DOWNLOAD_RANGE_ATTEMPTS):
+        try:
+            body = s3_client.get_object(
+                Bucket=s3_bucket, Key=s3_key, Range=f"bytes={offset}-{end}"
+            )["Body"]
+            while offset <= end:
+                data = body.read(min(STREAM_CHUNK_SIZE, end - offset + 1))
+                if not data:
+                    raise IOError(f"Range {offset}-{end} ended early")
+                os.pwrite(fd, data, offset)
+                offset += len(data)
+            return start
+        except Exception:
+            if attempt == DOWNLOAD_RANGE_ATTEMPTS - 1:
+                raise
+            time.sleep(0.1 * 2 ** attempt)
+
+
+def download_s3_file_ranged(
+    s3_bucket: str,
+    s3_key: str,
+    local_s3_file: str,
+    chunk_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+) -> int:
+    """
+    Downloads an S3 object with concurrent byte-range GETs written into a preallocated file.
+    Completed ranges are recorded next to the file, so an interrupted download resumes with the
+    missing ranges instead of restarting. All workers share one S3 client.
+
+    Args:
+        s3_bucket (str): the S3 bucket of the object.
+        s3_key (str): the S3 key of the object.
+        local_s3_file (str): the file to download to.
+        chunk_size (Optional[int]): the size of each range. Defaults to
+            AMZN_BRAKET_DOWNLOAD_CHUNK_SIZE, or 16 MiB.
+        concurrency (Optional[int]): the number of concurrent range GETs. Defaults to
+            AMZN_BRAKET_DOWNLOAD_CONCURRENCY, or 8.
+    Returns:
+        int: the size of the object in bytes.
+    """
+    chunk_size = chunk_size or int(
+        _get_setting("AMZN_BRAKET_DOWNLOAD_CHUNK_SIZE", DEFAULT_DOWNLOAD_CHUNK_SIZE)
+    )
+    concurrency = concurrency or int(
+        _get_setting("AMZN_BRAKET_DOWNLOAD_CONCURRENCY", DEFAULT_DOWNLOAD_CONCURRENCY)
+    )
+    s3_client = get_s3_client()
+    head = s3_client.head_object(Bucket=s3_bucket, Key=s3_key)
+    size = head["ContentLength"]
+    progress_file = local_s3_file + DOWNLOAD_PROGRESS_SUFFIX
+    progress = {"etag": head.get("ETag"), "size": size, "chunk_size": chunk_size, "completed": []}
+    if os.path.exists(local_s3_file) and os.path.exists(progress_file):
+        # Completed ranges are recorded by their start, so they only carry over to a download
+        # of the same object with the same range size.
+        with contextlib.suppress(OSError, ValueError, KeyError):
+            with open(progress_file) as f:
+                previous_progress = json.load(f)
+            recorded = [previous_progress[key] for key in ("etag", "size", "chunk_size")]
+            if recorded == [progress["etag"], size, chunk_size]:
+                progress = previous_progress
+    completed = set(progress["completed"])
+    ranges = [
+        (start, min(start + chunk_size, size) - 1)
+        for start in range(0, size, chunk_size)
+        if start not in completed
+    ]
+
+    start_time = time.time()
+    fd = os.open(local_s3_file, os.O_RDWR | os.O_CREAT)
+    try:
+        if hasattr(os, "posix_fallocate") and size:
+            os.posix_fallocate(fd, 0, size)
+        os.ftruncate(fd, size)
+        with open(progress_file, "w") as f:
+            json.dump(progress, f)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(_download_range, s3_client, s3_bucket, s3_key, fd, start, end)
+                for start, end in ranges
+            ]
+            for future in as_completed(futures):
+                progress["completed"].append(future.result())
+                with open(progress_file, "w") as f:
+                    json.dump(progress, f)
+    finally:
+        os.close(fd)
+    if progress["etag"]:
+        with open(local_s3_file + DOWNLOAD_ETAG_SUFFIX, "w") as f:
+            f.write(progress["etag"])
+    os.remove(progress_file)
+    elapsed = time.time() - start_time
+    downloaded = sum(end - start + 1 for start, end in ranges)
+    print(
+        f"Downloaded {downloaded} of {size} bytes in {elapsed:.3f}s "
+        f"({downloaded / max(elapsed, 1e-9) / 1e6:.1f} MB/s, {concurrency} x {chunk_size} byte ranges)"
+    )
+    return size
+
+
+def benchmark_s3_download(
+    s3_uri: str, concurrency_levels=(1, 2, 4, 8, 16), chunk_size: Optional[int] = None
+) -> dict:
+    """
+    Downloads an S3 object once per concurrency level and reports the achieved throughput.
+
+    Args:
+        s3_uri (str): the S3 URI of the object to download.
+        concurrency_levels: the concurrency levels to measure.
+        chunk_size (Optional[int]): the size of each range.
+    Returns:
+        dict: the achieved throughput in MB/s, keyed by concurrency level.
+    """
+    parsed_url = urlparse(s3_uri, allow_fragments=False)
+    results = {}
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_file = os.path.join(temp_dir, "benchmark")
+        for concurrency in concurrency_levels:
+            start_time = time.time()
+            size = download_s3_file_ranged(
+                parsed_url.netloc, parsed_url.path.lstrip("/"), local_file, chunk_size, concurrency
+            )
+            results[concurrency] = size / max(time.time() - start_time, 1e-9) / 1e6
+            os.remove(local_file)
+    for concurrency, throughput in results.items():
+        print(f"Concurrency {concurrency}: {throughput:.1f} MB/s")
+    return results
+
+
 def download_customer_code(s3_uri: str) -> str:
     """
     Downloads the customer code to the original customer path. The code is assumed to be a single
-    file in S3. The file may be a compressed archive containing all the customer code.
+    file in S3. The file may be a compressed archive containing all the customer code. Code that
+    is already local (a file:// URI or an absolute path) is used in place, without touching S3.
 
     Args:
         s3_uri (str): the S3 URI to get the code from.
@@ -137,168 +802,2062 @@ def download_customer_code(s3_uri: str) -> str:
         str: the path to the file containing the code.
     """
     try:
+        local_path = get_local_code_path(s3_uri)
+        if local_path is not None:
+            if not os.path.exists(local_path):
+                raise FileNotFoundError(f"No such file: {local_path}")
+            return local_path
         return download_s3_file(s3_uri, ORIGINAL_CUSTOMER_CODE_PATH)
     except Exception as e:
         log_failure_and_exit(f"Unable to download code.\nException: {e}")
 
 
-def unpack_code_and_add_to_path(local_s3_file: str, compression_type: str):
-    """
-    Unpack the customer code, if necessary. Add the customer code to the system path.
+def _is_archive(compression_type: str) -> bool:
+    return bool(compression_type) and compression_type.strip().lower() in ARCHIVE_COMPRESSION_TYPES
 
-    Args:
-        local_s3_file (str): the file representing the customer code.
-        compression_type (str): if the customer code is stored in an archive, this value will
-            represent the compression type of the archive.
-    """
-    if compression_type and compression_type.strip().lower() in ["gzip", "zip"]:
-        try:
-            with _unpack_lock:
-                shutil.unpack_archive(local_s3_file, EXTRACTED_CUSTOMER_CODE_PATH)
-        except Exception as e:
-            log_failure_and_exit(
-                f"Got an exception while trying to unpack archive: {local_s3_file} of type: "
-                f"{compression_type}.\nException: {e}"
-            )
-    else:
-        shutil.copy(local_s3_file, EXTRACTED_CUSTOMER_CODE_PATH)
+
+def _add_extracted_code_to_path():
     with _path_lock:
         if EXTRACTED_CUSTOMER_CODE_PATH not in sys.path:
             sys.path.append(EXTRACTED_CUSTOMER_CODE_PATH)
 
 
-def try_bind_hyperparameters_to_customer_method(customer_method: Callable):
-    hp_file = os.getenv("AMZN_BRAKET_HP_FILE")
-    if hp_file is None:
-        return
+class _TimedReader(io.RawIOBase):
+    """
+    Wraps a streaming body, recording how many bytes were read and when the last byte arrived.
+    """
 
-    with open(hp_file) as f:
-        hyperparameters = json.load(f)
+    def __init__(self, stream):
+        self._stream = stream
+        self.bytes_read = 0
+        self.last_byte_time = None
 
-    try:
-        inspect.signature(customer_method).bind(**hyperparameters)
-    except TypeError:
-        return
+    def readable(self):
+        return True
 
-    annotations = inspect.getfullargspec(customer_method).annotations
-    function_args = {}
-    for param in hyperparameters:
-        function_args[param] = annotations.get(param, str)(
-            hyperparameters[param]
-        )
-    return function_args
+    def readinto(self, buffer):
+        data = self._stream.read(len(buffer))
+        if data:
+            buffer[:len(data)] = data
+            self.bytes_read += len(data)
+            self.last_byte_time = time.time()
+        return len(data)
 
 
-def get_code_setup_parameters() -> Tuple[str, str, str]:
+class _S3RangeReader(io.RawIOBase):
     """
-    Returns the code setup parameters:
-        s3_uri: the S3 location where the code is stored.
-        entry_point: the entrypoint into the code.
-        compression_type: the compression used to archive the code (optional)
-    These values are stored in environment variables, however, we also allow the storing of
-    these values in the hyperparameters to facilitate testing in local mode.
-    If the s3_uri or entry_point can not be found, the script will exit with an error.
-
-    Returns:
-        str, str, str: the code setup parameters as described above.
+    A seekable, read-only view of an S3 object. Bytes are fetched with ranged GETs one chunk at a
+    time, so that formats which need to seek (zip) can be extracted while the object is still
+    being downloaded.
     """
-    s3_uri = os.getenv('AMZN_BRAKET_SCRIPT_S3_URI')
-    entry_point = os.getenv('AMZN_BRAKET_SCRIPT_ENTRY_POINT')
-    compression_type = os.getenv('AMZN_BRAKET_SCRIPT_COMPRESSION_TYPE')
-    if s3_uri and entry_point:
-        return s3_uri, entry_point, compression_type
-    hyperparameters_env = os.getenv('SM_HPS')
-    if hyperparameters_env:
-        try:
-            hyperparameters = json.loads(hyperparameters_env)
-            if not s3_uri:
-                s3_uri = hyperparameters.get("AMZN_BRAKET_SCRIPT_S3_URI")
-            if not entry_point:
-                entry_point = hyperparameters.get("AMZN_BRAKET_SCRIPT_ENTRY_POINT")
-            if not compression_type:
-                compression_type = hyperparameters.get("AMZN_BRAKET_SCRIPT_COMPRESSION_TYPE")
-        except Exception as e:
-            log_failure_and_exit("Hyperparameters not specified in env")
-    if not s3_uri:
-        log_failure_and_exit("No customer script specified")
-    if not entry_point:
-        log_failure_and_exit("No customer entry point specified")
-    return s3_uri, entry_point, compression_type
 
+    def __init__(self, s3_bucket: str, s3_key: str, size: int, chunk_size: int = STREAM_CHUNK_SIZE):
+        self._s3_bucket = s3_bucket
+        self._s3_key = s3_key
+        self._size = size
+        self._chunk_size = chunk_size
+        self._position = 0
+        self._chunk_start = 0
+        self._chunk = b""
+        self.bytes_read = 0
+        self.last_byte_time = None
 
-def install_additional_requirements() -> None:
-    """
-    Search for requirements from requirements.txt and install them.
-    """
-    try:
-        print("Checking for Additional Requirements")
-        for root, _, files in os.walk(EXTRACTED_CUSTOMER_CODE_PATH):
-            if "requirements.txt" in files:
-                requirements_file_path = os.path.join(root, "requirements.txt")
-                subprocess.run(
-                    ["python", "-m", "pip", "install", "-r", requirements_file_path],
-                    cwd=EXTRACTED_CUSTOMER_CODE_PATH
-                )
-        print("Additional Requirements Check Finished")
-    except Exception as e:
-        log_failure_and_exit(f"Unable to install requirements.\nException: {e}")
+    def readable(self):
+        return True
 
+    def seekable(self):
+        return True
 
-def extract_customer_code(entry_point: str) -> Callable:
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._position = offset
+        elif whence == io.SEEK_CUR:
+            self._position += offset
+        elif whence == io.SEEK_END:
+            self._position = self._size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        return self._position
+
+    def _fetch_chunk(self, start: int):
+        end = min(start + self._chunk_size, self._size) - 1
+        response = get_s3_client().get_object(
+            Bucket=self._s3_bucket, Key=self._s3_key, Range=f"bytes={start}-{end}"
+        )
+        self._chunk = response["Body"].read()
+        self._chunk_start = start
+        self.bytes_read += len(self._chunk)
+        self.last_byte_time = time.time()
+
+    def readinto(self, buffer):
+        if self._position >= self._size:
+            return 0
+        offset = self._position - self._chunk_start
+        if not 0 <= offset < len(self._chunk):
+            self._fetch_chunk(self._position)
+            offset = 0
+        data = self._chunk[offset:offset + len(buffer)]
+        buffer[:len(data)] = data
+        self._position += len(data)
+        return len(data)
+
+
+def _get_extract_workers() -> int:
+    return int(_get_setting("AMZN_BRAKET_EXTRACT_WORKERS", "1"))
+
+
+def _safe_extract_path(extract_path: str, name: str) -> str:
     """
-    Converts entry point to a runnable function.
+    Returns the path an archive member extracts to, refusing members that would land outside
+    the extraction path.
     """
-    if entry_point.find(":") >= 0:
-        str_module, _, str_method = entry_point.partition(":")
-        customer_module = importlib.import_module(str_module)
-        customer_code = getattr(customer_module, str_method)
-    else:
-        def customer_code():
-            # equivalent to `python -m entry_point`
-            return runpy.run_module(entry_point, run_name="__main__")
-    return customer_code
+    root = os.path.realpath(extract_path)
+    target = os.path.realpath(os.path.join(root, name))
+    if os.path.isabs(name) or os.path.commonpath([root, target]) != root:
+        raise ValueError(f"Archive member {name} is outside the extraction path")
+    return target
 
 
-@contextlib.contextmanager
-def in_extracted_code_dir():
-    with _chdir_lock:
-        current_dir = os.getcwd()
-        try:
-            os.chdir(EXTRACTED_CUSTOMER_CODE_PATH)
-            yield
-        finally:
-            os.chdir(current_dir)
+def _report_extraction(members: list, start: float) -> dict:
+    elapsed = max(time.time() - start, 1e-9)
+    files = len(members)
+    total_bytes = sum(size for _, size in members)
+    print(
+        f"Extracted {files} files ({total_bytes} bytes) in {elapsed:.3f}s: "
+        f"{files / elapsed:.0f} files/s, {total_bytes / elapsed / 1e6:.1f} MB/s"
+    )
+    return {"files": files, "bytes": total_bytes, "seconds": elapsed, "members": members}
 
 
-def wrap_customer_code(customer_method: Callable, **kwargs) -> Any:
-    """Run the customer method inside the extracted code dir, logging any
-    exception before re-raising.
+def extract_zip_parallel(archive_path: str, extract_path: str, workers: int) -> dict:
+    """
+    Extracts a zip archive with a thread pool. The central directory is read once, directories
+    are created up front and the members are then decompressed and written concurrently, each
+    worker thread reading through its own handle to the archive.
 
-    This is a module-level function (not a closure factory) so it can be
-    pickled by `multiprocessing.Process`. Some imported libraries (e.g. cudaq)
-    change the default start method from fork to forkserver, which pickles
-    the target; a nested closure would break that path.
+    Args:
+        archive_path (str): the zip archive.
+        extract_path (str): the directory to extract into.
+        workers (int): the number of extraction threads.
+    Returns:
+        dict: the number of files and bytes extracted, the time taken, and the extracted
+        members as (path, size) pairs.
     """
+    start = time.time()
+    handles = threading.local()
+    opened = []
+    with zipfile.ZipFile(archive_path) as archive:
+        members = []
+        for info in archive.infolist():
+            target = _safe_extract_path(extract_path, info.filename)
+            if info.is_dir():
+                Path(target).mkdir(parents=True, exist_ok=True)
+            else:
+                Path(target).parent.mkdir(parents=True, exist_ok=True)
+                members.append((info, target))
+
+    def extract_member(info: zipfile.ZipInfo, target: str) -> int:
+        if not hasattr(handles, "archive"):
+            handles.archive = zipfile.ZipFile(archive_path)
+            opened.append(handles.archive)
+        with handles.archive.open(info) as source, open(target, "wb") as destination:
+            shutil.copyfileobj(source, destination, STREAM_CHUNK_SIZE)
+        return info.file_size
+
     try:
-        with in_extracted_code_dir():
-            return customer_method(**kwargs)
-    except Exception as e:
-        exception_type = type(e).__name__
-        exception_string = (
-            exception_type
-            if not str(e)
-            else f"{exception_type}: {e}"
-        )
-        _log_failure(exception_string, display=False)
-        raise e
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda member: extract_member(*member), members))
+    finally:
+        for handle in opened:
+            handle.close()
+    return _report_extraction(
+        [(os.path.normpath(info.filename), info.file_size) for info, _ in members], start
+    )
 
 
-def kick_off_customer_script(customer_code: Callable) -> multiprocessing.Process:
+def _write_tar_member(member: tarfile.TarInfo, target: str, data: bytes) -> int:
+    with open(target, "wb") as destination:
+        destination.write(data)
+    os.chmod(target, member.mode)
+    os.utime(target, (member.mtime, member.mtime))
+    return len(data)
+
+
+def extract_tar(archive_path: str, extract_path: str) -> list:
     """
-    Runs the customer script as a separate process.
+    Extracts a (compressed) tar archive member by member, collecting the members for the code
+    manifest. Members are extracted as shutil.unpack_archive does, without a tarfile filter,
+    so that archives with e.g. absolute symlinks to mounted data keep working.
 
     Args:
-        customer_code (Callable): The customer method to be run.
+        archive_path (str): the tar archive.
+        extract_path (str): the directory to extract into.
+    Returns:
+        list: the extracted files and links as (path, size) pairs.
+    """
+    members = []
+    with tarfile.open(archive_path) as archive:
+        for member in archive:
+            archive.extract(member, extract_path, filter="fully_trusted")
+            if member.isfile():
+                members.append((os.path.normpath(member.name), member.size))
+            elif member.issym() or member.islnk():
+                members.append((os.path.normpath(member.name), 0))
+    return members
+
+
+def extract_tar_pipelined(fileobj, extract_path: str, workers: int) -> dict:
+    """
+    Extracts a (compressed) tar stream with decompression and file writes pipelined: the calling
+    thread decompresses members in order while a thread pool writes them to disk. Members are
+    validated with the tarfile data filter, which rejects absolute paths, paths outside the
+    extraction path and links pointing outside it. Links are created after all files exist.
+
+    Args:
+        fileobj: a readable binary stream containing the tar archive.
+        extract_path (str): the directory to extract into.
+        workers (int): the number of writer threads.
+    Returns:
+        dict: the number of files and bytes extracted, the time taken, and the extracted
+        members as (path, size) pairs.
+    """
+    start = time.time()
+    pending_bytes = threading.Semaphore(EXTRACT_MAX_PENDING_BYTES // STREAM_CHUNK_SIZE)
+    links = []
+    futures = []
+    members = []
+
+    def write_member(member, target, data, permits):
+        try:
+            return _write_tar_member(member, target, data)
+        finally:
+            for _ in range(permits):
+                pending_bytes.release()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, tarfile.open(
+        fileobj=fileobj, mode="r|*"
+    ) as archive:
+        for member in archive:
+            member = tarfile.data_filter(member, extract_path)
+            target = _safe_extract_path(extract_path, member.name)
+            if member.isdir():
+                Path(target).mkdir(parents=True, exist_ok=True)
+            elif member.issym() or member.islnk():
+                links.append((member, target))
+                members.append((os.path.normpath(member.name), 0))
+            elif member.isfile():
+                members.append((os.path.normpath(member.name), member.size))
+                Path(target).parent.mkdir(parents=True, exist_ok=True)
+                if member.size > EXTRACT_INLINE_FILE_SIZE:
+                    with archive.extractfile(member) as source, open(target, "wb") as destination:
+                        shutil.copyfileobj(source, destination, STREAM_CHUNK_SIZE)
+                    os.chmod(target, member.mode)
+                    os.utime(target, (member.mtime, member.mtime))
+                    continue
+                permits = max(1, member.size // STREAM_CHUNK_SIZE)
+                for _ in range(permits):
+                    pending_bytes.acquire()
+                data = archive.extractfile(member).read()
+                futures.append(executor.submit(write_member, member, target, data, permits))
+        for future in futures:
+            future.result()
+
+    for member, target in links:
+        Path(target).parent.mkdir(parents=True, exist_ok=True)
+        if member.issym():
+            os.symlink(member.linkname, target)
+        else:
+            os.link(_safe_extract_path(extract_path, member.linkname), target)
+    return _report_extraction(members, start)
+
+
+def stream_customer_code(s3_uri: str, compression_type: str) -> None:
+    """
+    Extracts the customer code archive into the extracted customer path while it is being
+    downloaded, instead of downloading the whole archive first. Gzip archives are piped through
+    a streaming tar decoder; zip archives are read through a seekable reader backed by ranged
+    GETs. Adds the customer code to the system path.
+
+    Args:
+        s3_uri (str): the S3 URI to get the code archive from.
+        compression_type (str): the compression type of the archive, either gzip or zip.
+    """
+    parsed_url = urlparse(s3_uri, allow_fragments=False)
+    s3_bucket = parsed_url.netloc
+    s3_key = parsed_url.path.lstrip("/")
+    try:
+        download_start = time.time()
+        with _unpack_lock:
+            if compression_type.strip().lower() == "zip":
+                size = get_s3_client().head_object(Bucket=s3_bucket, Key=s3_key)["ContentLength"]
+                reader = _S3RangeReader(s3_bucket, s3_key, size)
+                unpack_start = time.time()
+                with zipfile.ZipFile(io.BufferedReader(reader, STREAM_CHUNK_SIZE)) as archive:
+                    archive.extractall(EXTRACTED_CUSTOMER_CODE_PATH)
+                    members = _zip_members(archive)
+            else:
+                body = get_s3_client().get_object(Bucket=s3_bucket, Key=s3_key)["Body"]
+                reader = _TimedReader(body)
+                unpack_start = time.time()
+                stream = io.BufferedReader(reader, STREAM_CHUNK_SIZE)
+                if (workers := _get_extract_workers()) > 1:
+                    members = extract_tar_pipelined(
+                        stream, EXTRACTED_CUSTOMER_CODE_PATH, workers
+                    )["members"]
+                else:
+                    members = []
+                    with tarfile.open(fileobj=stream, mode="r|*") as archive:
+                        for member in archive:
+                            archive.extract(member, EXTRACTED_CUSTOMER_CODE_PATH, filter="data")
+                            if not member.isdir():
+                                members.append((os.path.normpath(member.name), member.size))
+        unpack_end = time.time()
+    except Exception as e:
+        log_failure_and_exit(
+            f"Got an exception while trying to stream archive: {s3_uri} of type: "
+            f"{compression_type}.\nException: {e}"
+        )
+    download_end = reader.last_byte_time or unpack_end
+    _record_phase("download", download_start, download_end, bytes=reader.bytes_read)
+    _record_phase("unpack", unpack_start, unpack_end)
+    overlap = max(0.0, min(download_end, unpack_end) - max(download_start, unpack_start))
+    print(
+        f"Streamed {reader.bytes_read} bytes. Download: {download_end - download_start:.3f}s, "
+        f"unpack: {unpack_end - unpack_start:.3f}s, overlap: {overlap:.3f}s"
+    )
+    set_code_manifest(members)
+    _add_extracted_code_to_path()
+
+
+def unpack_code_and_add_to_path(local_s3_file: str, compression_type: str):
+    """
+    Unpack the customer code, if necessary. Add the customer code to the system path.
+
+    Args:
+        local_s3_file (str): the file representing the customer code.
+        compression_type (str): if the customer code is stored in an archive, this value will
+            represent the compression type of the archive.
+    """
+    members = None
+    if _is_archive(compression_type):
+        is_zip = compression_type.strip().lower() == "zip"
+        try:
+            with _unpack_lock:
+                if (workers := _get_extract_workers()) <= 1 and not is_zip:
+                    members = extract_tar(local_s3_file, EXTRACTED_CUSTOMER_CODE_PATH)
+                elif workers <= 1:
+                    shutil.unpack_archive(local_s3_file, EXTRACTED_CUSTOMER_CODE_PATH)
+                    with contextlib.suppress(Exception), zipfile.ZipFile(local_s3_file) as archive:
+                        members = _zip_members(archive)
+                elif is_zip:
+                    members = extract_zip_parallel(
+                        local_s3_file, EXTRACTED_CUSTOMER_CODE_PATH, workers
+                    )["members"]
+                else:
+                    with open(local_s3_file, "rb") as archive:
+                        members = extract_tar_pipelined(
+                            archive, EXTRACTED_CUSTOMER_CODE_PATH, workers
+                        )["members"]
+        except Exception as e:
+            log_failure_and_exit(
+                f"Got an exception while trying to unpack archive: {local_s3_file} of type: "
+                f"{compression_type}.\nException: {e}"
+            )
+    elif os.path.isdir(local_s3_file):
+        members = link_code_directory(local_s3_file, EXTRACTED_CUSTOMER_CODE_PATH)
+    else:
+        place_code_file(local_s3_file, EXTRACTED_CUSTOMER_CODE_PATH)
+        with contextlib.suppress(OSError):
+            members = [(os.path.basename(local_s3_file), os.path.getsize(local_s3_file))]
+    set_code_manifest(members)
+    _add_extracted_code_to_path()
+
+
+def _reflink(src: str, dst: str) -> None:
+    with open(src, "rb") as source, open(dst, "wb") as destination:
+        fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+
+
+def place_code_file(src: str, dst_dir: str) -> str:
+    """
+    Places a code file into a directory without copying its contents where possible. A reflink
+    (FICLONE) is tried first, since it shares the data blocks while keeping the copies
+    independent, then a hard link. The file is only copied when neither is possible, for example
+    across filesystems.
+
+    Args:
+        src (str): the code file.
+        dst_dir (str): the directory to place the file into.
+    Returns:
+        str: how the file was placed: "reflink", "hardlink" or "copy".
+    """
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(dst)
+    try:
+        _reflink(src, dst)
+        method = "reflink"
+    except OSError:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(dst)
+        try:
+            os.link(src, dst)
+            method = "hardlink"
+        except OSError:
+            shutil.copy(src, dst)
+            method = "copy"
+    print(f"Placed {src} in {dst_dir} by {method}")
+    return method
+
+
+def link_code_directory(src_dir: str, dst_dir: str) -> list:
+    """
+    Makes the contents of a local code directory, such as a mounted volume, available in a
+    directory by symlinking each top-level entry instead of copying the tree. Since walking
+    the destination would not descend into the linked directories, the files are listed from
+    the code directory itself.
+
+    Args:
+        src_dir (str): the code directory.
+        dst_dir (str): the directory to link the entries into.
+    Returns:
+        list: the files of the code directory as (path, size) pairs relative to it.
+    """
+    for name in os.listdir(src_dir):
+        target = os.path.join(dst_dir, name)
+        if os.path.lexists(target):
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            else:
+                os.remove(target)
+        os.symlink(os.path.join(src_dir, name), target)
+    print(f"Linked code directory {src_dir} into {dst_dir}")
+    members = []
+    for root, _, files in os.walk(src_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            with contextlib.suppress(OSError):
+                members.append((os.path.relpath(path, src_dir), os.path.getsize(path)))
+    return members
+
+
+def _zip_members(archive: zipfile.ZipFile) -> list:
+    return [
+        (os.path.normpath(info.filename.lstrip("/")), info.file_size)
+        for info in archive.infolist()
+        if not info.is_dir()
+    ]
+
+
+def _code_manifest_file() -> str:
+    return os.path.join(os.path.dirname(EXTRACTED_CUSTOMER_CODE_PATH), "manifest.json")
+
+
+def set_code_manifest(members: Optional[list]) -> Optional[dict]:
+    """
+    Records the manifest of the extracted customer code, so that later setup steps can look up
+    files without walking the extracted tree. The manifest lists each file with its size, and
+    the requirements files, Python files and Python packages among them. It is also written
+    next to the extracted code for other processes on the host.
+
+    Args:
+        members (Optional[list]): the extracted files as (path, size) pairs relative to the
+            extracted customer path, or None if they are not known.
+    Returns:
+        Optional[dict]: the manifest.
+    """
+    global _code_manifest
+    if members is None:
+        _code_manifest = None
+        with contextlib.suppress(OSError):
+            os.remove(_code_manifest_file())
+        return None
+    files = {path: size for path, size in members}
+    _code_manifest = {
+        "files": files,
+        "requirements": sorted(
+            path for path in files if os.path.basename(path) == "requirements.txt"
+        ),
+        "python": sorted(path for path in files if path.endswith(".py")),
+        "packages": sorted(
+            os.path.dirname(path) for path in files if os.path.basename(path) == "__init__.py"
+        ),
+    }
+    try:
+        with open(_code_manifest_file(), "w") as manifest_file:
+            json.dump(_code_manifest, manifest_file)
+    except OSError as e:
+        print(f"Unable to write code manifest.\nException: {e}")
+    return _code_manifest
+
+
+def get_code_manifest() -> Optional[dict]:
+    """
+    Returns the manifest of the extracted customer code, or None if the extracted files are not
+    known and the tree has to be walked.
+    """
+    return _code_manifest
+
+
+def get_cache_path() -> Optional[str]:
+    """
+    Returns the root of the persistent cache, or None if caching is unavailable. The cache is
+    placed in the SageMaker warm pool cache by default, so that it survives container restarts
+    and warm pool reuse, and can be relocated with AMZN_BRAKET_CACHE_DIR.
+
+    Returns:
+        Optional[str]: the cache root directory.
+    """
+    cache_path = _get_setting("AMZN_BRAKET_CACHE_DIR")
+    if cache_path:
+        return cache_path
+    if os.path.isdir(WARM_POOL_CACHE_PATH):
+        return os.path.join(WARM_POOL_CACHE_PATH, "braket")
+    return None
+
+
+def _link_or_copy(src: str, dst: str) -> str:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+def _link_tree(src: str, dst: str) -> None:
+    shutil.copytree(src, dst, symlinks=True, copy_function=_link_or_copy, dirs_exist_ok=True)
+
+
+def _tree_fingerprint(root: str) -> dict:
+    fingerprint = {}
+    for current_dir, _, files in os.walk(root):
+        for file_name in files:
+            file_path = os.path.join(current_dir, file_name)
+            stat = os.lstat(file_path)
+            fingerprint[os.path.relpath(file_path, root)] = [stat.st_size, stat.st_mtime_ns]
+    return fingerprint
+
+
+def _read_cache_entry(entry_path: str) -> Optional[dict]:
+    try:
+        with open(os.path.join(entry_path, CACHE_ENTRY_FILE)) as entry_file:
+            return json.load(entry_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _commit_cache_entry(staging_path: str, entry_path: str, entry: dict) -> None:
+    """
+    Atomically publishes a staged cache entry. If another process published the same entry
+    first, the staged copy is discarded.
+    """
+    with open(os.path.join(staging_path, CACHE_ENTRY_FILE), "w") as entry_file:
+        json.dump(entry, entry_file)
+    try:
+        os.rename(staging_path, entry_path)
+    except OSError:
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+
+def _evict_cache_entries(cache_path: str, max_bytes: int) -> None:
+    """
+    Removes the least recently used entries in a cache directory until its total size fits
+    within the budget. Entries without a valid entry file are incomplete and always removed.
+    """
+    entries = []
+    for name in os.listdir(cache_path):
+        entry_path = os.path.join(cache_path, name)
+        entry = _read_cache_entry(entry_path)
+        if entry is None:
+            if ".staging-" not in name:
+                shutil.rmtree(entry_path, ignore_errors=True)
+            continue
+        last_used = os.stat(os.path.join(entry_path, CACHE_ENTRY_FILE)).st_mtime
+        entries.append((last_used, entry.get("size", 0), entry_path))
+    total_size = sum(size for _, size, _ in entries)
+    for _, size, entry_path in sorted(entries):
+        if total_size <= max_bytes:
+            break
+        print(f"Evicting cache entry {entry_path}")
+        shutil.rmtree(entry_path, ignore_errors=True)
+        total_size -= size
+
+
+def _get_code_cache_entry_path(s3_uri: str, compression_type: str) -> Optional[str]:
+    """
+    Returns the code cache entry for an S3 object. Entries are keyed by the S3 ETag and
+    VersionId of the object together with its compression type, so that a changed object
+    never hits a stale entry.
+    """
+    cache_path = get_cache_path()
+    if not cache_path:
+        return None
+    parsed_url = urlparse(s3_uri, allow_fragments=False)
+    head = get_s3_client().head_object(
+        Bucket=parsed_url.netloc, Key=parsed_url.path.lstrip("/")
+    )
+    identity = {
+        "s3_uri": s3_uri,
+        "etag": head.get("ETag"),
+        "version_id": head.get("VersionId"),
+        "compression_type": (compression_type or "").strip().lower(),
+    }
+    key = hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+    return os.path.join(cache_path, "code", key)
+
+
+def restore_cached_code(entry_path: str) -> bool:
+    """
+    Restores the extracted customer code from a code cache entry. Files are hard linked where
+    possible. An entry whose files no longer match their recorded size and modification time
+    (for example, because a previous job rewrote them in place) is discarded.
+
+    Args:
+        entry_path (str): the code cache entry.
+    Returns:
+        bool: True if the code was restored from the cache.
+    """
+    entry = _read_cache_entry(entry_path)
+    if entry is None:
+        return False
+    extracted_path = os.path.join(entry_path, "extracted")
+    if _tree_fingerprint(extracted_path) != entry["files"]:
+        print(f"Discarding modified code cache entry {entry_path}")
+        shutil.rmtree(entry_path, ignore_errors=True)
+        return False
+    _link_tree(extracted_path, EXTRACTED_CUSTOMER_CODE_PATH)
+    set_code_manifest([(path, size) for path, (size, _) in entry["files"].items()])
+    if entry.get("archive"):
+        _link_or_copy(
+            os.path.join(entry_path, "archive", entry["archive"]),
+            os.path.join(ORIGINAL_CUSTOMER_CODE_PATH, entry["archive"]),
+        )
+    os.utime(os.path.join(entry_path, CACHE_ENTRY_FILE))
+    return True
+
+
+def store_code_in_cache(entry_path: str, local_s3_file: Optional[str]) -> None:
+    """
+    Stores the downloaded archive, if any, and the extracted customer code in a code cache
+    entry, then evicts least recently used entries beyond AMZN_BRAKET_CODE_CACHE_MAX_BYTES.
+
+    Args:
+        entry_path (str): the code cache entry.
+        local_s3_file (Optional[str]): the downloaded archive.
+    """
+    staging_path = f"{entry_path}.staging-{os.getpid()}"
+    Path(staging_path, "archive").mkdir(parents=True, exist_ok=True)
+    extracted_path = os.path.join(staging_path, "extracted")
+    _link_tree(EXTRACTED_CUSTOMER_CODE_PATH, extracted_path)
+    archive = None
+    if local_s3_file:
+        archive = os.path.basename(local_s3_file)
+        _link_or_copy(local_s3_file, os.path.join(staging_path, "archive", archive))
+    files = _tree_fingerprint(extracted_path)
+    size = sum(file_size for file_size, _ in files.values())
+    if archive:
+        size += os.path.getsize(local_s3_file)
+    _commit_cache_entry(
+        staging_path, entry_path, {"archive": archive, "files": files, "size": size}
+    )
+    max_bytes = int(_get_setting("AMZN_BRAKET_CODE_CACHE_MAX_BYTES", DEFAULT_CODE_CACHE_MAX_BYTES))
+    _evict_cache_entries(os.path.dirname(entry_path), max_bytes)
+
+
+def read_resource_config() -> Optional[dict]:
+    """
+    Returns the resource config of the job, which lists the hosts of the job and the current
+    host, or None if it is not available.
+    """
+    try:
+        with open(RESOURCE_CONFIG_FILE) as resource_config:
+            return json.load(resource_config)
+    except (OSError, ValueError):
+        return None
+
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(STREAM_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class _CodeArchiveHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/manifest":
+            body = json.dumps(self.server.manifest).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif self.path == "/archive":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(self.server.manifest["size"]))
+            self.end_headers()
+            with open(self.server.archive_path, "rb") as archive:
+                self.connection.sendfile(archive)
+        elif self.path == "/done":
+            # Sent by a peer once it has verified the archive or given up on this host, so that
+            # a re-fetch after a failed hash check is not counted as another peer.
+            self.send_response(204)
+            self.end_headers()
+            self.server.record_fetch()
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _CodeArchiveServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address: tuple, archive_path: str, manifest: dict, expected_fetches: int):
+        super().__init__(address, _CodeArchiveHandler)
+        self.archive_path = archive_path
+        self.manifest = manifest
+        self.expected_fetches = expected_fetches
+        self._fetches = 0
+        self._fetch_lock = threading.Lock()
+
+    def record_fetch(self):
+        with self._fetch_lock:
+            self._fetches += 1
+            if self._fetches == self.expected_fetches:
+                threading.Thread(target=self.shutdown, daemon=True).start()
+
+
+def serve_code_archive(
+    archive_path: str,
+    port: int,
+    expected_fetches: int,
+    bind_address: str = "",
+    sha256: Optional[str] = None,
+) -> http.server.ThreadingHTTPServer:
+    """
+    Serves the customer code archive, and a manifest with its name, size and SHA-256 hash, to
+    peer hosts over HTTP from a background thread. The server stops once the expected number of
+    peers have reported that they are done with the archive.
+
+    Args:
+        archive_path (str): the customer code archive.
+        port (int): the port to serve on.
+        expected_fetches (int): the number of peers that fetch the archive.
+        bind_address (str): the address to serve on. Default: all interfaces.
+        sha256 (Optional[str]): the hash of the archive, if already known.
+    Returns:
+        ThreadingHTTPServer: the running server.
+    """
+    manifest = {
+        "name": os.path.basename(archive_path),
+        "size": os.path.getsize(archive_path),
+        "sha256": sha256 or _sha256_file(archive_path),
+    }
+    server = _CodeArchiveServer((bind_address, port), archive_path, manifest, expected_fetches)
+
+    def serve():
+        server.serve_forever()
+        server.server_close()
+
+    threading.Thread(target=serve, name="braket-code-server", daemon=True).start()
+    print(f"Serving customer code to {expected_fetches} peer(s) on port {server.server_port}")
+    return server
+
+
+def _report_code_archive_done(host: str, port: int) -> None:
+    with contextlib.suppress(OSError, http.client.HTTPException):
+        urllib.request.urlopen(f"http://{host}:{port}/done", timeout=30).close()
+
+
+def fetch_code_archive(
+    host: str, port: int, destination_dir: str, timeout: float
+) -> Tuple[str, str]:
+    """
+    Fetches the customer code archive from a peer host and verifies it against the size and
+    SHA-256 hash in the peer's manifest. The peer is retried until it starts serving or the
+    timeout is reached, and is told when this host is done with it.
+
+    Args:
+        host (str): the peer host.
+        port (int): the port the peer serves on.
+        destination_dir (str): the directory to write the archive to.
+        timeout (float): the time in seconds to wait for the peer.
+    Returns:
+        Tuple[str, str]: the path to the archive and its SHA-256 hash.
+    """
+    deadline = time.time() + timeout
+    mismatches = 0
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://{host}:{port}/manifest", timeout=30) as response:
+                manifest = json.load(response)
+            archive_path = os.path.join(destination_dir, os.path.basename(manifest["name"]))
+            digest = hashlib.sha256()
+            with urllib.request.urlopen(
+                f"http://{host}:{port}/archive", timeout=30
+            ) as response, open(archive_path, "wb") as archive:
+                while chunk := response.read(STREAM_CHUNK_SIZE):
+                    digest.update(chunk)
+                    archive.write(chunk)
+            if (
+                digest.hexdigest() == manifest["sha256"]
+                and os.path.getsize(archive_path) == manifest["size"]
+            ):
+                _report_code_archive_done(host, port)
+                return archive_path, manifest["sha256"]
+            mismatches += 1
+            print(f"Customer code from {host} failed verification")
+            if mismatches == DISTRIBUTION_FETCH_ATTEMPTS:
+                _report_code_archive_done(host, port)
+                raise RuntimeError(f"Customer code from {host} failed verification")
+        except (OSError, http.client.HTTPException, ValueError) as e:
+            if time.time() > deadline:
+                raise TimeoutError(f"Unable to fetch customer code from {host}") from e
+            time.sleep(0.5)
+
+
+def distribute_code_archive(
+    hosts: list,
+    current_host: str,
+    port: int,
+    fetch_from_s3: Callable[[], str],
+    destination_dir: str,
+    timeout: float = DEFAULT_DISTRIBUTION_TIMEOUT,
+    bind_address: str = "",
+) -> str:
+    """
+    Gets the customer code archive through a binary fan-out tree over the hosts of the job.
+    The first host fetches the archive from S3; every other host fetches it from its parent in
+    the tree, then serves it to its own children. If the parent cannot provide the archive,
+    the host falls back to S3.
+
+    Args:
+        hosts (list): the hosts of the job.
+        current_host (str): this host.
+        port (int): the port the hosts serve on.
+        fetch_from_s3 (Callable[[], str]): downloads the archive from S3 and returns its path.
+        destination_dir (str): the directory to write the archive to.
+        timeout (float): the time in seconds to wait for the parent host.
+        bind_address (str): the address to serve on. Default: all interfaces.
+    Returns:
+        str: the path to the archive.
+    """
+    index = hosts.index(current_host)
+    children = [hosts[child] for child in (2 * index + 1, 2 * index + 2) if child < len(hosts)]
+    archive_path, sha256 = None, None
+    if index > 0:
+        parent = hosts[(index - 1) // 2]
+        try:
+            archive_path, sha256 = fetch_code_archive(parent, port, destination_dir, timeout)
+            print(f"Fetched customer code from {parent}")
+        except (TimeoutError, RuntimeError) as e:
+            print(f"Falling back to S3 for customer code.\nException: {e}")
+    if archive_path is None:
+        archive_path = fetch_from_s3()
+    if children:
+        serve_code_archive(archive_path, port, len(children), bind_address, sha256)
+    return archive_path
+
+
+def _get_distribution_hosts() -> Optional[Tuple[list, str]]:
+    if not _is_setting_enabled("AMZN_BRAKET_CODE_DISTRIBUTION"):
+        return None
+    resource_config = read_resource_config() or {}
+    hosts = resource_config.get("hosts") or []
+    current_host = resource_config.get("current_host")
+    if len(hosts) < 2 or current_host not in hosts:
+        return None
+    return hosts, current_host
+
+
+def prepare_customer_code(s3_uri: str, compression_type: str) -> None:
+    """
+    Makes the customer code available in the extracted customer path and adds it to the system
+    path. The code cache is consulted first; on a miss the code is downloaded and unpacked, then
+    stored in the cache for later jobs. With AMZN_BRAKET_CODE_DISTRIBUTION enabled on a
+    multi-host job, the code is downloaded once and fanned out to the other hosts instead, and
+    the cache is not consulted so that every host can serve its peers.
+
+    Args:
+        s3_uri (str): the S3 URI to get the code from.
+        compression_type (str): the compression type of the code, if it is an archive.
+    """
+    is_local = get_local_code_path(s3_uri) is not None
+    distribution_hosts = None if is_local else _get_distribution_hosts()
+    try:
+        # Distributing hosts skip the cache, so they also skip the HEAD request for its key.
+        cache_entry_path = None if is_local or distribution_hosts else _get_code_cache_entry_path(
+            s3_uri, compression_type
+        )
+        with _timed_phase("code_cache_restore"):
+            restored = bool(cache_entry_path) and restore_cached_code(cache_entry_path)
+        if restored:
+            print("Restored customer code from cache")
+            _add_extracted_code_to_path()
+            return
+    except Exception as e:
+        print(f"Code cache unavailable.\nException: {e}")
+        cache_entry_path = None
+
+    local_s3_file = None
+    if (
+        not is_local
+        and not distribution_hosts
+        and _is_archive(compression_type)
+        and _is_setting_enabled("AMZN_BRAKET_CODE_STREAMING")
+    ):
+        stream_customer_code(s3_uri, compression_type)
+    else:
+        with _timed_phase("download"):
+            if distribution_hosts:
+                hosts, current_host = distribution_hosts
+                local_s3_file = distribute_code_archive(
+                    hosts,
+                    current_host,
+                    int(_get_setting("AMZN_BRAKET_DISTRIBUTION_PORT") or DEFAULT_DISTRIBUTION_PORT),
+                    lambda: download_customer_code(s3_uri),
+                    ORIGINAL_CUSTOMER_CODE_PATH,
+                    timeout=float(
+                        _get_setting("AMZN_BRAKET_DISTRIBUTION_TIMEOUT")
+                        or DEFAULT_DISTRIBUTION_TIMEOUT
+                    ),
+                )
+            else:
+                local_s3_file = download_customer_code(s3_uri)
+        with _timed_phase("unpack"):
+            unpack_code_and_add_to_path(local_s3_file, compression_type)
+
+    if cache_entry_path:
+        try:
+            store_code_in_cache(cache_entry_path, local_s3_file)
+        except Exception as e:
+            print(f"Unable to cache customer code.\nException: {e}")
+
+
+class _SharedArray:
+    """
+    A picklable handle to a hyperparameter array held in a shared memory block. Only the block
+    name, shape and dtype are sent to the customer process, which maps the block instead of
+    unpickling a copy of the data.
+    """
+
+    def __init__(self, name: str, shape: tuple, dtype: str, as_list: bool):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.as_list = as_list
+
+    def resolve(self):
+        import numpy
+
+        try:
+            # The parent process owns the block and unlinks it once the customer code finishes.
+            block = shared_memory.SharedMemory(name=self.name, track=False)
+        except TypeError:
+            block = shared_memory.SharedMemory(name=self.name)
+        _attached_shared_memory.append(block)
+        array = numpy.ndarray(self.shape, dtype=self.dtype, buffer=block.buf)
+        return array.tolist() if self.as_list else array
+
+
+def _array_annotation_kind(annotation) -> Optional[str]:
+    origin = typing.get_origin(annotation)
+    if origin is list:
+        return "list"
+    origin = origin or annotation
+    if (
+        getattr(origin, "__name__", None) == "ndarray"
+        and getattr(origin, "__module__", "").startswith("numpy")
+    ):
+        return "ndarray"
+    return None
+
+
+def _list_item_type(annotation) -> Optional[type]:
+    while typing.get_origin(annotation) is list:
+        args = typing.get_args(annotation)
+        annotation = args[0] if args else None
+    return annotation if annotation in (bool, int, float, complex) else None
+
+
+def _share_array(array, as_list: bool) -> Optional[_SharedArray]:
+    import numpy
+
+    min_bytes = int(
+        _get_setting("AMZN_BRAKET_SHARED_MEMORY_MIN_BYTES") or DEFAULT_SHARED_MEMORY_MIN_BYTES
+    )
+    if array.dtype.kind not in "biufc" or array.nbytes == 0 or array.nbytes < min_bytes:
+        return None
+    try:
+        block = shared_memory.SharedMemory(create=True, size=array.nbytes)
+    except OSError as e:
+        print(f"Unable to place hyperparameter in shared memory.\nException: {e}")
+        return None
+    _shared_memory_blocks.append(block)
+    numpy.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+    return _SharedArray(block.name, array.shape, array.dtype.str, as_list)
+
+
+def _decode_hyperparameter(value: str, annotation, share: bool = True) -> Any:
+    """
+    Converts a hyperparameter to the type it is annotated with. Arrays, annotated as
+    numpy.ndarray or as a list of numbers such as list[float], are decoded from JSON once and,
+    when large enough and `share` is set, placed in shared memory so that the customer process
+    gets a view of them instead of a pickled copy.
+    """
+    kind = _array_annotation_kind(annotation)
+    if kind is None:
+        return annotation(value)
+    try:
+        decoded = json.loads(value) if isinstance(value, str) else value
+    except ValueError:
+        return annotation(value)
+    item_type = _list_item_type(annotation) if kind == "list" else None
+    if kind == "list" and item_type is None:
+        return decoded
+    try:
+        import numpy
+    except ImportError:
+        return decoded
+    try:
+        array = numpy.asarray(decoded, dtype=item_type)
+    except ValueError:
+        if kind == "list":
+            return decoded
+        raise
+    shared = _share_array(array, as_list=kind == "list") if share else None
+    if shared is not None:
+        return shared
+    return decoded if kind == "list" else array
+
+
+def release_shared_hyperparameters(blocks: Optional[list] = None) -> None:
+    """
+    Closes and unlinks the shared memory blocks holding hyperparameters for the customer process.
+
+    Args:
+        blocks (Optional[list]): the blocks to release. Default: all blocks.
+    """
+    blocks = _shared_memory_blocks if blocks is None else blocks
+    while blocks:
+        block = blocks.pop()
+        block.close()
+        with contextlib.suppress(FileNotFoundError):
+            block.unlink()
+
+
+def _read_hyperparameters() -> Optional[dict]:
+    hp_file = os.getenv("AMZN_BRAKET_HP_FILE")
+    if hp_file is None:
+        return None
+    with open(hp_file) as f:
+        return json.load(f)
+
+
+def try_bind_hyperparameters_to_customer_method(
+    customer_method: Callable, hyperparameters: Optional[dict] = None, share: bool = True
+):
+    if hyperparameters is None:
+        hyperparameters = _read_hyperparameters()
+    if hyperparameters is None:
+        return
+
+    try:
+        inspect.signature(customer_method).bind(**hyperparameters)
+    except TypeError:
+        return
+
+    annotations = inspect.getfullargspec(customer_method).annotations
+    function_args = {}
+    for param in hyperparameters:
+        function_args[param] = _decode_hyperparameter(
+            hyperparameters[param], annotations.get(param, str), share
+        )
+    return function_args
+
+
+def get_code_setup_parameters() -> Tuple[str, str, str]:
+    """
+    Returns the code setup parameters:
+        s3_uri: the S3 location where the code is stored. If AMZN_BRAKET_SCRIPT_LOCAL_PATH is
+            set, the local path (for example, a mounted volume) of the code instead.
+        entry_point: the entrypoint into the code.
+        compression_type: the compression used to archive the code (optional)
+    These values are stored in environment variables, however, we also allow the storing of
+    these values in the hyperparameters to facilitate testing in local mode.
+    If the s3_uri or entry_point can not be found, the script will exit with an error.
+
+    Returns:
+        str, str, str: the code setup parameters as described above.
+    """
+    local_path = os.getenv('AMZN_BRAKET_SCRIPT_LOCAL_PATH')
+    s3_uri = os.path.abspath(local_path) if local_path else os.getenv('AMZN_BRAKET_SCRIPT_S3_URI')
+    entry_point = os.getenv('AMZN_BRAKET_SCRIPT_ENTRY_POINT')
+    compression_type = os.getenv('AMZN_BRAKET_SCRIPT_COMPRESSION_TYPE')
+    if s3_uri and entry_point:
+        return s3_uri, entry_point, compression_type
+    hyperparameters_env = os.getenv('SM_HPS')
+    if hyperparameters_env:
+        try:
+            hyperparameters = json.loads(hyperparameters_env)
+            if not s3_uri:
+                local_path = hyperparameters.get("AMZN_BRAKET_SCRIPT_LOCAL_PATH")
+                s3_uri = (
+                    os.path.abspath(local_path)
+                    if local_path
+                    else hyperparameters.get("AMZN_BRAKET_SCRIPT_S3_URI")
+                )
+            if not entry_point:
+                entry_point = hyperparameters.get("AMZN_BRAKET_SCRIPT_ENTRY_POINT")
+            if not compression_type:
+                compression_type = hyperparameters.get("AMZN_BRAKET_SCRIPT_COMPRESSION_TYPE")
+        except Exception as e:
+            log_failure_and_exit("Hyperparameters not specified in env")
+    if not s3_uri:
+        log_failure_and_exit("No customer script specified")
+    if not entry_point:
+        log_failure_and_exit("No customer entry point specified")
+    return s3_uri, entry_point, compression_type
+
+
+def _get_install_paths() -> list:
+    paths = sysconfig.get_paths()
+    return sorted({paths["purelib"], paths["platlib"], paths["scripts"]})
+
+
+def _snapshot_install_paths() -> dict:
+    snapshot = {}
+    for install_path in _get_install_paths():
+        for current_dir, _, files in os.walk(install_path):
+            for file_name in files:
+                file_path = os.path.join(current_dir, file_name)
+                with contextlib.suppress(OSError):
+                    stat = os.lstat(file_path)
+                    snapshot[file_path] = [stat.st_size, stat.st_mtime_ns]
+    return snapshot
+
+
+def _hash_requirements_file(requirements_file_path: str, key, seen: set) -> bool:
+    """
+    Adds the content of a requirements file, and of the requirements and constraints files it
+    references, to a cache key.
+
+    Returns:
+        bool: False if the file installs local paths, whose content is not part of the key.
+    """
+    requirements_file_path = os.path.realpath(requirements_file_path)
+    if requirements_file_path in seen:
+        return True
+    seen.add(requirements_file_path)
+    with open(requirements_file_path, "rb") as requirements_file:
+        key.update(requirements_file.read())
+    requirements_dir = os.path.dirname(requirements_file_path)
+    for line in _read_requirement_lines(requirements_file_path):
+        if line.startswith("-"):
+            option, _, value = _absolute_requirement_option(line, requirements_dir).partition(" ")
+            if option in ("-r", "--requirement", "-c", "--constraint") and value:
+                if "://" in value or not _hash_requirements_file(value, key, seen):
+                    return False
+            elif option in ("-e", "--editable") and "://" not in value and "+" not in value:
+                return False
+        elif line.startswith((".", "/", "file:")):
+            return False
+    return True
+
+
+def _get_requirements_cache_entry_path(requirements_file_path: str) -> Optional[str]:
+    """
+    Returns the requirements cache entry for a requirements file. Entries are keyed by the
+    content of the file and the files it references with -r and -c, the interpreter, and the
+    distributions installed in the image, so an entry is only reused on an identical image.
+    Requirements files that install local paths are not cached.
+    """
+    cache_path = get_cache_path()
+    if not cache_path:
+        return None
+    key = hashlib.sha256()
+    if not _hash_requirements_file(requirements_file_path, key, set()):
+        print(f"Requirements in {requirements_file_path} install local paths; not caching them")
+        return None
+    key.update(f"{sys.executable} {sys.version}".encode())
+    installed = sorted(
+        f"{distribution.metadata['Name']}=={distribution.version}"
+        for distribution in importlib.metadata.distributions()
+    )
+    key.update("\n".join(installed).encode())
+    return os.path.join(cache_path, "requirements", key.hexdigest())
+
+
+def restore_cached_requirements(entry_path: str) -> bool:
+    """
+    Restores a site-packages delta captured by store_requirements_in_cache: removed files are
+    deleted and added or changed files are copied back in place.
+
+    Args:
+        entry_path (str): the requirements cache entry.
+    Returns:
+        bool: True if the requirements were restored from the cache.
+    """
+    entry = _read_cache_entry(entry_path)
+    if entry is None:
+        return False
+    for file_path in entry["deleted"]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(file_path)
+
+    def restore_file(file_path: str) -> None:
+        Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(file_path)
+        shutil.copy2(os.path.join(entry_path, "files", file_path.lstrip("/")), file_path,
+                     follow_symlinks=False)
+
+    with ThreadPoolExecutor() as executor:
+        list(executor.map(restore_file, entry["files"]))
+    importlib.invalidate_caches()
+    os.utime(os.path.join(entry_path, CACHE_ENTRY_FILE))
+    return True
+
+
+def store_requirements_in_cache(entry_path: str, before: dict) -> None:
+    """
+    Stores the difference between the install paths before and after a pip install in a
+    requirements cache entry, then evicts least recently used entries beyond
+    AMZN_BRAKET_REQUIREMENTS_CACHE_MAX_BYTES.
+
+    Args:
+        entry_path (str): the requirements cache entry.
+        before (dict): the snapshot of the install paths taken before the install.
+    """
+    after = _snapshot_install_paths()
+    changed = [file_path for file_path, stat in after.items() if before.get(file_path) != stat]
+    deleted = [file_path for file_path in before if file_path not in after]
+    staging_path = f"{entry_path}.staging-{os.getpid()}"
+    for file_path in changed:
+        cached_file = os.path.join(staging_path, "files", file_path.lstrip("/"))
+        Path(cached_file).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(file_path, cached_file, follow_symlinks=False)
+    Path(staging_path).mkdir(parents=True, exist_ok=True)
+    size = sum(after[file_path][0] for file_path in changed)
+    _commit_cache_entry(
+        staging_path, entry_path, {"files": changed, "deleted": deleted, "size": size}
+    )
+    max_bytes = int(
+        _get_setting("AMZN_BRAKET_REQUIREMENTS_CACHE_MAX_BYTES", DEFAULT_REQUIREMENTS_CACHE_MAX_BYTES)
+    )
+    _evict_cache_entries(os.path.dirname(entry_path), max_bytes)
+
+
+def _read_requirement_lines(requirements_file_path: str) -> list:
+    with open(requirements_file_path) as requirements_file:
+        content = requirements_file.read().replace("\\\n", "")
+    lines = []
+    for line in content.splitlines():
+        line = line.split(" #", 1)[0].strip()
+        if line and not line.startswith("#"):
+            lines.append(line)
+    return lines
+
+
+def find_unsatisfied_requirements(requirement_lines: list) -> Optional[list]:
+    """
+    Evaluates requirement specifiers against the installed distributions, without running pip.
+    Requirements whose environment markers do not apply are considered satisfied.
+
+    Args:
+        requirement_lines (list): the requirement lines of a requirements file.
+    Returns:
+        Optional[list]: the requirement lines that are not satisfied, or None if the lines can
+        not be checked in-process (pip options, URLs, extras, or packaging is not installed).
+    """
+    try:
+        from packaging.requirements import InvalidRequirement, Requirement
+    except ImportError:
+        return None
+    unsatisfied = []
+    for line in requirement_lines:
+        if line.startswith("-"):
+            return None
+        try:
+            requirement = Requirement(line)
+        except InvalidRequirement:
+            return None
+        if requirement.url or requirement.extras:
+            return None
+        if requirement.marker and not requirement.marker.evaluate():
+            continue
+        try:
+            installed_version = importlib.metadata.version(requirement.name)
+        except importlib.metadata.PackageNotFoundError:
+            unsatisfied.append(line)
+            continue
+        if not requirement.specifier.contains(installed_version, prereleases=True):
+            unsatisfied.append(line)
+    return unsatisfied
+
+
+def install_requirements_file(requirements_file_path: str) -> bool:
+    """
+    Installs a requirements file with pip. With AMZN_BRAKET_REQUIREMENTS_PRECHECK enabled,
+    requirements already satisfied by the image are skipped without starting pip. With
+    AMZN_BRAKET_REQUIREMENTS_CACHE enabled, the resulting site-packages delta is cached and
+    restored on later jobs instead of running pip.
+
+    Args:
+        requirements_file_path (str): the requirements file to install.
+    Returns:
+        bool: False if pip failed.
+    """
+    install_file_path = requirements_file_path
+    if _is_setting_enabled("AMZN_BRAKET_REQUIREMENTS_PRECHECK"):
+        start = time.time()
+        requirement_lines = _read_requirement_lines(requirements_file_path)
+        unsatisfied = find_unsatisfied_requirements(requirement_lines)
+        elapsed = time.time() - start
+        if unsatisfied is None:
+            print(f"Requirements in {requirements_file_path} can not be pre-checked; running pip")
+        elif not unsatisfied:
+            print(
+                f"All {len(requirement_lines)} requirements in {requirements_file_path} are "
+                f"already satisfied; skipped pip (checked in {elapsed:.3f}s)"
+            )
+            return True
+        else:
+            print(
+                f"{len(requirement_lines) - len(unsatisfied)} of {len(requirement_lines)} "
+                f"requirements in {requirements_file_path} are already satisfied (checked in "
+                f"{elapsed:.3f}s); installing the remaining {len(unsatisfied)} with pip"
+            )
+            with tempfile.NamedTemporaryFile(
+                "w", suffix=".txt", prefix="unsatisfied-", delete=False
+            ) as unsatisfied_file:
+                unsatisfied_file.write("\n".join(unsatisfied) + "\n")
+            install_file_path = unsatisfied_file.name
+
+    try:
+        return _install_requirements_file_with_pip(requirements_file_path, install_file_path)
+    finally:
+        if install_file_path != requirements_file_path:
+            os.remove(install_file_path)
+
+
+def _install_requirements_file_with_pip(
+    requirements_file_path: str, install_file_path: str
+) -> bool:
+    cache_entry_path = None
+    if _is_setting_enabled("AMZN_BRAKET_REQUIREMENTS_CACHE"):
+        try:
+            cache_entry_path = _get_requirements_cache_entry_path(requirements_file_path)
+            if cache_entry_path and restore_cached_requirements(cache_entry_path):
+                print(f"Restored requirements for {requirements_file_path} from cache")
+                return True
+            before = _snapshot_install_paths()
+        except Exception as e:
+            print(f"Requirements cache unavailable.\nException: {e}")
+            cache_entry_path = None
+    result = subprocess.run(
+        ["python", "-m", "pip", "install", "-r", install_file_path],
+        cwd=EXTRACTED_CUSTOMER_CODE_PATH
+    )
+    if result.returncode != 0:
+        print(f"pip exited with code {result.returncode} installing {requirements_file_path}")
+        return False
+    if cache_entry_path:
+        try:
+            store_requirements_in_cache(cache_entry_path, before)
+        except Exception as e:
+            print(f"Unable to cache requirements.\nException: {e}")
+    return True
+
+
+REQUIREMENT_PATH_OPTIONS = ["-r", "--requirement", "-c", "--constraint", "-e", "--editable"]
+
+
+def _absolute_requirement_option(line: str, requirements_dir: str) -> str:
+    option, _, value = line.partition(" ")
+    if "=" in option and option.startswith("--"):
+        option, _, value = line.partition("=")
+    value = value.strip()
+    if option in REQUIREMENT_PATH_OPTIONS and value and "://" not in value:
+        return f"{option} {os.path.normpath(os.path.join(requirements_dir, value))}"
+    return line
+
+
+def _is_satisfiable(specifier) -> bool:
+    """
+    Checks whether any version satisfies a specifier set. The versions allowed by a specifier
+    set form a range with some versions excluded, so one of the versions it mentions, a version
+    just above one of them, or the lowest version is allowed unless none is.
+    """
+    from packaging.version import InvalidVersion, Version
+
+    if any(spec.operator == "===" for spec in specifier):
+        return True
+    versions = []
+    for spec in specifier:
+        with contextlib.suppress(InvalidVersion):
+            versions.append(Version(spec.version.rstrip(".*")))
+    release_length = max((len(version.release) for version in versions), default=0) + 1
+    candidates = ["0"]
+    for version in versions:
+        candidates.append(str(version))
+        if not (version.is_prerelease or version.is_postrelease or version.local):
+            release = version.release + (0,) * (release_length - len(version.release))
+            candidates.append(".".join(map(str, release[:-1] + (1,))))
+    return any(specifier.contains(candidate, prereleases=True) for candidate in candidates)
+
+
+def merge_requirements_files(requirements_file_paths: list) -> Tuple[Optional[list], list]:
+    """
+    Merges several requirements files into one list of requirement lines. Requirements for the
+    same project are combined into a single specifier, options are deduplicated, and relative
+    paths in options are made absolute.
+
+    Args:
+        requirements_file_paths (list): the requirements files to merge.
+    Returns:
+        Tuple[Optional[list], list]: the merged requirement lines, or None if the files can not
+        be merged (packaging is not installed), and a description of each conflict found.
+    """
+    try:
+        from packaging.requirements import InvalidRequirement, Requirement
+        from packaging.specifiers import SpecifierSet
+        from packaging.utils import canonicalize_name
+    except ImportError:
+        return None, []
+    options = []
+    other_lines = []
+    merged = {}
+    for requirements_file_path in requirements_file_paths:
+        requirements_dir = os.path.dirname(requirements_file_path)
+        for line in _read_requirement_lines(requirements_file_path):
+            if line.startswith("-"):
+                line = _absolute_requirement_option(line, requirements_dir)
+                if line not in options:
+                    options.append(line)
+                continue
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement:
+                other_lines.append(line)
+                continue
+            if requirement.url or requirement.marker:
+                if line not in other_lines:
+                    other_lines.append(line)
+                continue
+            name = canonicalize_name(requirement.name)
+            merged.setdefault(name, []).append((requirement, requirements_file_path))
+
+    lines = list(options)
+    conflicts = []
+    for name, requirements in merged.items():
+        specifier = SpecifierSet()
+        extras = set()
+        for requirement, _ in requirements:
+            specifier &= requirement.specifier
+            extras |= requirement.extras
+        if not _is_satisfiable(specifier):
+            conflicts.append(
+                f"{name}: " + " vs ".join(
+                    f"{requirement.specifier or 'any'} ({requirements_file_path})"
+                    for requirement, requirements_file_path in requirements
+                )
+            )
+        extras_string = f"[{','.join(sorted(extras))}]" if extras else ""
+        lines.append(f"{requirements[0][0].name}{extras_string}{specifier}")
+    return lines + other_lines, conflicts
+
+
+def _install_merged_requirements(requirements_file_paths: list) -> bool:
+    """
+    Installs several requirements files with a single pip resolver run.
+
+    Returns:
+        bool: False if the files could not be merged and must be installed one by one.
+    """
+    start = time.time()
+    lines, conflicts = merge_requirements_files(requirements_file_paths)
+    if lines is None:
+        print("Requirements can not be merged; installing each file separately")
+        return False
+    if conflicts:
+        print("Conflicting requirements found; installing each file separately:")
+        for conflict in conflicts:
+            print(f"  {conflict}")
+        return False
+    with tempfile.NamedTemporaryFile(
+        "w", suffix=".txt", prefix="merged-requirements-", delete=False
+    ) as merged_file:
+        merged_file.write("\n".join(lines) + "\n")
+    try:
+        installed = install_requirements_file(merged_file.name)
+    finally:
+        os.remove(merged_file.name)
+    if not installed:
+        print("Merged requirements could not be installed; installing each file separately")
+        return False
+    print(
+        f"Installed {len(lines)} merged requirements from {len(requirements_file_paths)} files "
+        f"in {time.time() - start:.3f}s"
+    )
+    return True
+
+
+def install_additional_requirements() -> None:
+    """
+    Search for requirements from requirements.txt and install them. With
+    AMZN_BRAKET_REQUIREMENTS_MERGE enabled, all requirements files found are merged and
+    installed with a single pip resolver run.
+    """
+    try:
+        print("Checking for Additional Requirements")
+        requirements_file_paths = []
+        if (manifest := get_code_manifest()) is not None:
+            for path in manifest["requirements"]:
+                requirements_file_paths.append(os.path.join(EXTRACTED_CUSTOMER_CODE_PATH, path))
+        else:
+            for root, _, files in os.walk(EXTRACTED_CUSTOMER_CODE_PATH):
+                if "requirements.txt" in files:
+                    requirements_file_paths.append(os.path.join(root, "requirements.txt"))
+        if not (
+            len(requirements_file_paths) > 1
+            and _is_setting_enabled("AMZN_BRAKET_REQUIREMENTS_MERGE")
+            and _install_merged_requirements(requirements_file_paths)
+        ):
+            for requirements_file_path in requirements_file_paths:
+                install_requirements_file(requirements_file_path)
+        print("Additional Requirements Check Finished")
+    except Exception as e:
+        log_failure_and_exit(f"Unable to install requirements.\nException: {e}")
+
+
+def extract_customer_code(entry_point: str) -> Callable:
+    """
+    Converts entry point to a runnable function.
+    """
+    if entry_point.find(":") >= 0:
+        str_module, _, str_method = entry_point.partition(":")
+        customer_module = importlib.import_module(str_module)
+        customer_code = getattr(customer_module, str_method)
+    else:
+        def customer_code():
+            # equivalent to `python -m entry_point`
+            return run_module_entry_point(entry_point)
+    return customer_code
+
+
+def _new_event_loop() -> asyncio.AbstractEventLoop:
+    if not _is_setting_enabled("AMZN_BRAKET_DISABLE_UVLOOP"):
+        try:
+            import uvloop
+
+            return uvloop.new_event_loop()
+        except ImportError:
+            pass
+    # Not asyncio.new_event_loop(), which defers to the event loop policy.
+    return asyncio.SelectorEventLoop()
+
+
+class _EventLoopMonitor:
+    """
+    Counts the tasks created on an event loop and samples its scheduling lag: how late a
+    callback scheduled every AMZN_BRAKET_LOOP_LAG_INTERVAL seconds actually runs, which grows
+    when customer code blocks the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.interval = float(
+            _get_setting("AMZN_BRAKET_LOOP_LAG_INTERVAL") or DEFAULT_LOOP_LAG_INTERVAL
+        )
+        self.tasks_created = 0
+        self.tasks_pending = 0
+        self.max_tasks_pending = 0
+        self.lag_samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        loop.set_task_factory(self._create_task)
+        self._expected = loop.time() + self.interval
+        self._handle = loop.call_at(self._expected, self._sample_lag)
+        _event_loop_monitors.append(self)
+
+    def _create_task(self, loop, coro, **kwargs):
+        task = asyncio.Task(coro, loop=loop, **kwargs)
+        self.tasks_created += 1
+        self.tasks_pending += 1
+        self.max_tasks_pending = max(self.max_tasks_pending, self.tasks_pending)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self.tasks_pending -= 1
+
+    def _sample_lag(self):
+        now = self.loop.time()
+        lag = max(0.0, now - self._expected)
+        self.lag_samples += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        self._expected = now + self.interval
+        self._handle = self.loop.call_at(self._expected, self._sample_lag)
+
+    def close(self):
+        self._handle.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "loop": type(self.loop).__module__.partition(".")[0],
+            "tasks_created": self.tasks_created,
+            "tasks_pending": self.tasks_pending,
+            "max_tasks_pending": self.max_tasks_pending,
+            "max_lag_seconds": self.max_lag,
+            "mean_lag_seconds": self.total_lag / self.lag_samples if self.lag_samples else 0.0,
+        }
+
+
+class _ManagedEventLoopPolicy(asyncio.DefaultEventLoopPolicy):
+    """
+    Creates monitored event loops, using uvloop when it is installed, for customer code that
+    starts its own loop, e.g. with asyncio.run().
+    """
+
+    def new_event_loop(self):
+        loop = _new_event_loop()
+        _EventLoopMonitor(loop)
+        return loop
+
+
+def get_event_loop_stats() -> Optional[dict]:
+    """
+    Returns the task and lag statistics of the most recent event loop run by the customer code,
+    or None if it has not run an event loop.
+    """
+    return _event_loop_monitors[-1].stats() if _event_loop_monitors else None
+
+
+def _report_event_loops() -> None:
+    while _event_loop_monitors:
+        stats = _event_loop_monitors.pop(0).stats()
+        print(
+            f"Metrics - timestamp={time.time()}; "
+            f"container_event_loop_tasks={stats['tasks_created']}; "
+            f"container_event_loop_max_pending_tasks={stats['max_tasks_pending']}; "
+            f"container_event_loop_max_lag_seconds={stats['max_lag_seconds']:.6f}; "
+            f"container_event_loop_mean_lag_seconds={stats['mean_lag_seconds']:.6f};"
+        )
+
+
+def run_coroutine(coroutine) -> Any:
+    """
+    Runs a coroutine returned by an async customer entry point to completion on a monitored
+    event loop, using uvloop when it is installed.
+
+    Args:
+        coroutine: the coroutine to run.
+    Returns:
+        Any: the result of the coroutine.
+    """
+    with asyncio.Runner(loop_factory=_new_event_loop) as runner:
+        monitor = _EventLoopMonitor(runner.get_loop())
+        try:
+            return runner.run(coroutine)
+        finally:
+            monitor.close()
+            _report_event_loops()
+
+
+def _inspect_entry_module(module_name: str) -> Tuple[bool, bool]:
+    """
+    Reads the source of an entry point module to find whether it defines an async `main`, and
+    whether it may run `main` itself: it refers to `main` anywhere but its definition, runs an
+    event loop (asyncio.run, uvloop.run, run_until_complete, ...) or has an
+    `if __name__ == "__main__"` block. Without the source, the module is assumed to run itself.
+    """
+    try:
+        source = importlib.util.find_spec(module_name).loader.get_source(module_name)
+        tree = ast.parse(source or "")
+    except Exception:
+        return False, True
+    defines_async_main = any(
+        isinstance(node, ast.AsyncFunctionDef) and node.name == "main" for node in tree.body
+    )
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id in ("main", "__name__"):
+            return defines_async_main, True
+        if isinstance(node, ast.Attribute) and node.attr in ("main", "run", "run_until_complete"):
+            return defines_async_main, True
+    return defines_async_main, False
+
+
+def run_module_entry_point(entry_point: str) -> dict:
+    """
+    Runs an entry point module as `python -m entry_point` would. If the module defines an async
+    `main`, event loops it starts through asyncio are created by a managed policy, and if
+    nothing in the module can run `main`, `main` is run on a managed event loop.
+
+    Args:
+        entry_point (str): the module to run.
+    Returns:
+        dict: the globals of the module.
+    """
+    defines_async_main, runs_itself = _inspect_entry_module(entry_point)
+    if not defines_async_main:
+        return runpy.run_module(entry_point, run_name="__main__")
+    previous_policy = asyncio.get_event_loop_policy()
+    asyncio.set_event_loop_policy(_ManagedEventLoopPolicy())
+    try:
+        module_globals = runpy.run_module(entry_point, run_name="__main__")
+        main = module_globals.get("main")
+        if inspect.iscoroutinefunction(main) and not runs_itself:
+            print(f"Running async main of {entry_point}")
+            run_coroutine(main())
+        return module_globals
+    finally:
+        asyncio.set_event_loop_policy(previous_policy)
+        _report_event_loops()
+
+
+@contextlib.contextmanager
+def in_extracted_code_dir():
+    with _chdir_lock:
+        current_dir = os.getcwd()
+        try:
+            os.chdir(EXTRACTED_CUSTOMER_CODE_PATH)
+            yield
+        finally:
+            os.chdir(current_dir)
+
+
+def _register_module_alias() -> None:
+    # The container runs this file as __main__; make `import braket_container` in customer code
+    # resolve to this module, rather than load a second copy, so that shutdown hooks are
+    # registered where they are run.
+    sys.modules.setdefault("braket_container", sys.modules[__name__])
+
+
+def register_shutdown_hook(callback: Callable) -> Callable:
+    """
+    Registers a callback to run when the job is asked to stop, for example on spot interruption
+    or when the maximum runtime is reached, so that customer code can flush a checkpoint within
+    the grace period. Customer code can register callbacks with:
+
+        import braket_container
+        braket_container.register_shutdown_hook(save_checkpoint)
+
+    Args:
+        callback (Callable): a function taking no arguments.
+    Returns:
+        Callable: the callback, so that this can be used as a decorator.
+    """
+    _shutdown_hooks.append(callback)
+    return callback
+
+
+def _load_shutdown_hook() -> None:
+    hook = _get_setting("AMZN_BRAKET_SHUTDOWN_HOOK")
+    if not hook:
+        return
+    module_name, _, function_name = hook.partition(":")
+    try:
+        register_shutdown_hook(getattr(importlib.import_module(module_name), function_name))
+    except Exception as e:
+        print(f"Unable to load shutdown hook {hook}.\nException: {e}")
+
+
+def _run_shutdown_hooks(signum: int, frame) -> None:
+    print(f"Customer process received signal {signum}, running shutdown hooks")
+    while _shutdown_hooks:
+        callback = _shutdown_hooks.pop()
+        try:
+            callback()
+        except Exception as e:
+            print(f"Shutdown hook {callback} failed.\nException: {e}")
+    sys.exit(128 + signum)
+
+
+@contextlib.contextmanager
+def _signal_handlers(handler: Callable):
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = {signum: signal.signal(signum, handler) for signum in SHUTDOWN_SIGNALS}
+    try:
+        yield
+    finally:
+        for signum, previous_handler in previous.items():
+            signal.signal(signum, previous_handler)
+
+
+@contextlib.contextmanager
+def _forward_shutdown_signals(get_processes: Callable[[], list]):
+    grace_period = float(
+        _get_setting("AMZN_BRAKET_SHUTDOWN_GRACE_PERIOD") or DEFAULT_SHUTDOWN_GRACE_PERIOD
+    )
+    shutting_down = threading.Event()
+    timers = []
+
+    def kill_customer_processes():
+        print(f"Customer process did not exit within {grace_period}s, killing it")
+        for process in get_processes():
+            with contextlib.suppress(Exception):
+                process.kill()
+
+    def forward(signum, frame):
+        print(f"Received signal {signum}, forwarding to the customer process")
+        shutting_down.set()
+        for process in get_processes():
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(process.pid, signum)
+        if not timers:
+            timers.append(threading.Timer(grace_period, kill_customer_processes))
+            timers[0].daemon = True
+            timers[0].start()
+
+    try:
+        with _signal_handlers(forward):
+            yield shutting_down
+    finally:
+        for timer in timers:
+            timer.cancel()
+
+
+def forward_shutdown_signals(customer_code_process: multiprocessing.Process):
+    """
+    Forwards SIGTERM and SIGINT received by this process to the customer process. If the
+    customer process has not exited AMZN_BRAKET_SHUTDOWN_GRACE_PERIOD seconds after the first
+    signal, it is killed.
+
+    Args:
+        customer_code_process (Process): the process running the customer code.
+    """
+    return _forward_shutdown_signals(lambda: [customer_code_process])
+
+
+class _StackSampler(threading.Thread):
+    """
+    Samples the stack of a thread at a fixed interval and counts the stacks in collapsed form,
+    one `outer;inner count` line per stack, the input format of flame graph tools.
+    """
+
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(name="braket-stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                names.append(
+                    f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+                )
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def write(self, path: str) -> None:
+        with open(path, "w") as stacks_file:
+            for stack, count in self.stacks.most_common():
+                stacks_file.write(f"{stack} {count}\n")
+
+
+def _write_tracemalloc_report(path: str, snapshot, current: int, peak: int) -> None:
+    with open(path, "w") as report_file:
+        report_file.write(f"Current traced memory: {current} bytes, peak: {peak} bytes\n")
+        report_file.write(f"Top {TRACEMALLOC_TOP_ALLOCATIONS} allocation sites:\n")
+        for statistic in snapshot.statistics("traceback")[:TRACEMALLOC_TOP_ALLOCATIONS]:
+            report_file.write(f"{statistic}\n")
+            for line in statistic.traceback.format(most_recent_first=True):
+                report_file.write(f"    {line}\n")
+
+
+@contextlib.contextmanager
+def profile_customer_code():
+    """
+    Profiles the customer code run inside the context with the profilers listed in
+    AMZN_BRAKET_PROFILER (comma separated): cprofile, writing pstats; sampler, a periodic
+    stack sampler writing collapsed stacks; and tracemalloc, writing the top allocation sites.
+    The profiles are written under /opt/ml/output/data/profile, so that they are uploaded
+    with the job output, whether the customer code succeeds or fails.
+    """
+    profilers = [
+        name.strip().lower()
+        for name in (_get_setting("AMZN_BRAKET_PROFILER") or "").split(",")
+        if name.strip()
+    ]
+    for name in profilers:
+        if name not in PROFILERS:
+            print(f"Unknown profiler {name}; supported profilers are {', '.join(PROFILERS)}")
+    profilers = [name for name in profilers if name in PROFILERS]
+    if not profilers:
+        yield
+        return
+    print(f"Profiling customer code with {', '.join(profilers)}")
+    output_prefix = os.path.join(PROFILE_OUTPUT_PATH, f"{os.getpid()}-")
+    profile, sampler, tracemalloc = None, None, None
+    if "tracemalloc" in profilers:
+        import tracemalloc
+
+        tracemalloc.start(
+            int(_get_setting("AMZN_BRAKET_TRACEMALLOC_FRAMES") or DEFAULT_TRACEMALLOC_FRAMES)
+        )
+    if "sampler" in profilers:
+        sampler = _StackSampler(
+            threading.get_ident(),
+            float(_get_setting("AMZN_BRAKET_PROFILER_INTERVAL") or DEFAULT_PROFILER_INTERVAL),
+        )
+        sampler.start()
+    if "cprofile" in profilers:
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+        if sampler is not None:
+            sampler.stop()
+        if tracemalloc is not None:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        try:
+            Path(PROFILE_OUTPUT_PATH).mkdir(parents=True, exist_ok=True)
+            if profile is not None:
+                profile.dump_stats(f"{output_prefix}cprofile.pstats")
+            if sampler is not None:
+                sampler.write(f"{output_prefix}stacks.txt")
+            if tracemalloc is not None:
+                _write_tracemalloc_report(
+                    f"{output_prefix}tracemalloc.txt", snapshot, current, peak
+                )
+            print(f"Wrote customer code profiles to {PROFILE_OUTPUT_PATH}")
+        except OSError as e:
+            print(f"Unable to write customer code profiles.\nException: {e}")
+
+
+def wrap_customer_code(customer_method: Callable, **kwargs) -> Any:
+    """Run the customer method inside the extracted code dir, logging any
+    exception before re-raising.
+
+    This is a module-level function (not a closure factory) so it can be
+    pickled by `multiprocessing.Process`. Some imported libraries (e.g. cudaq)
+    change the default start method from fork to forkserver, which pickles
+    the target; a nested closure would break that path.
+    """
+    with contextlib.suppress(OSError), open(_customer_start_file(), "w") as start_file:
+        start_file.write(str(time.time()))
+    _register_module_alias()
+    import_profiler = start_import_profiler()
+    import_snapshot = import_profiler.snapshot() if import_profiler else None
+    try:
+        kwargs = {
+            name: value.resolve() if isinstance(value, _SharedArray) else value
+            for name, value in kwargs.items()
+        }
+        _local.phase = "customer_code"
+        with (
+            in_extracted_code_dir(),
+            _signal_handlers(_run_shutdown_hooks),
+            profile_customer_code(),
+        ):
+            _load_shutdown_hook()
+            result = customer_method(**kwargs)
+            if inspect.iscoroutine(result):
+                result = run_coroutine(result)
+            return result
+    except Exception as e:
+        exception_type = type(e).__name__
+        exception_string = (
+            exception_type
+            if not str(e)
+            else f"{exception_type}: {e}"
+        )
+        _log_failure(exception_string, display=False)
+        raise e
+    finally:
+        if import_profiler is not None:
+            with contextlib.suppress(OSError):
+                _write_json_atomic(
+                    _customer_import_profile_file(),
+                    _import_profile_since(import_profiler, import_snapshot),
+                )
+
+
+def _customer_start_file() -> str:
+    return os.path.join(os.path.dirname(EXTRACTED_CUSTOMER_CODE_PATH), "customer_started")
+
+
+def start_zygote(module_names: list):
+    """
+    Prepares a warm parent for the customer process. With the fork start method the modules are
+    imported into this process and the heap is frozen with gc.freeze(), so that the customer
+    process forks from the warm state and the copy-on-write pages stay shared. Otherwise the
+    modules are preloaded by the forkserver, followed by a generated module that freezes the
+    forkserver's heap, and the customer process forks from that warm state instead of
+    re-importing them in a spawned child.
+
+    Args:
+        module_names (list): the modules to preload.
+    Returns:
+        the multiprocessing context to start the customer process from.
+    """
+    module_names = [
+        name for name in module_names
+        if importlib.util.find_spec(name.partition(".")[0]) is not None
+    ]
+    if multiprocessing.get_start_method() == "fork":
+        for name in module_names:
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                print(f"Unable to preload {name}.\nException: {e}")
+        gc.collect()
+        gc.freeze()
+        return multiprocessing.get_context("fork")
+    # The forkserver imports its preload modules in order, so the generated module runs last.
+    freeze_path = tempfile.mkdtemp(prefix="braket-zygote-")
+    with open(os.path.join(freeze_path, f"{ZYGOTE_FREEZE_MODULE}.py"), "w") as f:
+        f.write("import gc\n\ngc.collect()\ngc.freeze()\n")
+    context = multiprocessing.get_context("forkserver")
+    context.set_forkserver_preload(module_names + [ZYGOTE_FREEZE_MODULE])
+    # Not every Python version passes sys.path on to the forkserver, so it is started here with
+    # the generated module on PYTHONPATH.
+    python_path = os.environ.get("PYTHONPATH")
+    os.environ["PYTHONPATH"] = os.pathsep.join(filter(None, [python_path, freeze_path]))
+    try:
+        multiprocessing.forkserver.ensure_running()
+    finally:
+        if python_path is None:
+            del os.environ["PYTHONPATH"]
+        else:
+            os.environ["PYTHONPATH"] = python_path
+    return context
+
+
+def kick_off_customer_script(customer_code: Callable) -> multiprocessing.Process:
+    """
+    Runs the customer script as a separate process.
+
+    Args:
+        customer_code (Callable): The customer method to be run.
 
     Returns:
         Process: the process handle to the running process.
@@ -309,15 +2868,197 @@ def kick_off_customer_script(customer_code: Callable) -> multiprocessing.Process
         "args": (customer_code,),
     }
 
-    function_args = try_bind_hyperparameters_to_customer_method(customer_code)
+    context = _get_customer_process_context()
+    # Forked processes inherit the arguments without pickling, so there is nothing to share.
+    function_args = try_bind_hyperparameters_to_customer_method(
+        customer_code, share=context.get_start_method() != "fork"
+    )
     if function_args is not None:
         process_kwargs["kwargs"] = function_args
 
-    customer_code_process = multiprocessing.Process(**process_kwargs)
+    with contextlib.suppress(OSError):
+        os.remove(_customer_start_file())
+    customer_code_process = context.Process(**process_kwargs)
+    _customer_launch.update(
+        time=time.time(), zygote=bool(_get_setting("AMZN_BRAKET_ZYGOTE_MODULES"))
+    )
     customer_code_process.start()
     return customer_code_process
 
 
+def _get_customer_process_context():
+    zygote_modules = _get_setting("AMZN_BRAKET_ZYGOTE_MODULES")
+    if not zygote_modules:
+        return multiprocessing
+    return start_zygote([name.strip() for name in zygote_modules.split(",") if name.strip()])
+
+
+def _report_customer_startup() -> None:
+    """
+    Reports the time from launching the customer process to the customer code starting.
+    """
+    try:
+        with open(_customer_start_file()) as start_file:
+            start_time = float(start_file.read())
+    except (OSError, ValueError):
+        return
+    launch_time = _customer_launch.get("time")
+    if launch_time is None:
+        return
+    mode = "zygote" if _customer_launch.get("zygote") else multiprocessing.get_start_method()
+    _record_phase("process_startup", launch_time, start_time, launcher=mode)
+    _record_phase("customer_runtime", start_time, time.time())
+    print(f"Customer code started {start_time - launch_time:.3f}s after launch ({mode})")
+
+
+def _read_proc_file(pid: int, name: str) -> str:
+    try:
+        with open(f"/proc/{pid}/{name}") as proc_file:
+            return proc_file.read()
+    except OSError:
+        return ""
+
+
+def _parse_proc_fields(text: str) -> dict:
+    fields = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        parts = value.split()
+        if parts and parts[0].isdigit():
+            multiplier = 1024 if parts[-1] == "kB" else 1
+            fields[key.strip()] = int(parts[0]) * multiplier
+    return fields
+
+
+def _process_tree(pid: int) -> list:
+    children = collections.defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            stat = _read_proc_file(int(entry), "stat").rpartition(")")[2].split()
+            if len(stat) > 1:
+                children[int(stat[1])].append(int(entry))
+    tree = [pid]
+    for parent in tree:
+        tree.extend(children.get(parent, []))
+    return tree
+
+
+def sample_process_tree(pid: int) -> Optional[dict]:
+    """
+    Samples the resource usage of a process and all of its descendants from /proc.
+
+    Args:
+        pid (int): the root of the process tree.
+    Returns:
+        Optional[dict]: the totals over the process tree, or None if the process has exited.
+    """
+    clock_ticks = os.sysconf("SC_CLK_TCK")
+    sample = {
+        "time": time.time(),
+        "processes": 0,
+        "cpu_user_seconds": 0.0,
+        "cpu_system_seconds": 0.0,
+        "rss_bytes": 0,
+        "pss_bytes": 0,
+        "threads": 0,
+        "read_bytes": 0,
+        "write_bytes": 0,
+        "voluntary_context_switches": 0,
+        "involuntary_context_switches": 0,
+    }
+    for process_id in _process_tree(pid):
+        # Fields after the command name, starting with the state (field 3 of proc(5)).
+        stat = _read_proc_file(process_id, "stat").rpartition(")")[2].split()
+        if len(stat) < 18:
+            continue
+        status = _parse_proc_fields(_read_proc_file(process_id, "status"))
+        io_counters = _parse_proc_fields(_read_proc_file(process_id, "io"))
+        smaps = _parse_proc_fields(_read_proc_file(process_id, "smaps_rollup"))
+        sample["processes"] += 1
+        sample["cpu_user_seconds"] += int(stat[11]) / clock_ticks
+        sample["cpu_system_seconds"] += int(stat[12]) / clock_ticks
+        sample["threads"] += int(stat[17])
+        sample["rss_bytes"] += status.get("VmRSS", 0)
+        sample["pss_bytes"] += smaps.get("Pss", 0)
+        sample["read_bytes"] += io_counters.get("read_bytes", 0)
+        sample["write_bytes"] += io_counters.get("write_bytes", 0)
+        sample["voluntary_context_switches"] += status.get("voluntary_ctxt_switches", 0)
+        sample["involuntary_context_switches"] += status.get("nonvoluntary_ctxt_switches", 0)
+    return sample if sample["processes"] else None
+
+
+class _ResourceSampler(threading.Thread):
+    """
+    Samples the customer process tree at a fixed interval and appends each sample as a JSON line
+    to RESOURCE_SAMPLES_FILE, so that the data survives the job being killed.
+    """
+
+    def __init__(self, pid: int, interval: float):
+        super().__init__(name="braket-resource-sampler", daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss_bytes = 0
+        self.last_samples = collections.deque(maxlen=RESOURCE_SAMPLES_IN_FAILURE_LOG)
+        self._stopped = threading.Event()
+
+    def run(self):
+        try:
+            Path(RESOURCE_SAMPLES_FILE).parent.mkdir(parents=True, exist_ok=True)
+            with open(RESOURCE_SAMPLES_FILE, "a") as samples_file:
+                while True:
+                    sample = sample_process_tree(self.pid)
+                    if sample is not None:
+                        self.peak_rss_bytes = max(self.peak_rss_bytes, sample["rss_bytes"])
+                        self.last_samples.append(sample)
+                        samples_file.write(json.dumps(sample) + "\n")
+                        samples_file.flush()
+                    if self._stopped.wait(self.interval):
+                        return
+        except OSError as e:
+            print(f"Unable to record resource samples.\nException: {e}")
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+    def summary(self) -> str:
+        # ru_maxrss is in kilobytes on Linux.
+        max_rss_bytes = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+        lines = [
+            f"Peak RSS of the customer process tree: {self.peak_rss_bytes} bytes "
+            f"(largest single process: {max_rss_bytes} bytes)."
+        ]
+        if self.last_samples:
+            lines.append("Last resource samples:")
+            lines.extend(json.dumps(sample) for sample in self.last_samples)
+        return "\n".join(lines) + "\n"
+
+
+def start_resource_sampler(pid: int) -> Optional[_ResourceSampler]:
+    """
+    Starts sampling the resource usage of the customer process tree every
+    AMZN_BRAKET_RESOURCE_SAMPLE_INTERVAL seconds. Sampling is disabled if the setting is not set.
+
+    Args:
+        pid (int): the customer process.
+    Returns:
+        Optional[_ResourceSampler]: the running sampler, or None if sampling is disabled.
+    """
+    interval = _get_setting("AMZN_BRAKET_RESOURCE_SAMPLE_INTERVAL")
+    if not interval or not os.path.isdir("/proc"):
+        return None
+    try:
+        interval = float(interval)
+    except ValueError:
+        print(f"Invalid resource sample interval: {interval}")
+        return None
+    if interval <= 0:
+        return None
+    sampler = _ResourceSampler(pid, interval)
+    sampler.start()
+    return sampler
+
+
 def join_customer_script(customer_code_process: multiprocessing.Process):
     """
     Joins the process running the customer code.
@@ -325,12 +3066,22 @@ def join_customer_script(customer_code_process: multiprocessing.Process):
     Args:
         customer_code_process (Process): the process running the customer code.
     """
+    sampler = start_resource_sampler(customer_code_process.pid)
     try:
-        customer_code_process.join()
-    except Exception as e:
-        customer_code_process.terminate()
-        customer_code_process.join()
-        log_failure_and_exit(f"Job did not exit gracefully.\nException: {e}")
+        try:
+            with forward_shutdown_signals(customer_code_process):
+                customer_code_process.join()
+        except Exception as e:
+            customer_code_process.terminate()
+            customer_code_process.join()
+            log_failure_and_exit(f"Job did not exit gracefully.\nException: {e}")
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        release_shared_hyperparameters()
+    _report_customer_startup()
+    if sampler is not None and customer_code_process.exitcode != 0:
+        _log_failure(sampler.summary())
     print("Code Run Finished")
     return customer_code_process.exitcode
 
@@ -345,41 +3096,639 @@ def _is_mpi_active() -> bool:
     return bool(os.getenv("OMPI_COMM_WORLD_SIZE"))
 
 
+def _get_local_rank() -> Optional[int]:
+    """
+    Returns the node-local rank of this process under mpirun, from the environment set by
+    OpenMPI so that mpi4py is not imported, or None if not running under mpirun.
+    """
+    local_rank = os.getenv("OMPI_COMM_WORLD_LOCAL_RANK")
+    return int(local_rank) if local_rank and local_rank.isdigit() else None
+
+
+def is_node_setup_leader() -> bool:
+    """
+    Returns whether this process sets up the customer code on this node. Under mpirun, only
+    local rank 0 downloads, unpacks and installs the customer code; otherwise every process
+    sets up its own.
+    """
+    return _get_local_rank() in (None, 0)
+
+
+def _node_setup_status_file() -> str:
+    # The ranks of one launch on a node share the launcher's namespace and job ID and their
+    # parent, the local launch daemon. The parent's start time (field 22 of proc(5)) tells a
+    # later launch apart even if it reuses the job ID or the parent PID.
+    parent = os.getppid()
+    parent_stat = _read_proc_file(parent, "stat").rpartition(")")[2].split()
+    launch = ":".join([
+        os.getenv("PMIX_NAMESPACE", ""),
+        os.getenv("OMPI_MCA_ess_base_jobid", ""),
+        str(parent),
+        parent_stat[19] if len(parent_stat) > 19 else "",
+    ])
+    token = hashlib.sha256(launch.encode()).hexdigest()[:16]
+    return os.path.join(os.path.dirname(EXTRACTED_CUSTOMER_CODE_PATH), f"setup-{token}.status")
+
+
+def mark_node_setup_done(succeeded: bool) -> None:
+    """
+    Releases the other ranks on this node waiting for the setup leader, if running under mpirun.
+
+    Args:
+        succeeded (bool): whether the customer code was set up successfully.
+    """
+    if _get_local_rank() is None:
+        return
+    status_file = _node_setup_status_file()
+    staging_file = f"{status_file}.{os.getpid()}"
+    with open(staging_file, "w") as status:
+        status.write("ok" if succeeded else "failed")
+    os.replace(staging_file, status_file)
+
+
+def wait_for_node_setup() -> None:
+    """
+    Waits for the setup leader on this node to set up the customer code, for up to
+    AMZN_BRAKET_SETUP_BARRIER_TIMEOUT seconds, then picks up the extracted code and the
+    installed requirements.
+    """
+    timeout = float(
+        _get_setting("AMZN_BRAKET_SETUP_BARRIER_TIMEOUT") or DEFAULT_SETUP_BARRIER_TIMEOUT
+    )
+    status_file = _node_setup_status_file()
+    deadline = time.time() + timeout
+    print(f"Waiting for local rank 0 to set up the customer code ({status_file})")
+    with _timed_phase("setup_barrier"):
+        while True:
+            try:
+                with open(status_file) as status:
+                    succeeded = status.read() == "ok"
+                break
+            except FileNotFoundError:
+                if time.time() > deadline:
+                    log_failure_and_exit(
+                        f"Timed out after {timeout}s waiting for local rank 0 to set up the "
+                        "customer code."
+                    )
+                time.sleep(0.1)
+    if not succeeded:
+        print("Local rank 0 failed to set up the customer code")
+        sys.exit(0)
+    global _code_manifest
+    with contextlib.suppress(OSError, ValueError), open(_code_manifest_file()) as manifest_file:
+        _code_manifest = json.load(manifest_file)
+    importlib.invalidate_caches()
+    _add_extracted_code_to_path()
+    configure_bytecode_cache()
+
+
+def run_node_setup(setup: Callable) -> None:
+    """
+    Runs the customer code setup on the node's setup leader, and waits for it on the other
+    ranks of the node.
+
+    Args:
+        setup (Callable): sets up the customer code.
+    """
+    if not is_node_setup_leader():
+        wait_for_node_setup()
+        return
+    if _get_local_rank() is not None:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(_node_setup_status_file())
+    try:
+        setup()
+    except BaseException:
+        mark_node_setup_done(False)
+        raise
+    mark_node_setup_done(True)
+
+
+def configure_bytecode_cache() -> Optional[str]:
+    """
+    With AMZN_BRAKET_BYTECODE_CACHE enabled, points the bytecode cache of this process and of
+    the customer process (sys.pycache_prefix and PYTHONPYCACHEPREFIX) at the persistent cache.
+    The images set PYTHONDONTWRITEBYTECODE; bytecode writing is turned back on so that modules
+    imported from site-packages are also compiled only once.
+
+    Returns:
+        Optional[str]: the bytecode cache directory, or None if it is not used.
+    """
+    if not _is_setting_enabled("AMZN_BRAKET_BYTECODE_CACHE"):
+        return None
+    cache_path = get_cache_path()
+    if not cache_path:
+        return None
+    prefix = os.path.join(cache_path, "bytecode")
+    Path(prefix).mkdir(parents=True, exist_ok=True)
+    sys.pycache_prefix = prefix
+    sys.dont_write_bytecode = False
+    os.environ["PYTHONPYCACHEPREFIX"] = prefix
+    os.environ.pop("PYTHONDONTWRITEBYTECODE", None)
+    return prefix
+
+
+def _compile_source(source: str, cfile: str) -> bool:
+    try:
+        py_compile.compile(
+            source,
+            cfile=cfile,
+            doraise=True,
+            invalidation_mode=py_compile.PycInvalidationMode.CHECKED_HASH,
+        )
+        return True
+    except (py_compile.PyCompileError, OSError):
+        return False
+
+
+def _pyc_matches(cfile: str, source_hash: Optional[bytes]) -> bool:
+    # Hash-based pycs start with the magic number, flags with bit 0 set, and the source hash.
+    try:
+        with open(cfile, "rb") as pyc_file:
+            header = pyc_file.read(16)
+    except OSError:
+        return False
+    return (
+        source_hash is not None
+        and header[:4] == importlib.util.MAGIC_NUMBER
+        and int.from_bytes(header[4:8], "little") & 0b1 == 1
+        and header[8:16] == source_hash
+    )
+
+
+def compile_customer_code() -> None:
+    """
+    Compiles the Python files of the extracted customer code into the bytecode cache in
+    parallel, with AMZN_BRAKET_BYTECODE_WORKERS processes (default: one per CPU). The bytecode
+    is validated against the hash of its source rather than its timestamp, so it stays valid
+    when the same code is extracted again. When the cache already holds the bytecode for the
+    same sources, only modules whose bytecode has since been overwritten, e.g. by another job
+    extracted to the same path, are compiled again.
+    """
+    prefix = configure_bytecode_cache()
+    if prefix is None:
+        return
+    manifest = get_code_manifest()
+    if manifest is not None:
+        sources = [os.path.join(EXTRACTED_CUSTOMER_CODE_PATH, path) for path in manifest["python"]]
+    else:
+        sources = [
+            os.path.join(root, name)
+            for root, _, files in os.walk(EXTRACTED_CUSTOMER_CODE_PATH)
+            for name in files
+            if name.endswith(".py")
+        ]
+    digest = hashlib.sha256()
+    source_hashes = {}
+    for source in sorted(sources):
+        digest.update(os.path.relpath(source, EXTRACTED_CUSTOMER_CODE_PATH).encode() + b"\0")
+        with contextlib.suppress(OSError), open(source, "rb") as source_file:
+            data = source_file.read()
+            digest.update(data)
+            source_hashes[source] = importlib.util.source_hash(data)
+    # The marker lists the modules that compiled, so that their bytecode can be checked.
+    marker = os.path.join(prefix, ".sources", digest.hexdigest())
+    compiled_paths = None
+    with contextlib.suppress(OSError, ValueError), open(marker) as marker_file:
+        compiled_paths = json.load(marker_file)
+    if isinstance(compiled_paths, list):
+        compiled_sources = [
+            os.path.join(EXTRACTED_CUSTOMER_CODE_PATH, path) for path in compiled_paths
+        ]
+        stale = [
+            source
+            for source in compiled_sources
+            if not _pyc_matches(
+                importlib.util.cache_from_source(source), source_hashes.get(source)
+            )
+        ]
+        if not stale:
+            print("Bytecode for the customer code is cached")
+            return
+        print(f"Bytecode of {len(stale)} cached customer modules was overwritten")
+        sources = stale
+    workers = int(_get_setting("AMZN_BRAKET_BYTECODE_WORKERS") or 0) or os.cpu_count() or 1
+    cfiles = [importlib.util.cache_from_source(source) for source in sources]
+    start = time.time()
+    if workers > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(sources))) as executor:
+            results = list(executor.map(_compile_source, sources, cfiles, chunksize=16))
+    else:
+        results = list(map(_compile_source, sources, cfiles))
+    if not isinstance(compiled_paths, list):
+        compiled_paths = sorted(
+            os.path.relpath(source, EXTRACTED_CUSTOMER_CODE_PATH)
+            for source, compiled in zip(sources, results)
+            if compiled
+        )
+        try:
+            _write_json_atomic(marker, compiled_paths)
+        except OSError as e:
+            print(f"Unable to record compiled bytecode.\nException: {e}")
+    print(
+        f"Compiled {sum(results)} of {len(sources)} customer modules in "
+        f"{time.time() - start:.3f}s with {workers} workers"
+    )
+
+
+def run_image_setup_script() -> None:
+    """
+    Runs the additional setup script given by AMZN_BRAKET_IMAGE_SETUP_SCRIPT, an S3 URI or a
+    local path. The script is run only if it has not already run in this container: a marker
+    named after the SHA-256 hash of its content is left under SETUP_SCRIPT_PATH once it
+    succeeds, so identical scripts are skipped on later runs while changed scripts run again.
+    """
+    script_uri = _get_setting("AMZN_BRAKET_IMAGE_SETUP_SCRIPT")
+    if not script_uri:
+        return
+    try:
+        print(f"Getting setup script from {script_uri}")
+        Path(SETUP_SCRIPT_PATH).mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=SETUP_SCRIPT_PATH) as temp_dir:
+            local_path = get_local_code_path(script_uri)
+            script_to_run = os.path.join(
+                temp_dir, os.path.basename(local_path or urlparse(script_uri).path)
+            )
+            if local_path is not None:
+                shutil.copy(local_path, script_to_run)
+            else:
+                script_to_run = download_s3_file(script_uri, temp_dir)
+            script_hash = _sha256_file(script_to_run)
+            marker = os.path.join(SETUP_SCRIPT_PATH, f"{script_hash}.done")
+            if os.path.exists(marker):
+                print(f"Setup script {script_hash} already ran, skipping")
+                return
+            os.chmod(script_to_run, 0o755)
+            start = time.time()
+            subprocess.run([script_to_run], check=True)
+            duration = time.time() - start
+            with open(marker, "w") as marker_file:
+                json.dump({"script": script_uri, "start": start, "duration": duration}, marker_file)
+            print(f"Setup script finished in {duration:.3f}s")
+    except Exception as e:
+        print(f"Unable to install additional libraries.\nException: {e}")
+
+
+def set_up_customer_code(s3_uri: str, compression_type: str) -> None:
+    """
+    Runs the additional setup script, downloads and unpacks the customer code, compiles it into
+    the bytecode cache, then installs its requirements.
+
+    Args:
+        s3_uri (str): the S3 location or local path of the customer code.
+        compression_type (str): the compression used to archive the code.
+    """
+    with _timed_phase("setup_script"):
+        run_image_setup_script()
+    prepare_customer_code(s3_uri, compression_type)
+    with _timed_phase("bytecode"):
+        compile_customer_code()
+    with _timed_phase("requirements"):
+        install_additional_requirements()
+
+
 def run_customer_code() -> None:
     """
     Downloads and runs the customer code. If the customer code exists
     with a non-zero exit code, this function will log a failure and
     exit.
     """
-    s3_uri, entry_point, compression_type = get_code_setup_parameters()
-    local_s3_file = download_customer_code(s3_uri)
-    unpack_code_and_add_to_path(local_s3_file, compression_type)
-    install_additional_requirements()
-    customer_executable = extract_customer_code(entry_point)
+    with _timed_phase("parameters"):
+        s3_uri, entry_point, compression_type = get_code_setup_parameters()
+    run_node_setup(lambda: set_up_customer_code(s3_uri, compression_type))
+    with _timed_phase("entry_point"):
+        customer_executable = extract_customer_code(entry_point)
+    run_customer_executable(customer_executable)
+
+
+def load_sweep() -> Optional[list]:
+    """
+    Returns the hyperparameter sets of a parameter sweep, from AMZN_BRAKET_SWEEP. The setting is
+    either a JSON list of hyperparameter dictionaries or the path to a JSON file containing one,
+    relative to the customer code if not absolute.
+
+    Returns:
+        Optional[list]: the hyperparameter sets, or None if this is not a sweep.
+    """
+    sweep = _get_setting("AMZN_BRAKET_SWEEP")
+    if not sweep:
+        return None
+    try:
+        try:
+            runs = json.loads(sweep)
+        except ValueError:
+            with open(os.path.join(EXTRACTED_CUSTOMER_CODE_PATH, sweep)) as sweep_file:
+                runs = json.load(sweep_file)
+        if not isinstance(runs, list) or not all(isinstance(run, dict) for run in runs):
+            raise ValueError("The sweep must be a list of hyperparameter dictionaries.")
+    except Exception as e:
+        log_failure_and_exit(f"Unable to load hyperparameter sweep.\nException: {e}")
+    return runs
+
+
+def get_sweep_output_path() -> str:
+    """
+    Returns the directory holding one output subdirectory per sweep run, under the job results
+    directory so that it is uploaded with the job results.
+    """
+    results_path = os.getenv("AMZN_BRAKET_JOB_RESULTS_DIR") or os.path.join(OPT_ML, "model")
+    return os.path.join(results_path, "sweep")
+
+
+def _run_sweep_entry(customer_method: Callable, run_path: str, **kwargs) -> Any:
+    os.environ["AMZN_BRAKET_JOB_RESULTS_DIR"] = run_path
+    os.environ["AMZN_BRAKET_HP_FILE"] = os.path.join(run_path, "hyperparameters.json")
+    return wrap_customer_code(customer_method, **kwargs)
+
+
+def run_sweep(customer_method: Callable, runs: list) -> int:
+    """
+    Runs the customer method once per hyperparameter set, as separate processes started from
+    the same container setup, with up to AMZN_BRAKET_SWEEP_PARALLELISM runs at a time. Each run
+    gets its own output directory, which is also its job results directory, holding the
+    hyperparameters of the run, which AMZN_BRAKET_HP_FILE points to in the run, and its exit
+    code. Shutdown signals are forwarded to the running runs and no further runs are started;
+    resource samples cover the whole container process tree.
+
+    Args:
+        customer_method (Callable): the customer method to be run.
+        runs (list): the hyperparameter sets; each is merged over the job hyperparameters.
+    Returns:
+        int: the first non-zero exit code of the runs, or 0 if all runs succeeded.
+    """
+    parallelism = max(1, int(_get_setting("AMZN_BRAKET_SWEEP_PARALLELISM") or 1))
+    sweep_path = get_sweep_output_path()
+    base_hyperparameters = {
+        name: value
+        for name, value in (_read_hyperparameters() or {}).items()
+        if not name.startswith("AMZN_BRAKET_SWEEP")
+    }
+    context = _get_customer_process_context()
+    print(f"Running a sweep of {len(runs)} runs, {parallelism} at a time")
+    pending = list(enumerate(runs))
+    running = {}
+    results = []
+
+    def finish(index: int, run_path: str, exit_code: int, start: float):
+        with open(os.path.join(run_path, "exit_code"), "w") as exit_code_file:
+            exit_code_file.write(str(exit_code))
+        results.append({"run": index, "exit_code": exit_code, "duration": time.time() - start})
+        print(f"Sweep run {index} finished with exit code {exit_code}")
+
+    def start_run(index: int, run: dict):
+        run_path = os.path.join(sweep_path, str(index))
+        Path(run_path).mkdir(parents=True, exist_ok=True)
+        hyperparameters = {
+            **base_hyperparameters,
+            **{
+                name: value if isinstance(value, str) else json.dumps(value)
+                for name, value in run.items()
+            },
+        }
+        with open(os.path.join(run_path, "hyperparameters.json"), "w") as hp_file:
+            json.dump(hyperparameters, hp_file)
+        start = time.time()
+        shared_blocks_start = len(_shared_memory_blocks)
+        try:
+            kwargs = try_bind_hyperparameters_to_customer_method(
+                customer_method, hyperparameters, share=context.get_start_method() != "fork"
+            )
+        except Exception as e:
+            _log_failure(f"Sweep run {index} has invalid hyperparameters.\nException: {e}\n")
+            finish(index, run_path, 1, start)
+            return
+        shared_blocks = _shared_memory_blocks[shared_blocks_start:]
+        del _shared_memory_blocks[shared_blocks_start:]
+        process = context.Process(
+            target=_run_sweep_entry, args=(customer_method, run_path), kwargs=kwargs or {}
+        )
+        process.start()
+        running[process.sentinel] = (index, run_path, process, start, shared_blocks)
+
+    sampler = start_resource_sampler(os.getpid())
+    try:
+        with _forward_shutdown_signals(
+            lambda: [entry[2] for entry in running.values()]
+        ) as shutting_down:
+            while pending or running:
+                if shutting_down.is_set() and pending:
+                    print(f"Shutting down, skipping {len(pending)} pending sweep runs")
+                    pending.clear()
+                while pending and len(running) < parallelism:
+                    start_run(*pending.pop(0))
+                if not running:
+                    continue
+                for sentinel in multiprocessing.connection.wait(list(running)):
+                    index, run_path, process, start, shared_blocks = running.pop(sentinel)
+                    process.join()
+                    release_shared_hyperparameters(shared_blocks)
+                    finish(index, run_path, process.exitcode, start)
+    finally:
+        for _, _, process, _, shared_blocks in running.values():
+            process.terminate()
+            process.join()
+            release_shared_hyperparameters(shared_blocks)
+        if sampler is not None:
+            sampler.stop()
+
+    results.sort(key=lambda result: result["run"])
+    with open(os.path.join(sweep_path, "summary.json"), "w") as summary_file:
+        json.dump(results, summary_file, indent=2)
+    failed = [result for result in results if result["exit_code"] != 0]
+    print(f"Sweep finished: {len(results) - len(failed)} of {len(results)} runs succeeded")
+    if sampler is not None and failed:
+        _log_failure(sampler.summary())
+    return failed[0]["exit_code"] if failed else 0
+
+
+def run_customer_executable(customer_executable: Callable) -> None:
+    """
+    Runs the customer code, in-process under MPI and as a separate process otherwise, or once
+    per hyperparameter set if AMZN_BRAKET_SWEEP is set. If the customer code exits with a
+    non-zero exit code, this function will exit with that code.
 
+    Args:
+        customer_executable (Callable): the customer method to be run.
+    """
     if _is_mpi_active():
         # Run directly in the parent process to preserve MPI context.
         # Forking after MPI_Init is discouraged by OpenMPI and causes
         # finalization failures under mpirun.
         print("MPI is active — running customer code in-process (no fork)")
-        kwargs = try_bind_hyperparameters_to_customer_method(customer_executable) or {}
-        wrap_customer_code(customer_executable, **kwargs)
+        # Nothing is pickled in-process, so arrays are not placed in shared memory.
+        kwargs = (
+            try_bind_hyperparameters_to_customer_method(customer_executable, share=False) or {}
+        )
+        with _timed_phase("customer_runtime"):
+            wrap_customer_code(customer_executable, **kwargs)
         print("Code Run Finished")
+    elif (runs := load_sweep()) is not None:
+        with _timed_phase("sweep"):
+            exit_code = run_sweep(customer_executable, runs)
+        if exit_code != 0:
+            sys.exit(exit_code)
     else:
-        customer_process = kick_off_customer_script(customer_executable)
-        if (exit_code := join_customer_script(customer_process)) != 0:
+        with _timed_phase("process_spawn"):
+            customer_process = kick_off_customer_script(customer_executable)
+        with _timed_phase("join"):
+            exit_code = join_customer_script(customer_process)
+        if exit_code != 0:
             sys.exit(exit_code)
 
 
+def _warm_up_imports(module_names: list) -> None:
+    """
+    Imports modules in a throwaway interpreter. This pulls their files into the page cache
+    (and, with a bytecode cache, compiles them) without loading them into this process, where
+    a later requirements install could replace them on disk. The interpreter is killed after
+    AMZN_BRAKET_WARM_UP_TIMEOUT seconds, or by stop_warm_ups().
+    """
+    module_names = [
+        name for name in module_names
+        if importlib.util.find_spec(name.partition(".")[0]) is not None
+    ]
+    if not module_names:
+        return
+    script = "\n".join(
+        f"try:\n    import {name}\nexcept Exception:\n    pass" for name in module_names
+    )
+    timeout = float(_get_setting("AMZN_BRAKET_WARM_UP_TIMEOUT") or DEFAULT_WARM_UP_TIMEOUT)
+    with _warm_up_lock:
+        if _warm_ups_stopped.is_set():
+            return
+        process = subprocess.Popen(
+            [sys.executable, "-c", script], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        _warm_up_processes.add(process)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        print(f"Warm-up of {', '.join(module_names)} did not finish within {timeout}s")
+        process.kill()
+        process.wait()
+    finally:
+        with _warm_up_lock:
+            _warm_up_processes.discard(process)
+
+
+def stop_warm_ups() -> None:
+    """
+    Kills the warm-up interpreters that are still running, and keeps new ones from starting,
+    so that they do not compete with the customer code.
+    """
+    with _warm_up_lock:
+        _warm_ups_stopped.set()
+        for process in _warm_up_processes:
+            with contextlib.suppress(OSError):
+                process.kill()
+
+
+def preimport_framework_modules() -> None:
+    """
+    Warms up the heavy framework modules listed in AMZN_BRAKET_SETUP_PREIMPORT_MODULES.
+    """
+    module_names = _get_setting("AMZN_BRAKET_SETUP_PREIMPORT_MODULES", DEFAULT_PREIMPORT_MODULES)
+    _warm_up_imports([name.strip() for name in module_names.split(",") if name.strip()])
+
+
+def run_setup_stages(stages: dict, background: tuple = ()) -> dict:
+    """
+    Runs setup stages concurrently. Each stage maps its name to a function and the names of the
+    stages it depends on. A stage starts as soon as its dependencies have finished, and its
+    function is called with their results. The start and end time of each stage are recorded.
+
+    Args:
+        stages (dict): the stages, as name: (function, dependencies), in dependency order.
+        background (tuple): the stages that are not waited for; they keep running after this
+            function returns.
+    Returns:
+        dict: the result of each stage that is not in the background.
+    """
+    futures = {}
+
+    def run_stage(name: str, function: Callable, dependencies: list) -> Any:
+        dependency_results = [futures[dependency].result() for dependency in dependencies]
+        with _timed_phase(name):
+            return function(*dependency_results)
+
+    executor = ThreadPoolExecutor(max_workers=len(stages))
+    try:
+        for name, (function, dependencies) in stages.items():
+            futures[name] = executor.submit(run_stage, name, function, dependencies)
+        return {
+            name: future.result() for name, future in futures.items() if name not in background
+        }
+    finally:
+        executor.shutdown(wait=False)
+
+
+def setup_concurrently() -> Callable:
+    """
+    Sets up the Braket container and the customer code as a stage graph, overlapping stages
+    that do not depend on each other: the customer code download runs alongside the framework
+    module warm-up. The warm-up is not waited for; if it is still running once the customer code
+    is set up, it is stopped. The entry point is then imported on the main thread, since customer
+    modules may install signal handlers at import time. Under mpirun, only the node's setup
+    leader sets up the customer code.
+
+    Returns:
+        Callable: the customer method to be run.
+    """
+    start = time.time()
+    _warm_ups_stopped.clear()
+    stages = {
+        "symlink": (create_symlink, []),
+        "paths": (lambda _: create_paths(), ["symlink"]),
+        "parameters": (get_code_setup_parameters, []),
+        "preimport": (preimport_framework_modules, []),
+        "code": (
+            lambda _, parameters: run_node_setup(
+                lambda: set_up_customer_code(parameters[0], parameters[2])
+            ),
+            ["paths", "parameters"],
+        ),
+    }
+    try:
+        results = run_setup_stages(stages, background=("preimport",))
+    finally:
+        stop_warm_ups()
+    with _timed_phase("entry_point"):
+        customer_method = extract_customer_code(results["parameters"][1])
+    with _phase_lock:
+        stage_timings = [timing for timing in _phase_timings if timing["start"] >= start]
+    for timing in sorted(stage_timings, key=lambda timing: timing["start"]):
+        print(
+            f"Setup stage {timing['phase']}: started at +{timing['start'] - start:.3f}s, "
+            f"took {timing['duration']:.3f}s"
+        )
+    return customer_method
+
+
 def setup_and_run():
     """
     This method sets up the Braket container, then downloads and runs the customer code.
+    With AMZN_BRAKET_CONCURRENT_SETUP enabled, independent setup stages run concurrently.
     """
     print("Beginning Setup")
-    create_symlink()
-    create_paths()
-    run_customer_code()
+    if start_import_profiler() is not None:
+        with contextlib.suppress(OSError):
+            os.remove(_customer_import_profile_file())
+    try:
+        if _is_setting_enabled("AMZN_BRAKET_CONCURRENT_SETUP"):
+            run_customer_executable(setup_concurrently())
+            return
+        with _timed_phase("symlink"):
+            create_symlink()
+        with _timed_phase("paths"):
+            create_paths()
+        run_customer_code()
+    finally:
+        write_timing_report()
+        write_import_profile()
+        compact_failure_journal()
 
 
 if __name__ == "__main__":
+    # Before the entry point is imported by extract_customer_code.
+    _register_module_alias()
     setup_and_run()
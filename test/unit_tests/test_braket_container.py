@@ -1,44 +1,195 @@
+import asyncio
+import errno
 import importlib
+import importlib.abc
+import importlib.util
+import io
 import json
+import multiprocessing
 import os
+import pstats
 import re
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tarfile
 import tempfile
+import threading
+import time
+import tracemalloc
+import urllib.request
+import zipfile
+from multiprocessing import shared_memory
 from pathlib import Path
 from unittest import mock
 from urllib.parse import urlparse
 
 import pytest
 
+import src.braket_container as braket_container
 from src.braket_container import (
     create_paths,
     create_symlink,
     download_customer_code,
+    download_s3_file,
+    download_s3_file_ranged,
+    extract_tar_pipelined,
+    extract_zip_parallel,
+    find_unsatisfied_requirements,
+    merge_requirements_files,
     log_failure_and_exit,
+    prepare_customer_code,
     unpack_code_and_add_to_path,
     get_code_setup_parameters,
     setup_and_run,
     try_bind_hyperparameters_to_customer_method,
     install_additional_requirements,
+    install_requirements_file,
+    join_customer_script,
+    kick_off_customer_script,
     run_customer_code,
+    run_setup_stages,
+    stream_customer_code,
     wrap_customer_code,
     EXTRACTED_CUSTOMER_CODE_PATH,
 )
 
 
-@mock.patch("pathlib.Path.mkdir")
+@pytest.fixture(autouse=True)
+def reset_code_manifest(monkeypatch):
+    monkeypatch.setattr("src.braket_container._code_manifest", None)
+
+
+@pytest.fixture(autouse=True)
+def timing_report_file(tmp_path, monkeypatch):
+    report_file = tmp_path / "output" / "braket_container_timings.json"
+    monkeypatch.setattr("src.braket_container.TIMING_REPORT_FILE", str(report_file))
+    monkeypatch.setattr("src.braket_container._phase_timings", [])
+    return report_file
+
+
+@pytest.fixture(autouse=True)
+def failure_log(tmp_path, monkeypatch):
+    failure_file = tmp_path / "output" / "failure"
+    monkeypatch.setattr("src.braket_container.ERROR_LOG_PATH", str(failure_file.parent))
+    monkeypatch.setattr("src.braket_container.ERROR_LOG_FILE", str(failure_file))
+    return failure_file
+
+
+class FakeS3Client:
+    """An in-memory stand-in for the S3 client that supports ranged GETs."""
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.get_calls = []
+
+    def head_object(self, Bucket, Key):
+        data = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(data), "ETag": f'"{hash(data)}"'}
+
+    def get_object(self, Bucket, Key, Range=None):
+        data = self.objects[(Bucket, Key)]
+        self.get_calls.append(Range)
+        if Range:
+            start, _, end = Range[len("bytes="):].partition("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": io.BytesIO(data), "ContentLength": len(data)}
+
+
+def make_tar_gz(files):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, content in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+    return buffer.getvalue()
+
+
+def make_zip(files):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
 @mock.patch("src.braket_container.sys")
-def test_log_failure_logging(mock_sys, mock_mkdir):
-    with mock.patch("builtins.open", mock.mock_open()) as file_open:
-        log_failure_and_exit("my test data")
-        # Open with append in case someone (eg. the customer) wrote something to the file already
-        file_open.assert_called_with("/opt/ml/output/failure", "a")
-        file_write = file_open()
-        file_write.write.assert_called_with("my test data")
+def test_log_failure_logging(mock_sys, failure_log):
     # We use the /opt/ml/output directory in case there is an error during symlink
-    mock_mkdir.assert_called_with(parents=True, exist_ok=True)
+    failure_log.parent.mkdir()
+    # Keep anything someone (eg. the customer) wrote to the file already
+    failure_log.write_text("customer data\n")
+    log_failure_and_exit("my test data")
+    log_failure_and_exit("more ", "data")
+    assert failure_log.read_text() == "customer data\nmy test datamore data"
+    records = [
+        json.loads(line)
+        for line in Path(f"{failure_log}.journal").read_text().splitlines()
+    ]
+    assert records[0] == {
+        "failure_log_base": len("customer data\n"), "rendered": len("my test datamore data")
+    }
+    assert [record["pid"] for record in records[1:]] == [os.getpid()] * 2
     mock_sys.exit.assert_called_with(0)
 
 
+def test_failure_journal_keeps_text_appended_by_others(failure_log):
+    failure_log.parent.mkdir()
+    failure_log.write_text("A\n")
+    braket_container._log_failure("x\n", display=False)
+    with open(failure_log, "a") as log:
+        log.write("B\n")
+    braket_container._log_failure("y\n", display=False)
+    assert failure_log.read_text() == "A\nB\nx\ny\n"
+    braket_container.compact_failure_journal()
+    assert failure_log.read_text() == "A\nB\nx\ny\n"
+
+
+def test_failure_journal_is_bounded(failure_log, monkeypatch):
+    monkeypatch.setattr(braket_container, "FAILURE_JOURNAL_KEEP_RECORDS", 2)
+    for index in range(10):
+        braket_container._log_failure(f"error {index}\n", display=False)
+    assert failure_log.read_text() == (
+        "error 0\nerror 1\n\n... 6 failure records omitted ...\nerror 8\nerror 9\n"
+    )
+
+    monkeypatch.setattr(braket_container, "FAILURE_LOG_MAX_BYTES", 20)
+    braket_container._log_failure("error 10\n", display=False)
+    assert failure_log.read_text() == (
+        "error 0\n\n... 9 failure records omitted ...\nerror 10\n"
+    )
+
+
+def log_failures_from_process(rank):
+    os.environ["OMPI_COMM_WORLD_RANK"] = str(rank)
+    for index in range(20):
+        message = f"rank {rank} error {index} " + "x" * 5000 + "\n"
+        braket_container._log_failure(message, display=False)
+
+
+def test_failure_journal_concurrent_processes(failure_log):
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=log_failures_from_process, args=(rank,)) for rank in range(4)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+    lines = failure_log.read_text().splitlines()
+    records = [line for line in lines if line.startswith("rank")]
+    assert all(line.endswith("x" * 5000) for line in records)
+    assert "failure records omitted" in failure_log.read_text()
+    journal = [
+        json.loads(line) for line in Path(f"{failure_log}.journal").read_text().splitlines()
+    ]
+    assert {record["rank"] for record in journal if "text" in record} <= {"0", "1", "2", "3"}
+
+
 @mock.patch("src.braket_container.os")
 def test_create_symlink(mock_os):
     create_symlink()
@@ -64,28 +215,331 @@ def test_create_paths(mock_mkdir):
 @mock.patch("src.braket_container.boto3")
 def test_download_customer_code(mock_boto):
     mock_s3 = mock_boto.client.return_value = mock.MagicMock()
-    result_file = download_customer_code("file://test_s3_bucket/test_s3_loc")
+    result_file = download_customer_code("s3://test_s3_bucket/test_s3_loc")
     mock_s3.download_file.assert_called_with("test_s3_bucket", "test_s3_loc",
                                              "/opt/braket/code/customer_code/original/test_s3_loc")
     assert result_file == "/opt/braket/code/customer_code/original/test_s3_loc"
 
 
+def test_download_s3_file_ranged(tmp_path, monkeypatch):
+    data = os.urandom(1000)
+    s3_client = FakeS3Client({("test_bucket", "code.tar.gz"): data})
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+    local_file = tmp_path / "code.tar.gz"
+
+    size = download_s3_file_ranged("test_bucket", "code.tar.gz", str(local_file), 128, 4)
+
+    assert size == 1000
+    assert local_file.read_bytes() == data
+    assert len(s3_client.get_calls) == 8
+    assert not (tmp_path / "code.tar.gz.parts").exists()
+
+
+def test_download_s3_file_ranged_retries_failed_range(tmp_path, monkeypatch):
+    data = os.urandom(256)
+    s3_client = FakeS3Client({("test_bucket", "code.tar.gz"): data})
+    get_object = s3_client.get_object
+    failures = []
+
+    def flaky_get_object(**kwargs):
+        response = get_object(**kwargs)
+        if kwargs["Range"] == "bytes=128-255" and not failures:
+            failures.append(kwargs["Range"])
+            truncated = response["Body"].read(10)
+            response["Body"] = io.BytesIO(truncated)
+        return response
+
+    s3_client.get_object = flaky_get_object
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+    local_file = tmp_path / "code.tar.gz"
+
+    download_s3_file_ranged("test_bucket", "code.tar.gz", str(local_file), 128, 2)
+
+    assert local_file.read_bytes() == data
+    assert "bytes=138-255" in s3_client.get_calls
+
+
+@pytest.mark.parametrize("chunk_size, expected_calls", [
+    (128, ["bytes=128-255"]),
+    (256, ["bytes=0-255"]),
+])
+def test_download_s3_file_ranged_resumes_completed_ranges(
+    chunk_size, expected_calls, tmp_path, monkeypatch
+):
+    data = os.urandom(256)
+    s3_client = FakeS3Client({("test_bucket", "code.tar.gz"): data})
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+    local_file = tmp_path / "code.tar.gz"
+    local_file.write_bytes(data[:128] + bytes(128))
+    (tmp_path / "code.tar.gz.parts").write_text(json.dumps({
+        "etag": s3_client.head_object("test_bucket", "code.tar.gz")["ETag"],
+        "size": 256,
+        "chunk_size": 128,
+        "completed": [0],
+    }))
+
+    download_s3_file_ranged("test_bucket", "code.tar.gz", str(local_file), chunk_size, 2)
+
+    assert local_file.read_bytes() == data
+    assert s3_client.get_calls == expected_calls
+
+
+@pytest.mark.parametrize("uri_prefix", ["", "file://", "file://localhost"])
+@mock.patch("src.braket_container.boto3")
+def test_download_customer_code_local(mock_boto, uri_prefix, tmp_path):
+    code_file = tmp_path / "my_script.py"
+    code_file.write_text("x = 1\n")
+
+    result_file = download_customer_code(f"{uri_prefix}{code_file}")
+
+    assert result_file == str(code_file)
+    mock_boto.client.assert_not_called()
+
+
+def test_module_import_does_not_import_boto3():
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import sys; import src.braket_container; print('boto3' in sys.modules)",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_benchmark_startup():
+    results = braket_container.benchmark_startup(iterations=1)
+    assert set(results) == {"local", "s3"}
+
+
 @mock.patch("src.braket_container.shutil")
-def test_unpack_code_and_add_to_path_non_zipped(mock_shutil):
-    file_path = urlparse("file://test_s3_bucket/test_s3_loc")
-    unpack_code_and_add_to_path(file_path, "")
-    mock_shutil.copy.assert_called_with(file_path, "/opt/braket/code/customer_code/extracted")
+def test_unpack_code_and_add_to_path_non_zipped(mock_shutil, code_paths):
+    original, extracted = code_paths
+    code_file = original / "test_s3_loc"
+    code_file.write_text("x = 1\n")
+    unpack_code_and_add_to_path(str(code_file), "")
+    assert (extracted / "test_s3_loc").read_text() == "x = 1\n"
+    mock_shutil.copy.assert_not_called()
+
+
+@mock.patch("src.braket_container.os.link")
+@mock.patch("src.braket_container._reflink")
+def test_place_code_file_copies_across_filesystems(mock_reflink, mock_link, tmp_path):
+    mock_reflink.side_effect = OSError(errno.EXDEV, "Invalid cross-device link")
+    mock_link.side_effect = OSError(errno.EXDEV, "Invalid cross-device link")
+    code_file = tmp_path / "my_script.py"
+    code_file.write_text("x = 1\n")
+    extracted = tmp_path / "extracted"
+    extracted.mkdir()
+
+    assert braket_container.place_code_file(str(code_file), str(extracted)) == "copy"
+    assert (extracted / "my_script.py").read_text() == "x = 1\n"
+
+
+def test_unpack_code_and_add_to_path_local_directory(code_paths, tmp_path):
+    _, extracted = code_paths
+    mounted = tmp_path / "mounted"
+    (mounted / "pkg").mkdir(parents=True)
+    (mounted / "pkg" / "__init__.py").write_text("")
+    (mounted / "pkg" / "requirements.txt").write_text("numpy\n")
+    (mounted / "main.py").write_text("x = 1\n")
+
+    unpack_code_and_add_to_path(str(mounted), None)
+
+    assert (extracted / "pkg").is_symlink()
+    assert (extracted / "main.py").read_text() == "x = 1\n"
+    manifest = braket_container.get_code_manifest()
+    assert manifest["requirements"] == ["pkg/requirements.txt"]
+    assert manifest["python"] == ["main.py", "pkg/__init__.py"]
 
 
 @pytest.mark.parametrize(
     "compression_type", ["gzip", "zip", "Gzip", " Gzip", " GZIP "]
 )
+@mock.patch("src.braket_container.extract_tar")
 @mock.patch("src.braket_container.shutil")
-def test_unpack_code_and_add_to_path_zipped(mock_shutil, compression_type):
+def test_unpack_code_and_add_to_path_zipped(mock_shutil, mock_extract_tar, compression_type):
     file_path = urlparse("file://test_s3_bucket/test_s3_loc")
+    mock_extract_tar.return_value = []
     unpack_code_and_add_to_path(file_path, compression_type)
-    mock_shutil.unpack_archive.assert_called_with(file_path,
-                                                  "/opt/braket/code/customer_code/extracted")
+    if compression_type == "zip":
+        mock_shutil.unpack_archive.assert_called_with(file_path,
+                                                      "/opt/braket/code/customer_code/extracted")
+    else:
+        mock_extract_tar.assert_called_with(file_path, "/opt/braket/code/customer_code/extracted")
+
+
+def test_extract_zip_parallel(tmp_path):
+    files = {f"pkg/module_{index}.py": f"x = {index}\n".encode() for index in range(20)}
+    archive_path = tmp_path / "code.zip"
+    archive_path.write_bytes(make_zip(files))
+    extracted = tmp_path / "extracted"
+
+    stats = extract_zip_parallel(str(archive_path), str(extracted), 4)
+
+    assert stats["files"] == 20
+    assert stats["bytes"] == sum(len(content) for content in files.values())
+    for name, content in files.items():
+        assert (extracted / name).read_bytes() == content
+
+
+def test_extract_tar_pipelined(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for index in range(20):
+            content = f"x = {index}\n".encode()
+            info = tarfile.TarInfo(f"pkg/module_{index}.py")
+            info.size = len(content)
+            info.mtime = 1000
+            archive.addfile(info, io.BytesIO(content))
+        link = tarfile.TarInfo("pkg/link.py")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "module_0.py"
+        archive.addfile(link)
+    buffer.seek(0)
+    extracted = tmp_path / "extracted"
+    extracted.mkdir()
+
+    stats = extract_tar_pipelined(buffer, str(extracted), 4)
+
+    assert stats["files"] == 21
+    assert (extracted / "pkg" / "module_7.py").read_bytes() == b"x = 7\n"
+    assert (extracted / "pkg" / "module_7.py").stat().st_mtime == 1000
+    assert (extracted / "pkg" / "link.py").read_bytes() == b"x = 0\n"
+
+
+@pytest.mark.parametrize("name", ["../escaped.py", "pkg/../../escaped.py"])
+def test_parallel_extractors_reject_path_traversal(name, tmp_path):
+    extracted = tmp_path / "extracted"
+    extracted.mkdir()
+    zip_path = tmp_path / "code.zip"
+    zip_path.write_bytes(make_zip({name: b"x = 1\n"}))
+
+    with pytest.raises(ValueError):
+        extract_zip_parallel(str(zip_path), str(extracted), 2)
+    with pytest.raises(tarfile.FilterError):
+        extract_tar_pipelined(io.BytesIO(make_tar_gz({name: b"x = 1\n"})), str(extracted), 2)
+    assert not (tmp_path / "escaped.py").exists()
+
+
+@pytest.mark.parametrize(
+    "compression_type, make_archive", [("gzip", make_tar_gz), ("zip", make_zip)]
+)
+def test_stream_customer_code(compression_type, make_archive, tmp_path, monkeypatch):
+    files = {"my_module.py": b"x = 1\n", "pkg/requirements.txt": b"numpy\n"}
+    s3_client = FakeS3Client({("test_bucket", "code.archive"): make_archive(files)})
+    monkeypatch.setattr("src.braket_container.EXTRACTED_CUSTOMER_CODE_PATH", str(tmp_path))
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+    monkeypatch.setattr("src.braket_container.STREAM_CHUNK_SIZE", 64)
+    monkeypatch.setattr("src.braket_container._phase_timings", [])
+
+    stream_customer_code("s3://test_bucket/code.archive", compression_type)
+
+    for name, content in files.items():
+        assert (tmp_path / name).read_bytes() == content
+    assert [timing["phase"] for timing in braket_container._phase_timings] == ["download", "unpack"]
+    assert braket_container.get_code_manifest()["requirements"] == ["pkg/requirements.txt"]
+
+
+@mock.patch("src.braket_container.log_failure_and_exit")
+def test_stream_customer_code_rejects_path_traversal(mock_log_failure, tmp_path, monkeypatch):
+    archive = make_tar_gz({"../escaped.py": b"x = 1\n"})
+    s3_client = FakeS3Client({("test_bucket", "code.tar.gz"): archive})
+    extracted = tmp_path / "extracted"
+    extracted.mkdir()
+    monkeypatch.setattr("src.braket_container.EXTRACTED_CUSTOMER_CODE_PATH", str(extracted))
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+    mock_log_failure.side_effect = SystemExit
+
+    with pytest.raises(SystemExit):
+        stream_customer_code("s3://test_bucket/code.tar.gz", "gzip")
+
+    assert not (tmp_path / "escaped.py").exists()
+    mock_log_failure.assert_called()
+
+
+@pytest.fixture
+def code_paths(tmp_path, monkeypatch):
+    original = tmp_path / "original"
+    extracted = tmp_path / "extracted"
+    original.mkdir()
+    extracted.mkdir()
+    monkeypatch.setattr("src.braket_container.ORIGINAL_CUSTOMER_CODE_PATH", str(original))
+    monkeypatch.setattr("src.braket_container.EXTRACTED_CUSTOMER_CODE_PATH", str(extracted))
+    monkeypatch.setenv("AMZN_BRAKET_CACHE_DIR", str(tmp_path / "cache"))
+    return original, extracted
+
+
+def test_prepare_customer_code_cache_hit(code_paths, monkeypatch):
+    original, extracted = code_paths
+    files = {"my_module.py": b"x = 1\n", "pkg/data.txt": b"data"}
+    s3_client = FakeS3Client({("test_bucket", "code.tar.gz"): make_tar_gz(files)})
+    s3_client.download_file = lambda bucket, key, path: open(path, "wb").write(
+        s3_client.objects[(bucket, key)]
+    )
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+
+    prepare_customer_code("s3://test_bucket/code.tar.gz", "gzip")
+    shutil.rmtree(original)
+    shutil.rmtree(extracted)
+    original.mkdir()
+    extracted.mkdir()
+    s3_client.download_file = mock.Mock(side_effect=AssertionError("cache was not used"))
+
+    with mock.patch("src.braket_container.shutil.unpack_archive") as mock_unpack:
+        prepare_customer_code("s3://test_bucket/code.tar.gz", "gzip")
+
+    mock_unpack.assert_not_called()
+    for name, content in files.items():
+        assert (extracted / name).read_bytes() == content
+    assert (original / "code.tar.gz").exists()
+
+
+def test_prepare_customer_code_cache_miss_on_new_etag(code_paths, monkeypatch):
+    original, extracted = code_paths
+    s3_client = FakeS3Client({("test_bucket", "code.py"): b"x = 1\n"})
+    s3_client.download_file = mock.Mock(
+        side_effect=lambda bucket, key, path: open(path, "wb").write(s3_client.objects[bucket, key])
+    )
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+
+    prepare_customer_code("s3://test_bucket/code.py", None)
+    s3_client.objects[("test_bucket", "code.py")] = b"x = 2\n"
+    prepare_customer_code("s3://test_bucket/code.py", None)
+
+    assert s3_client.download_file.call_count == 2
+    assert (extracted / "code.py").read_bytes() == b"x = 2\n"
+
+
+def test_download_s3_file_reuses_file_only_for_same_etag(tmp_path, monkeypatch):
+    s3_client = FakeS3Client({("test_bucket", "code.py"): b"x = 2\n"})
+    s3_client.download_file = mock.Mock(
+        side_effect=lambda bucket, key, path: open(path, "wb").write(s3_client.objects[bucket, key])
+    )
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+    (tmp_path / "code.py").write_bytes(b"x = 1\n")
+
+    download_s3_file("s3://test_bucket/code.py", str(tmp_path))
+    download_s3_file("s3://test_bucket/code.py", str(tmp_path))
+
+    assert (tmp_path / "code.py").read_bytes() == b"x = 2\n"
+    assert s3_client.download_file.call_count == 1
+
+
+def test_evict_cache_entries(tmp_path):
+    for index, name in enumerate(["oldest", "middle", "newest"]):
+        entry = tmp_path / name
+        entry.mkdir()
+        (entry / "entry.json").write_text(json.dumps({"size": 10}))
+        os.utime(entry / "entry.json", (index, index))
+    (tmp_path / "incomplete").mkdir()
+
+    braket_container._evict_cache_entries(str(tmp_path), 20)
+
+    assert sorted(os.listdir(tmp_path)) == ["middle", "newest"]
 
 
 @pytest.mark.parametrize(
@@ -112,6 +566,20 @@ def test_unpack_code_and_add_to_path_zipped(mock_shutil, compression_type):
             },
             "expected_result": ["test_s3_uri", "test_entry_point", None]
         },
+        {
+            "set_vars": {
+                "AMZN_BRAKET_SCRIPT_LOCAL_PATH" : "/mnt/code",
+                "AMZN_BRAKET_SCRIPT_S3_URI" : "test_s3_uri",
+                "AMZN_BRAKET_SCRIPT_ENTRY_POINT" : "test_entry_point",
+            },
+            "expected_result": ["/mnt/code", "test_entry_point", None]
+        },
+        {
+            "set_vars": {
+                "SM_HPS": "{\"AMZN_BRAKET_SCRIPT_LOCAL_PATH\":\"/mnt/code\", \"AMZN_BRAKET_SCRIPT_ENTRY_POINT\":\"test_entry_point\"}",
+            },
+            "expected_result": ["/mnt/code", "test_entry_point", None]
+        },
         {
             "set_vars": {
                 "SM_HPS": "",
@@ -177,6 +645,263 @@ def test_install_additional_requirements(mock_os, mock_subprocess, file_walk_res
     assert mock_subprocess.run.call_count == 1
 
 
+def test_install_requirements_file_cache(tmp_path, monkeypatch):
+    site_packages = tmp_path / "site-packages"
+    site_packages.mkdir()
+    (site_packages / "old_package.py").write_text("old")
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("new-package==1.0\n")
+    monkeypatch.setenv("AMZN_BRAKET_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("AMZN_BRAKET_REQUIREMENTS_CACHE", "true")
+    monkeypatch.setattr("src.braket_container._get_install_paths", lambda: [str(site_packages)])
+
+    def pip_install(*args, **kwargs):
+        (site_packages / "old_package.py").unlink()
+        (site_packages / "new_package").mkdir()
+        (site_packages / "new_package" / "__init__.py").write_text("new")
+        return mock.Mock(returncode=0)
+
+    with mock.patch("src.braket_container.subprocess.run", side_effect=pip_install) as mock_run:
+        install_requirements_file(str(requirements))
+        shutil.rmtree(site_packages)
+        site_packages.mkdir()
+        (site_packages / "old_package.py").write_text("old")
+        install_requirements_file(str(requirements))
+
+    assert mock_run.call_count == 1
+    assert not (site_packages / "old_package.py").exists()
+    assert (site_packages / "new_package" / "__init__.py").read_text() == "new"
+
+
+def test_requirements_cache_key_includes_referenced_files(tmp_path, monkeypatch):
+    monkeypatch.setenv("AMZN_BRAKET_CACHE_DIR", str(tmp_path / "cache"))
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "base.txt").write_text("numpy==1.26.0\n")
+    (tmp_path / "constraints.txt").write_text("scipy<2\n")
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("-r nested/base.txt\n--constraint=constraints.txt\nsix\n")
+
+    entry = braket_container._get_requirements_cache_entry_path(str(requirements))
+    assert entry == braket_container._get_requirements_cache_entry_path(str(requirements))
+    (tmp_path / "nested" / "base.txt").write_text("numpy==2.0.0\n")
+    changed_entry = braket_container._get_requirements_cache_entry_path(str(requirements))
+    assert changed_entry != entry
+    (tmp_path / "constraints.txt").write_text("scipy<3\n")
+    assert braket_container._get_requirements_cache_entry_path(str(requirements)) != changed_entry
+
+
+@pytest.mark.parametrize("line", ["-e ./local_package", "./local_package", "-r missing.txt"])
+def test_requirements_cache_skips_local_paths(line, tmp_path, monkeypatch):
+    monkeypatch.setenv("AMZN_BRAKET_CACHE_DIR", str(tmp_path / "cache"))
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text(f"six\n{line}\n")
+    if line.startswith("-r"):
+        with pytest.raises(OSError):
+            braket_container._get_requirements_cache_entry_path(str(requirements))
+    else:
+        assert braket_container._get_requirements_cache_entry_path(str(requirements)) is None
+
+
+@pytest.mark.parametrize(
+    "requirement_lines, expected",
+    [
+        (["pytest"], []),
+        (["pytest>=1.0"], []),
+        (["pytest<1.0"], ["pytest<1.0"]),
+        (["not-a-real-package-name==1.0"], ["not-a-real-package-name==1.0"]),
+        (["pytest", "not-a-real-package-name; python_version < '3'"], []),
+        (["--extra-index-url https://example.com", "pytest"], None),
+        (["pytest[testing]"], None),
+    ],
+)
+def test_find_unsatisfied_requirements(requirement_lines, expected):
+    assert find_unsatisfied_requirements(requirement_lines) == expected
+
+
+@mock.patch("src.braket_container.subprocess.run")
+def test_install_requirements_file_precheck(mock_run, tmp_path, monkeypatch):
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("pytest  # already installed\nnot-a-real-package-name==1.0\n")
+    monkeypatch.setenv("AMZN_BRAKET_REQUIREMENTS_PRECHECK", "true")
+    installed = []
+    mock_run.side_effect = lambda command, **kwargs: installed.append(
+        open(command[-1]).read()
+    ) or mock.Mock(returncode=0)
+
+    install_requirements_file(str(requirements))
+
+    assert installed == ["not-a-real-package-name==1.0\n"]
+
+
+@mock.patch("src.braket_container.subprocess.run")
+def test_install_requirements_file_precheck_skips_pip(mock_run, tmp_path, monkeypatch):
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("pytest\n")
+    monkeypatch.setenv("AMZN_BRAKET_REQUIREMENTS_PRECHECK", "true")
+
+    install_requirements_file(str(requirements))
+
+    mock_run.assert_not_called()
+
+
+def test_merge_requirements_files(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    (tmp_path / "a" / "requirements.txt").write_text(
+        "--extra-index-url https://example.com\nnumpy>=1.20\nscipy\n"
+    )
+    (tmp_path / "b" / "requirements.txt").write_text(
+        "--extra-index-url https://example.com\nNumPy<3\n-r ../common.txt\n"
+    )
+
+    lines, conflicts = merge_requirements_files(
+        [str(tmp_path / "a" / "requirements.txt"), str(tmp_path / "b" / "requirements.txt")]
+    )
+
+    assert conflicts == []
+    assert lines == [
+        "--extra-index-url https://example.com",
+        f"-r {tmp_path / 'common.txt'}",
+        "numpy<3,>=1.20",
+        "scipy",
+    ]
+
+
+@pytest.mark.parametrize(
+    "first, second, conflict",
+    [
+        ("numpy==1.26.0", "numpy==2.0.0", True),
+        ("numpy<2", "numpy>=2", True),
+        ("numpy==1.*", "numpy>2", True),
+        ("numpy>1.0", "numpy<1.0.1", False),
+        ("numpy~=1.4", "numpy!=1.4.2", False),
+    ],
+)
+def test_merge_requirements_files_conflict(first, second, conflict, tmp_path):
+    (tmp_path / "a.txt").write_text(f"{first}\nsix\n")
+    (tmp_path / "b.txt").write_text(f"{second}\n")
+
+    _, conflicts = merge_requirements_files([str(tmp_path / "a.txt"), str(tmp_path / "b.txt")])
+
+    if conflict:
+        assert len(conflicts) == 1
+        assert conflicts[0].startswith(f"numpy: {first[5:]}")
+    else:
+        assert conflicts == []
+
+
+@mock.patch("src.braket_container.subprocess.run")
+def test_install_additional_requirements_merged(mock_run, tmp_path, monkeypatch):
+    for package in ["a", "b"]:
+        (tmp_path / package).mkdir()
+        (tmp_path / package / "requirements.txt").write_text(f"package-{package}\n")
+    monkeypatch.setattr("src.braket_container.EXTRACTED_CUSTOMER_CODE_PATH", str(tmp_path))
+    monkeypatch.setenv("AMZN_BRAKET_REQUIREMENTS_MERGE", "true")
+    installed = []
+    mock_run.side_effect = lambda command, **kwargs: installed.append(
+        open(command[-1]).read()
+    ) or mock.Mock(returncode=0)
+
+    install_additional_requirements()
+
+    assert len(installed) == 1
+    assert sorted(installed[0].split()) == ["package-a", "package-b"]
+
+
+@mock.patch("src.braket_container.subprocess.run")
+def test_install_additional_requirements_merged_falls_back(mock_run, tmp_path, monkeypatch):
+    for package in ["a", "b"]:
+        (tmp_path / package).mkdir()
+        (tmp_path / package / "requirements.txt").write_text(f"package-{package}\n")
+    monkeypatch.setattr("src.braket_container.EXTRACTED_CUSTOMER_CODE_PATH", str(tmp_path))
+    monkeypatch.setenv("AMZN_BRAKET_REQUIREMENTS_MERGE", "true")
+    installed = []
+
+    def pip_install(command, **kwargs):
+        installed.append(sorted(open(command[-1]).read().split()))
+        return mock.Mock(returncode=1 if len(installed) == 1 else 0)
+
+    mock_run.side_effect = pip_install
+
+    install_additional_requirements()
+
+    assert sorted(installed) == [["package-a"], ["package-a", "package-b"], ["package-b"]]
+    assert installed[0] == ["package-a", "package-b"]
+
+
+@pytest.mark.parametrize("workers", ["1", "4"])
+def test_unpack_tar_builds_manifest(workers, code_paths, monkeypatch):
+    original, extracted = code_paths
+    archive = original / "code.tar.gz"
+    archive.write_bytes(make_tar_gz({
+        "pkg/__init__.py": b"",
+        "pkg/requirements.txt": b"numpy\n",
+    }))
+    monkeypatch.setenv("AMZN_BRAKET_EXTRACT_WORKERS", workers)
+
+    unpack_code_and_add_to_path(str(archive), "gzip")
+
+    manifest = braket_container.get_code_manifest()
+    assert manifest["files"] == {"pkg/__init__.py": 0, "pkg/requirements.txt": 6}
+    assert manifest["requirements"] == ["pkg/requirements.txt"]
+    assert (extracted / "pkg" / "requirements.txt").read_text() == "numpy\n"
+
+
+def test_extract_tar_keeps_absolute_symlinks(tmp_path):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        info = tarfile.TarInfo("main.py")
+        info.size = 6
+        archive.addfile(info, io.BytesIO(b"x = 1\n"))
+        link = tarfile.TarInfo("data")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "/mnt/shared/data"
+        archive.addfile(link)
+    archive_path = tmp_path / "code.tar.gz"
+    archive_path.write_bytes(buffer.getvalue())
+    extracted = tmp_path / "extracted"
+
+    members = braket_container.extract_tar(str(archive_path), str(extracted))
+
+    assert members == [("main.py", 6), ("data", 0)]
+    assert os.readlink(extracted / "data") == "/mnt/shared/data"
+
+
+@pytest.mark.parametrize("workers", ["1", "4"])
+def test_unpack_code_builds_manifest(workers, code_paths, monkeypatch):
+    original, extracted = code_paths
+    archive = original / "code.zip"
+    archive.write_bytes(make_zip({
+        "pkg/__init__.py": b"",
+        "pkg/requirements.txt": b"numpy\n",
+        "data/values.csv": b"1,2,3\n",
+    }))
+    monkeypatch.setenv("AMZN_BRAKET_EXTRACT_WORKERS", workers)
+
+    unpack_code_and_add_to_path(str(archive), "zip")
+
+    manifest = braket_container.get_code_manifest()
+    assert manifest["files"] == {
+        "pkg/__init__.py": 0, "pkg/requirements.txt": 6, "data/values.csv": 6
+    }
+    assert manifest["requirements"] == ["pkg/requirements.txt"]
+    assert manifest["packages"] == ["pkg"]
+    assert json.loads((extracted.parent / "manifest.json").read_text()) == manifest
+
+
+@mock.patch("src.braket_container.install_requirements_file")
+@mock.patch("src.braket_container.os.walk")
+def test_install_additional_requirements_uses_manifest(mock_walk, mock_install, code_paths):
+    braket_container.set_code_manifest([("requirements.txt", 6), ("data/values.csv", 6)])
+
+    install_additional_requirements()
+
+    mock_walk.assert_not_called()
+    mock_install.assert_called_once_with(
+        os.path.join(braket_container.EXTRACTED_CUSTOMER_CODE_PATH, "requirements.txt")
+    )
+
+
 def customer_function():
     print("Hello")
     return 0
@@ -229,6 +954,207 @@ def test_run_customer_code_function(
     mock_process.join.assert_called_with()
 
 
+def test_run_setup_stages(monkeypatch):
+    monkeypatch.setattr("src.braket_container._phase_timings", [])
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wait_for_other_stage(result):
+        # Fails with BrokenBarrierError unless both stages run at the same time.
+        barrier.wait()
+        return result
+
+    results = run_setup_stages({
+        "first": (lambda: wait_for_other_stage("a"), []),
+        "second": (lambda: wait_for_other_stage("b"), []),
+        "joined": (lambda first, second: first + second, ["first", "second"]),
+    })
+
+    assert results == {"first": "a", "second": "b", "joined": "ab"}
+    timings = {timing["phase"]: timing for timing in braket_container._phase_timings}
+    assert timings["joined"]["start"] >= max(timings["first"]["end"], timings["second"]["end"])
+
+
+def test_run_setup_stages_background():
+    release = threading.Event()
+
+    results = run_setup_stages(
+        {"slow": (lambda: release.wait(5), []), "fast": (lambda: "done", [])},
+        background=("slow",),
+    )
+
+    assert results == {"fast": "done"}
+    assert not release.is_set()
+    release.set()
+
+
+def test_warm_up_imports_timeout(tmp_path, monkeypatch):
+    (tmp_path / "slow_warm_up.py").write_text("import time\ntime.sleep(30)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setenv("PYTHONPATH", str(tmp_path))
+    monkeypatch.setenv("AMZN_BRAKET_WARM_UP_TIMEOUT", "0.5")
+    braket_container._warm_ups_stopped.clear()
+    start = time.time()
+
+    braket_container._warm_up_imports(["slow_warm_up"])
+
+    assert time.time() - start < 10
+    assert not braket_container._warm_up_processes
+
+
+@mock.patch("src.braket_container.run_customer_executable")
+@mock.patch("src.braket_container.extract_customer_code")
+@mock.patch("src.braket_container.install_additional_requirements")
+@mock.patch("src.braket_container.prepare_customer_code")
+@mock.patch("src.braket_container.get_code_setup_parameters")
+@mock.patch("src.braket_container.create_paths")
+@mock.patch("src.braket_container.create_symlink")
+@mock.patch("src.braket_container._warm_up_imports")
+def test_setup_and_run_concurrent(
+    mock_warm_up,
+    mock_symlink,
+    mock_paths,
+    mock_parameters,
+    mock_prepare,
+    mock_install,
+    mock_extract,
+    mock_run,
+    monkeypatch,
+):
+    monkeypatch.setenv("AMZN_BRAKET_CONCURRENT_SETUP", "true")
+    mock_parameters.return_value = ("s3://bucket/key", "module:method", "gzip")
+    extract_threads = []
+
+    def extract_customer_code(entry_point):
+        extract_threads.append(threading.current_thread())
+        return customer_function
+
+    mock_extract.side_effect = extract_customer_code
+
+    setup_and_run()
+
+    mock_prepare.assert_called_with("s3://bucket/key", "gzip")
+    mock_install.assert_called_with()
+    mock_extract.assert_called_with("module:method")
+    # Customer modules may call signal.signal at import time, which only works on the main thread.
+    assert extract_threads == [threading.main_thread()]
+    mock_run.assert_called_with(customer_function)
+    # The warm-up runs in the background and may finish after setup.
+    deadline = time.time() + 5
+    while mock_warm_up.call_count < 1 and time.time() < deadline:
+        time.sleep(0.01)
+    assert mock_warm_up.call_count == 1
+
+
+@mock.patch("src.braket_container.gc")
+def test_start_zygote_fork(mock_gc, monkeypatch):
+    monkeypatch.setattr("src.braket_container.multiprocessing.get_start_method", lambda: "fork")
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+
+    context = braket_container.start_zygote(["colorsys", "not_a_real_module"])
+
+    assert "colorsys" in sys.modules
+    assert context.get_start_method() == "fork"
+    mock_gc.freeze.assert_called_with()
+
+
+@mock.patch("src.braket_container.multiprocessing.get_context")
+def test_start_zygote_forkserver(mock_get_context, monkeypatch):
+    monkeypatch.setattr(
+        "src.braket_container.multiprocessing.get_start_method", lambda: "forkserver"
+    )
+    monkeypatch.setenv("PYTHONPATH", "/customer")
+    forkserver_paths = []
+    monkeypatch.setattr(
+        "src.braket_container.multiprocessing.forkserver.ensure_running",
+        lambda: forkserver_paths.append(os.environ["PYTHONPATH"]),
+    )
+
+    context = braket_container.start_zygote(["colorsys", "not_a_real_module"])
+
+    mock_get_context.assert_called_with("forkserver")
+    context.set_forkserver_preload.assert_called_with(
+        ["colorsys", braket_container.ZYGOTE_FREEZE_MODULE]
+    )
+    assert os.environ["PYTHONPATH"] == "/customer"
+    customer_path, freeze_path = forkserver_paths[0].split(os.pathsep)
+    assert customer_path == "/customer"
+    freeze_spec = importlib.util.spec_from_file_location(
+        braket_container.ZYGOTE_FREEZE_MODULE,
+        os.path.join(freeze_path, f"{braket_container.ZYGOTE_FREEZE_MODULE}.py"),
+    )
+    freeze_module = importlib.util.module_from_spec(freeze_spec)
+    with mock.patch("gc.freeze") as mock_freeze:
+        freeze_spec.loader.exec_module(freeze_module)
+    mock_freeze.assert_called_with()
+
+
+@mock.patch("src.braket_container.gc")
+def test_kick_off_customer_script_zygote(mock_gc, code_paths, monkeypatch):
+    monkeypatch.setenv("AMZN_BRAKET_ZYGOTE_MODULES", "colorsys")
+    monkeypatch.delenv("AMZN_BRAKET_HP_FILE", raising=False)
+    monkeypatch.setattr("src.braket_container._phase_timings", [])
+    monkeypatch.setattr("src.braket_container.multiprocessing.get_start_method", lambda: "fork")
+
+    process = kick_off_customer_script(customer_function)
+
+    assert join_customer_script(process) == 0
+    startup = [t for t in braket_container._phase_timings if t["phase"] == "process_startup"]
+    assert startup[0]["launcher"] == "zygote"
+
+
+@mock.patch("src.braket_container.run_customer_executable")
+@mock.patch("src.braket_container.extract_customer_code")
+@mock.patch("src.braket_container.install_additional_requirements")
+@mock.patch("src.braket_container.prepare_customer_code")
+@mock.patch("src.braket_container.get_code_setup_parameters")
+@mock.patch("src.braket_container.create_paths")
+@mock.patch("src.braket_container.create_symlink")
+def test_setup_and_run_writes_timing_report(
+    mock_symlink,
+    mock_paths,
+    mock_parameters,
+    mock_prepare,
+    mock_install,
+    mock_extract,
+    mock_run,
+    timing_report_file,
+    capsys,
+):
+    mock_parameters.return_value = ("s3://bucket/key", "module:method", None)
+
+    setup_and_run()
+
+    report = json.loads(timing_report_file.read_text())
+    assert [timing["phase"] for timing in report["phases"]] == [
+        "symlink", "paths", "parameters", "setup_script", "bytecode", "requirements", "entry_point"
+    ]
+    assert report["duration"] >= 0
+    metric_lines = [line for line in capsys.readouterr().out.splitlines() if "Metrics" in line]
+    assert re.fullmatch(
+        r"Metrics - timestamp=[\d.]+; container_symlink_seconds=[\d.]+;", metric_lines[0]
+    )
+
+
+@pytest.mark.parametrize("local_rank", ["0", "3"])
+def test_write_timing_report_per_rank(local_rank, timing_report_file, monkeypatch, capsys):
+    monkeypatch.setenv("OMPI_COMM_WORLD_LOCAL_RANK", local_rank)
+    with braket_container._timed_phase("paths"):
+        pass
+
+    braket_container.write_timing_report()
+
+    output = capsys.readouterr().out
+    if local_rank == "0":
+        report_file = timing_report_file
+        assert "container_paths_seconds" in output
+    else:
+        report_file = timing_report_file.with_name("braket_container_timings.rank3.json")
+        assert "Metrics" not in output
+        assert not timing_report_file.exists()
+    assert json.loads(report_file.read_text())["local_rank"] == int(local_rank)
+    assert sorted(path.name for path in report_file.parent.iterdir()) == [report_file.name]
+
+
 def customer_function_fails():
     open("fake_file")
 
@@ -353,3 +1279,861 @@ def test_bind_hyperparameters_type_error(hyperparameters):
     with mock.patch.dict("os.environ", {"AMZN_BRAKET_HP_FILE": hp_file}):
         with pytest.raises(ValueError, match=invalid_literal):
             try_bind_hyperparameters_to_customer_method(customer_method_wrong_type)
+
+
+@pytest.fixture
+def array_hyperparameters(tmp_path):
+    hp_file = tmp_path / "array_hps.json"
+    hp_file.write_text(json.dumps({
+        "params": "[0.1, 0.2, 0.3]",
+        "adjacency": "[[0, 1], [1, 0]]",
+        "name": "maxcut",
+    }))
+    return str(hp_file)
+
+
+def test_bind_hyperparameters_shared_memory(array_hyperparameters):
+    numpy = pytest.importorskip("numpy")
+
+    def customer_method(params: list[float], adjacency: numpy.ndarray, name: str):
+        return
+
+    env = {"AMZN_BRAKET_HP_FILE": array_hyperparameters, "AMZN_BRAKET_SHARED_MEMORY_MIN_BYTES": "0"}
+    with mock.patch.dict("os.environ", env):
+        binding = try_bind_hyperparameters_to_customer_method(customer_method)
+    try:
+        assert isinstance(binding["params"], braket_container._SharedArray)
+        assert isinstance(binding["adjacency"], braket_container._SharedArray)
+        assert binding["name"] == "maxcut"
+        assert binding["params"].resolve() == [0.1, 0.2, 0.3]
+        adjacency = binding["adjacency"].resolve()
+        assert isinstance(adjacency, numpy.ndarray)
+        assert adjacency.tolist() == [[0, 1], [1, 0]]
+        del adjacency
+    finally:
+        while braket_container._attached_shared_memory:
+            braket_container._attached_shared_memory.pop().close()
+        braket_container.release_shared_hyperparameters()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=binding["params"].name)
+
+
+def test_bind_hyperparameters_small_arrays_passed_directly(array_hyperparameters):
+    numpy = pytest.importorskip("numpy")
+
+    def customer_method(params: list[float], adjacency: numpy.ndarray, name: str):
+        return
+
+    with mock.patch.dict("os.environ", {"AMZN_BRAKET_HP_FILE": array_hyperparameters}):
+        binding = try_bind_hyperparameters_to_customer_method(customer_method)
+    assert binding["params"] == [0.1, 0.2, 0.3]
+    assert binding["adjacency"].tolist() == [[0, 1], [1, 0]]
+    assert not braket_container._shared_memory_blocks
+
+
+def test_bind_hyperparameters_list_not_json(tmp_path):
+    hp_file = tmp_path / "hps.json"
+    hp_file.write_text(json.dumps({"names": "a,b"}))
+
+    def customer_method(names: list[str]):
+        return
+
+    with mock.patch.dict("os.environ", {"AMZN_BRAKET_HP_FILE": str(hp_file)}):
+        binding = try_bind_hyperparameters_to_customer_method(customer_method)
+    assert binding["names"] == list("a,b")
+
+
+@pytest.mark.parametrize("start_method", ["fork", "spawn"])
+def test_kick_off_customer_script_shares_memory_unless_forking(
+    start_method, array_hyperparameters, monkeypatch
+):
+    pytest.importorskip("numpy")
+    context = mock.Mock()
+    context.get_start_method.return_value = start_method
+    monkeypatch.setattr(braket_container, "_get_customer_process_context", lambda: context)
+    monkeypatch.setenv("AMZN_BRAKET_HP_FILE", array_hyperparameters)
+
+    def customer_method(params: list[float], adjacency: list[list[int]], name: str):
+        return
+
+    with mock.patch.object(braket_container, "_share_array", return_value=None) as mock_share:
+        kick_off_customer_script(customer_method)
+
+    assert mock_share.called == (start_method != "fork")
+    assert context.Process.call_args.kwargs["kwargs"]["params"] == [0.1, 0.2, 0.3]
+
+
+def test_run_customer_executable_mpi_does_not_share_memory(
+    array_hyperparameters, code_paths, monkeypatch
+):
+    numpy = pytest.importorskip("numpy")
+    received = {}
+
+    def customer_method(params: list[float], adjacency: numpy.ndarray, name: str):
+        received.update(params=params, adjacency=adjacency)
+
+    monkeypatch.setenv("AMZN_BRAKET_HP_FILE", array_hyperparameters)
+    monkeypatch.setenv("AMZN_BRAKET_SHARED_MEMORY_MIN_BYTES", "0")
+    monkeypatch.setenv("OMPI_COMM_WORLD_SIZE", "2")
+    with mock.patch.object(braket_container, "_share_array") as mock_share:
+        braket_container.run_customer_executable(customer_method)
+
+    mock_share.assert_not_called()
+    assert received["params"] == [0.1, 0.2, 0.3]
+    assert received["adjacency"].tolist() == [[0, 1], [1, 0]]
+
+
+def test_join_customer_script_releases_shared_memory():
+    block = mock.Mock()
+    braket_container._shared_memory_blocks.append(block)
+    process = mock.Mock(exitcode=0)
+    assert braket_container.join_customer_script(process) == 0
+    block.close.assert_called_once()
+    block.unlink.assert_called_once()
+    assert not braket_container._shared_memory_blocks
+
+
+def sleep_and_fail():
+    time.sleep(0.3)
+    sys.exit(3)
+
+
+def test_sample_process_tree():
+    script = (
+        "import subprocess, sys, time\n"
+        "subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(10)'])\n"
+        "time.sleep(10)\n"
+    )
+    process = subprocess.Popen([sys.executable, "-c", script])
+    try:
+        deadline = time.time() + 5
+        sample = braket_container.sample_process_tree(process.pid)
+        while sample["processes"] < 2 and time.time() < deadline:
+            time.sleep(0.05)
+            sample = braket_container.sample_process_tree(process.pid)
+        assert sample["processes"] == 2
+        assert sample["rss_bytes"] > 0
+        assert sample["threads"] >= 2
+        assert sample["cpu_user_seconds"] + sample["cpu_system_seconds"] >= 0
+    finally:
+        for child in braket_container._process_tree(process.pid)[1:]:
+            os.kill(child, 9)
+        process.kill()
+        process.wait()
+    assert braket_container.sample_process_tree(process.pid) is None
+
+
+def test_join_customer_script_logs_resource_samples(tmp_path, monkeypatch):
+    monkeypatch.setenv("AMZN_BRAKET_RESOURCE_SAMPLE_INTERVAL", "0.05")
+    monkeypatch.setattr(braket_container, "ERROR_LOG_PATH", str(tmp_path))
+    monkeypatch.setattr(braket_container, "ERROR_LOG_FILE", str(tmp_path / "failure"))
+    samples_file = tmp_path / "resources.jsonl"
+    monkeypatch.setattr(braket_container, "RESOURCE_SAMPLES_FILE", str(samples_file))
+    process = multiprocessing.get_context("fork").Process(target=sleep_and_fail)
+    process.start()
+
+    assert braket_container.join_customer_script(process) == 3
+
+    samples = [json.loads(line) for line in samples_file.read_text().splitlines()]
+    assert samples and samples[0]["rss_bytes"] > 0
+    failure = (tmp_path / "failure").read_text()
+    assert "Peak RSS of the customer process tree" in failure
+    assert "Last resource samples:" in failure
+
+
+def test_resource_sampler_disabled_by_default():
+    assert braket_container.start_resource_sampler(os.getpid()) is None
+
+
+def ignore_sigterm_and_sleep():
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    time.sleep(30)
+
+
+def test_forward_shutdown_signals_kills_after_grace_period(monkeypatch):
+    monkeypatch.setenv("AMZN_BRAKET_SHUTDOWN_GRACE_PERIOD", "0.2")
+    process = multiprocessing.get_context("fork").Process(target=ignore_sigterm_and_sleep)
+    process.start()
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    time.sleep(0.1)
+    start = time.time()
+    with braket_container.forward_shutdown_signals(process):
+        os.kill(os.getpid(), signal.SIGTERM)
+        process.join(10)
+    assert process.exitcode == -signal.SIGKILL
+    assert time.time() - start < 5
+    assert signal.getsignal(signal.SIGTERM) is previous_handler
+
+
+def test_shutdown_hooks_run_on_signal(monkeypatch, tmp_path):
+    (tmp_path / "my_hooks.py").write_text(
+        "calls = []\n"
+        "def flush_checkpoint():\n"
+        "    calls.append('checkpoint')\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setenv("AMZN_BRAKET_SHUTDOWN_HOOK", "my_hooks:flush_checkpoint")
+    monkeypatch.setattr(braket_container, "EXTRACTED_CUSTOMER_CODE_PATH", str(tmp_path))
+    calls = []
+
+    def customer_method():
+        braket_container.register_shutdown_hook(lambda: calls.append("registered"))
+        os.kill(os.getpid(), signal.SIGTERM)
+
+    with pytest.raises(SystemExit) as exit_info:
+        wrap_customer_code(customer_method)
+    assert exit_info.value.code == 128 + signal.SIGTERM
+    assert calls == ["registered"]
+    assert importlib.import_module("my_hooks").calls == ["checkpoint"]
+    assert not braket_container._shutdown_hooks
+
+
+def test_shutdown_hook_registered_at_import(code_paths, monkeypatch):
+    original, extracted = code_paths
+    (extracted / "hooked_entry.py").write_text(
+        "import braket_container\n"
+        "def flush():\n"
+        "    pass\n"
+        "braket_container.register_shutdown_hook(flush)\n"
+        "def run():\n"
+        "    pass\n"
+    )
+    monkeypatch.syspath_prepend(str(extracted))
+    monkeypatch.delitem(sys.modules, "braket_container", raising=False)
+    monkeypatch.setattr(braket_container, "_shutdown_hooks", [])
+
+    braket_container._register_module_alias()
+    braket_container.extract_customer_code("hooked_entry:run")
+
+    assert sys.modules["braket_container"] is braket_container
+    assert [hook.__name__ for hook in braket_container._shutdown_hooks] == ["flush"]
+    sys.modules.pop("hooked_entry", None)
+
+
+@pytest.fixture
+def mpi_node(code_paths, monkeypatch):
+    monkeypatch.setenv("OMPI_MCA_ess_base_jobid", "1234")
+    monkeypatch.setenv("OMPI_COMM_WORLD_LOCAL_RANK", "0")
+    return code_paths
+
+
+def test_node_setup_leader_releases_followers(mpi_node, monkeypatch):
+    original, extracted = mpi_node
+    monkeypatch.setattr(sys, "path", sys.path[:])
+    setup = mock.Mock(side_effect=lambda: braket_container.set_code_manifest([("main.py", 6)]))
+    braket_container.run_node_setup(setup)
+    setup.assert_called_once()
+
+    braket_container.set_code_manifest(None)
+    (extracted.parent / "manifest.json").write_text(json.dumps({"python": ["main.py"]}))
+    monkeypatch.setenv("OMPI_COMM_WORLD_LOCAL_RANK", "1")
+    follower_setup = mock.Mock()
+    braket_container.run_node_setup(follower_setup)
+    follower_setup.assert_not_called()
+    assert braket_container.get_code_manifest() == {"python": ["main.py"]}
+    assert str(extracted) in sys.path
+
+
+def test_node_setup_follower_waits_for_leader(mpi_node, monkeypatch):
+    monkeypatch.setenv("OMPI_COMM_WORLD_LOCAL_RANK", "1")
+    follower = threading.Thread(target=braket_container.wait_for_node_setup)
+    follower.start()
+    time.sleep(0.2)
+    assert follower.is_alive()
+    braket_container.mark_node_setup_done(True)
+    follower.join(5)
+    assert not follower.is_alive()
+
+
+def test_node_setup_leader_failure_stops_followers(mpi_node, monkeypatch):
+    with pytest.raises(SystemExit):
+        braket_container.run_node_setup(mock.Mock(side_effect=SystemExit(0)))
+    monkeypatch.setenv("OMPI_COMM_WORLD_LOCAL_RANK", "2")
+    setup = mock.Mock()
+    with pytest.raises(SystemExit):
+        braket_container.run_node_setup(setup)
+    setup.assert_not_called()
+
+
+def test_node_setup_leader_removes_stale_status(mpi_node):
+    status_file = Path(braket_container._node_setup_status_file())
+    status_file.write_text("ok")
+    setup = mock.Mock(side_effect=lambda: assert_not_exists(status_file))
+
+    braket_container.run_node_setup(setup)
+
+    setup.assert_called_once()
+    assert status_file.read_text() == "ok"
+
+
+def assert_not_exists(path):
+    assert not path.exists()
+
+
+def test_node_setup_status_file_is_per_launch(mpi_node, monkeypatch):
+    monkeypatch.setenv("PMIX_NAMESPACE", "prterun-host-100@1")
+    first = braket_container._node_setup_status_file()
+    assert braket_container._node_setup_status_file() == first
+    monkeypatch.setenv("PMIX_NAMESPACE", "prterun-host-200@1")
+    assert braket_container._node_setup_status_file() != first
+
+
+@mock.patch("src.braket_container.log_failure_and_exit")
+def test_node_setup_barrier_timeout(mock_log_failure, mpi_node, monkeypatch):
+    mock_log_failure.side_effect = SystemExit
+    monkeypatch.setenv("OMPI_COMM_WORLD_LOCAL_RANK", "1")
+    monkeypatch.setenv("AMZN_BRAKET_SETUP_BARRIER_TIMEOUT", "0.2")
+    with pytest.raises(SystemExit):
+        braket_container.wait_for_node_setup()
+    mock_log_failure.assert_called_once()
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_distribute_code_archive_over_loopback(tmp_path):
+    hosts = [f"127.0.0.{index}" for index in range(1, 6)]
+    port = _free_port()
+    archive = tmp_path / "source" / "code.tar.gz"
+    archive.parent.mkdir()
+    archive.write_bytes(make_tar_gz({"main.py": b"x = 1\n" * 1000}))
+    fetch_from_s3 = mock.Mock(return_value=str(archive))
+    results = {}
+
+    def run_host(host):
+        destination = tmp_path / host
+        destination.mkdir()
+        results[host] = braket_container.distribute_code_archive(
+            hosts, host, port, fetch_from_s3, str(destination), timeout=10, bind_address=host
+        )
+
+    threads = [threading.Thread(target=run_host, args=(host,)) for host in hosts]
+    for thread in reversed(threads):
+        thread.start()
+    for thread in threads:
+        thread.join(20)
+
+    fetch_from_s3.assert_called_once()
+    assert results[hosts[0]] == str(archive)
+    for host in hosts[1:]:
+        assert results[host] == str(tmp_path / host / "code.tar.gz")
+        assert Path(results[host]).read_bytes() == archive.read_bytes()
+
+
+def test_distribute_code_archive_falls_back_on_bad_hash(tmp_path):
+    port = _free_port()
+    archive = tmp_path / "code.py"
+    archive.write_text("x = 1\n")
+    server = braket_container.serve_code_archive(
+        str(archive), port, 3, bind_address="127.0.0.1", sha256="0" * 64
+    )
+    destination = tmp_path / "peer"
+    destination.mkdir()
+    fetch_from_s3 = mock.Mock(return_value="from_s3")
+    try:
+        with pytest.raises(RuntimeError):
+            braket_container.fetch_code_archive("127.0.0.1", port, str(destination), timeout=5)
+        server = braket_container.serve_code_archive(
+            str(archive), _free_port(), 1, bind_address="127.0.0.1", sha256="0" * 64
+        )
+        assert braket_container.distribute_code_archive(
+            ["127.0.0.1", "127.0.0.2"],
+            "127.0.0.2",
+            server.server_port,
+            fetch_from_s3,
+            str(destination),
+            timeout=0.2,
+        ) == "from_s3"
+    finally:
+        server.shutdown()
+    fetch_from_s3.assert_called_once()
+
+
+def test_serve_code_archive_counts_peers_not_fetches(tmp_path):
+    archive = tmp_path / "code.py"
+    archive.write_text("x = 1\n")
+    server = braket_container.serve_code_archive(str(archive), 0, 2, bind_address="127.0.0.1")
+    url = f"http://127.0.0.1:{server.server_port}"
+    try:
+        for _ in range(2):
+            with urllib.request.urlopen(f"{url}/archive", timeout=5) as response:
+                response.read()
+        destination = tmp_path / "peer"
+        destination.mkdir()
+        archive_path, _ = braket_container.fetch_code_archive(
+            "127.0.0.1", server.server_port, str(destination), timeout=5
+        )
+        assert Path(archive_path).read_text() == "x = 1\n"
+        urllib.request.urlopen(f"{url}/done", timeout=5).close()
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            try:
+                urllib.request.urlopen(f"{url}/manifest", timeout=1).close()
+            except OSError:
+                break
+            time.sleep(0.05)
+        else:
+            pytest.fail("server did not stop after every peer was done")
+    finally:
+        server.shutdown()
+
+
+def test_prepare_customer_code_distribution_skips_cache_lookup(code_paths, tmp_path, monkeypatch):
+    resource_config = tmp_path / "resourceconfig.json"
+    resource_config.write_text(json.dumps({"current_host": "algo-2", "hosts": ["algo-1", "algo-2"]}))
+    monkeypatch.setattr(braket_container, "RESOURCE_CONFIG_FILE", str(resource_config))
+    monkeypatch.setenv("AMZN_BRAKET_CODE_DISTRIBUTION", "1")
+    monkeypatch.setenv("AMZN_BRAKET_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(sys, "path", sys.path[:])
+    original, extracted = code_paths
+    code_file = original / "my_script.py"
+    code_file.write_text("x = 1\n")
+    s3_client = mock.Mock(head_object=mock.Mock(side_effect=AssertionError("HEAD sent")))
+    monkeypatch.setattr("src.braket_container.get_s3_client", lambda: s3_client)
+    with mock.patch.object(braket_container, "distribute_code_archive", return_value=str(code_file)):
+        braket_container.prepare_customer_code("s3://bucket/my_script.py", None)
+    s3_client.head_object.assert_not_called()
+    assert (extracted / "my_script.py").read_text() == "x = 1\n"
+
+
+def test_prepare_customer_code_uses_distribution(code_paths, tmp_path, monkeypatch):
+    resource_config = tmp_path / "resourceconfig.json"
+    resource_config.write_text(json.dumps({"current_host": "algo-2", "hosts": ["algo-1", "algo-2"]}))
+    monkeypatch.setattr(braket_container, "RESOURCE_CONFIG_FILE", str(resource_config))
+    monkeypatch.setenv("AMZN_BRAKET_CODE_DISTRIBUTION", "1")
+    monkeypatch.setattr(sys, "path", sys.path[:])
+    original, extracted = code_paths
+    code_file = original / "my_script.py"
+    code_file.write_text("x = 1\n")
+    with mock.patch.object(
+        braket_container, "distribute_code_archive", return_value=str(code_file)
+    ) as mock_distribute:
+        braket_container.prepare_customer_code("s3://bucket/my_script.py", None)
+    assert mock_distribute.call_args.args[:3] == (["algo-1", "algo-2"], "algo-2", 8471)
+    assert (extracted / "my_script.py").read_text() == "x = 1\n"
+
+
+def sweep_customer_method(x: int, scale: int):
+    if x == 2:
+        raise ValueError("bad x")
+    results_path = Path(os.environ["AMZN_BRAKET_JOB_RESULTS_DIR"])
+    (results_path / "result").write_text(str(x * scale))
+
+
+def test_run_sweep(code_paths, tmp_path, monkeypatch):
+    hp_file = tmp_path / "hps.json"
+    hp_file.write_text(json.dumps({"scale": "10", "AMZN_BRAKET_SWEEP": "[]"}))
+    monkeypatch.setenv("AMZN_BRAKET_HP_FILE", str(hp_file))
+    monkeypatch.setenv("AMZN_BRAKET_JOB_RESULTS_DIR", str(tmp_path / "results"))
+    monkeypatch.setenv("AMZN_BRAKET_SWEEP_PARALLELISM", "2")
+
+    exit_code = braket_container.run_sweep(
+        sweep_customer_method, [{"x": 1}, {"x": 2}, {"x": 3, "scale": 100}]
+    )
+
+    assert exit_code == 1
+    sweep_path = tmp_path / "results" / "sweep"
+    assert (sweep_path / "0" / "result").read_text() == "10"
+    assert (sweep_path / "2" / "result").read_text() == "300"
+    assert not (sweep_path / "1" / "result").exists()
+    assert [(sweep_path / str(run) / "exit_code").read_text() for run in range(3)] == [
+        "0", "1", "0"
+    ]
+    assert json.loads((sweep_path / "2" / "hyperparameters.json").read_text()) == {
+        "scale": "100", "x": "3"
+    }
+    summary = json.loads((sweep_path / "summary.json").read_text())
+    assert [(result["run"], result["exit_code"]) for result in summary] == [
+        (0, 0), (1, 1), (2, 0)
+    ]
+
+
+def test_run_sweep_module_entry_point_reads_hp_file(code_paths, tmp_path, monkeypatch):
+    original, extracted = code_paths
+    (extracted / "sweep_module.py").write_text(
+        "import json, os\n"
+        "with open(os.environ['AMZN_BRAKET_HP_FILE']) as hp_file:\n"
+        "    hyperparameters = json.load(hp_file)\n"
+        "with open(os.path.join(os.environ['AMZN_BRAKET_JOB_RESULTS_DIR'], 'result'), 'w') as f:\n"
+        "    f.write(hyperparameters['x'])\n"
+    )
+    monkeypatch.syspath_prepend(str(extracted))
+    hp_file = tmp_path / "hps.json"
+    hp_file.write_text(json.dumps({"x": "0"}))
+    monkeypatch.setenv("AMZN_BRAKET_HP_FILE", str(hp_file))
+    monkeypatch.setenv("AMZN_BRAKET_JOB_RESULTS_DIR", str(tmp_path / "results"))
+
+    customer_method = braket_container.extract_customer_code("sweep_module")
+    assert braket_container.run_sweep(customer_method, [{"x": 1}, {"x": 2}]) == 0
+
+    sweep_path = tmp_path / "results" / "sweep"
+    assert [(sweep_path / str(run) / "result").read_text() for run in range(2)] == ["1", "2"]
+
+
+def sleeping_sweep_method(seconds: int):
+    time.sleep(seconds)
+
+
+def test_run_sweep_forwards_shutdown_signals(code_paths, tmp_path, monkeypatch):
+    monkeypatch.delenv("AMZN_BRAKET_HP_FILE", raising=False)
+    monkeypatch.setenv("AMZN_BRAKET_JOB_RESULTS_DIR", str(tmp_path / "results"))
+    previous_handler = signal.getsignal(signal.SIGTERM)
+    timer = threading.Timer(0.5, os.kill, (os.getpid(), signal.SIGTERM))
+    timer.start()
+    start = time.time()
+
+    exit_code = braket_container.run_sweep(
+        sleeping_sweep_method, [{"seconds": 30}, {"seconds": 30}]
+    )
+
+    assert exit_code == 128 + signal.SIGTERM
+    assert time.time() - start < 10
+    summary = json.loads((tmp_path / "results" / "sweep" / "summary.json").read_text())
+    assert [result["run"] for result in summary] == [0]
+    assert signal.getsignal(signal.SIGTERM) is previous_handler
+
+
+def test_run_customer_executable_sweep(code_paths, tmp_path, monkeypatch):
+    original, extracted = code_paths
+    (extracted / "sweep.json").write_text(json.dumps([{"x": 1}, {"x": 3}]))
+    monkeypatch.setenv("AMZN_BRAKET_SWEEP", "sweep.json")
+    with mock.patch.object(braket_container, "run_sweep", return_value=0) as mock_run_sweep:
+        braket_container.run_customer_executable(sweep_customer_method)
+    mock_run_sweep.assert_called_once_with(sweep_customer_method, [{"x": 1}, {"x": 3}])
+
+
+@mock.patch("src.braket_container.log_failure_and_exit")
+def test_load_sweep_invalid(mock_log_failure, code_paths, monkeypatch):
+    mock_log_failure.side_effect = SystemExit
+    monkeypatch.setenv("AMZN_BRAKET_SWEEP", '{"x": 1}')
+    with pytest.raises(SystemExit):
+        braket_container.load_sweep()
+    mock_log_failure.assert_called_once()
+
+
+async def async_customer_method(count: int):
+    async def square(value):
+        await asyncio.sleep(0.01)
+        return value * value
+
+    results = await asyncio.gather(*(square(value) for value in range(count)))
+    return results, braket_container.get_event_loop_stats()
+
+
+def test_wrap_customer_code_runs_async_method(code_paths):
+    results, stats = wrap_customer_code(async_customer_method, count=5)
+    assert results == [0, 1, 4, 9, 16]
+    assert stats["tasks_created"] >= 6
+    assert stats["max_tasks_pending"] >= 5
+    assert not braket_container._event_loop_monitors
+
+
+@pytest.mark.parametrize(
+    "module_source",
+    (
+        "import asyncio\n"
+        "async def main():\n"
+        "    await asyncio.sleep(0)\n"
+        "    open('ran', 'a').write('main\\n')\n",
+        "import asyncio\n"
+        "async def main():\n"
+        "    await asyncio.sleep(0)\n"
+        "    open('ran', 'a').write('main\\n')\n"
+        "if __name__ == '__main__':\n"
+        "    asyncio.run(main())\n",
+        "import asyncio\n"
+        "async def main():\n"
+        "    await asyncio.sleep(0)\n"
+        "    open('ran', 'a').write('main\\n')\n"
+        "if __name__ == '__main__':\n"
+        "    with asyncio.Runner(loop_factory=asyncio.SelectorEventLoop) as runner:\n"
+        "        runner.run(main())\n",
+        "import asyncio\n"
+        "async def main():\n"
+        "    await asyncio.sleep(0)\n"
+        "    open('ran', 'a').write('main\\n')\n"
+        "asyncio.run(main())\n",
+    ),
+)
+def test_module_entry_point_async_main(module_source, code_paths, monkeypatch, capsys):
+    original, extracted = code_paths
+    (extracted / "async_entry.py").write_text(module_source)
+    monkeypatch.syspath_prepend(str(extracted))
+    previous_policy = asyncio.get_event_loop_policy()
+
+    wrap_customer_code(braket_container.extract_customer_code("async_entry"))
+
+    assert (extracted / "ran").read_text() == "main\n"
+    assert asyncio.get_event_loop_policy() is previous_policy
+    if "loop_factory" not in module_source:
+        assert "container_event_loop_tasks=" in capsys.readouterr().out
+
+
+def test_module_entry_point_sync_keeps_event_loop_policy(code_paths, monkeypatch, capsys):
+    original, extracted = code_paths
+    (extracted / "sync_entry.py").write_text(
+        "import asyncio\n"
+        "async def work():\n"
+        "    return type(asyncio.get_event_loop_policy()).__name__\n"
+        "policy = asyncio.run(work())\n"
+    )
+    monkeypatch.syspath_prepend(str(extracted))
+
+    module_globals = braket_container.run_module_entry_point("sync_entry")
+
+    assert module_globals["policy"] != "_ManagedEventLoopPolicy"
+    assert "container_event_loop_tasks=" not in capsys.readouterr().out
+
+
+def test_run_coroutine_uses_uvloop_when_installed(monkeypatch):
+    fake_uvloop = mock.Mock()
+    fake_uvloop.new_event_loop.side_effect = asyncio.SelectorEventLoop
+    monkeypatch.setitem(sys.modules, "uvloop", fake_uvloop)
+
+    async def answer():
+        return 42
+
+    assert braket_container.run_coroutine(answer()) == 42
+    fake_uvloop.new_event_loop.assert_called_once()
+
+    monkeypatch.setenv("AMZN_BRAKET_DISABLE_UVLOOP", "1")
+    assert braket_container.run_coroutine(answer()) == 42
+    fake_uvloop.new_event_loop.assert_called_once()
+
+
+@pytest.fixture
+def bytecode_cache(code_paths, monkeypatch):
+    monkeypatch.setenv("AMZN_BRAKET_BYTECODE_CACHE", "1")
+    monkeypatch.setattr(sys, "pycache_prefix", None)
+    monkeypatch.setattr(sys, "dont_write_bytecode", True)
+    monkeypatch.delenv("PYTHONPYCACHEPREFIX", raising=False)
+    monkeypatch.setenv("PYTHONDONTWRITEBYTECODE", "1")
+    return code_paths
+
+
+def test_compile_customer_code(bytecode_cache, capsys):
+    original, extracted = bytecode_cache
+    (extracted / "pkg").mkdir()
+    (extracted / "pkg" / "__init__.py").write_text("")
+    (extracted / "pkg" / "module.py").write_text("x = 1\n")
+    (extracted / "broken.py").write_text("def broken(:\n")
+
+    braket_container.compile_customer_code()
+
+    prefix = Path(os.environ["AMZN_BRAKET_CACHE_DIR"]) / "bytecode"
+    assert sys.pycache_prefix == str(prefix)
+    assert os.environ["PYTHONPYCACHEPREFIX"] == str(prefix)
+    assert "PYTHONDONTWRITEBYTECODE" not in os.environ
+    pyc = Path(importlib.util.cache_from_source(str(extracted / "pkg" / "module.py")))
+    assert pyc.is_relative_to(prefix)
+    # hash-based pyc: flags field set
+    assert int.from_bytes(pyc.read_bytes()[4:8], "little") & 0b1
+    assert not Path(importlib.util.cache_from_source(str(extracted / "broken.py"))).exists()
+    assert "Compiled 2 of 3 customer modules" in capsys.readouterr().out
+
+    braket_container.compile_customer_code()
+    assert "Bytecode for the customer code is cached" in capsys.readouterr().out
+
+    # Another job extracted to the same path overwrites the bytecode of pkg/module.py.
+    (extracted / "pkg" / "module.py").write_text("x = 2\n")
+    braket_container.compile_customer_code()
+    assert "Compiled 2 of 3 customer modules" in capsys.readouterr().out
+    (extracted / "pkg" / "module.py").write_text("x = 1\n")
+    braket_container.compile_customer_code()
+    output = capsys.readouterr().out
+    assert "Bytecode of 1 cached customer modules was overwritten" in output
+    assert "Compiled 1 of 1 customer modules" in output
+    source_hash = importlib.util.source_hash(b"x = 1\n")
+    assert pyc.read_bytes()[8:16] == source_hash
+    braket_container.compile_customer_code()
+    assert "Bytecode for the customer code is cached" in capsys.readouterr().out
+
+
+def test_compile_customer_code_disabled(code_paths):
+    with mock.patch("src.braket_container.ProcessPoolExecutor") as mock_executor:
+        braket_container.compile_customer_code()
+    mock_executor.assert_not_called()
+
+
+@pytest.fixture
+def setup_script(tmp_path, monkeypatch):
+    setup_path = tmp_path / "additional_setup"
+    monkeypatch.setattr(braket_container, "SETUP_SCRIPT_PATH", str(setup_path))
+    counter = tmp_path / "runs.txt"
+    script = tmp_path / "setup.sh"
+    script.write_text(f"#!/bin/sh\necho ran >> {counter}\n")
+    monkeypatch.setenv("AMZN_BRAKET_IMAGE_SETUP_SCRIPT", str(script))
+    return script, counter, setup_path
+
+
+def test_run_image_setup_script_once_per_content(setup_script):
+    script, counter, setup_path = setup_script
+    braket_container.run_image_setup_script()
+    braket_container.run_image_setup_script()
+    assert counter.read_text().splitlines() == ["ran"]
+
+    script.write_text(script.read_text() + "true\n")
+    braket_container.run_image_setup_script()
+    assert counter.read_text().splitlines() == ["ran", "ran"]
+    markers = sorted(setup_path.glob("*.done"))
+    assert len(markers) == 2
+    assert json.loads(markers[0].read_text())["script"] == str(script)
+    assert [path for path in setup_path.iterdir() if path.is_dir()] == []
+
+
+def test_run_image_setup_script_failure(setup_script, capsys):
+    script, counter, setup_path = setup_script
+    script.write_text("#!/bin/sh\nexit 3\n")
+    braket_container.run_image_setup_script()
+    assert "Unable to install additional libraries." in capsys.readouterr().out
+    assert list(setup_path.glob("*.done")) == []
+
+
+def test_run_image_setup_script_from_s3(setup_script, monkeypatch):
+    script, counter, setup_path = setup_script
+    monkeypatch.setenv("AMZN_BRAKET_IMAGE_SETUP_SCRIPT", "s3://bucket/setup.sh")
+
+    def fake_download(s3_uri, local_path_dir):
+        destination = os.path.join(local_path_dir, "setup.sh")
+        shutil.copy(script, destination)
+        return destination
+
+    with mock.patch("src.braket_container.download_s3_file", side_effect=fake_download):
+        braket_container.run_image_setup_script()
+        braket_container.run_image_setup_script()
+    assert counter.read_text().splitlines() == ["ran"]
+
+
+def test_run_image_setup_script_unset(tmp_path, monkeypatch):
+    monkeypatch.delenv("AMZN_BRAKET_IMAGE_SETUP_SCRIPT", raising=False)
+    monkeypatch.setattr(braket_container, "SETUP_SCRIPT_PATH", str(tmp_path / "setup"))
+    braket_container.run_image_setup_script()
+    assert not (tmp_path / "setup").exists()
+
+
+@pytest.fixture
+def import_profiler(code_paths, tmp_path, monkeypatch):
+    monkeypatch.setenv("AMZN_BRAKET_IMPORT_PROFILE", "1")
+    monkeypatch.setattr(sys, "meta_path", sys.meta_path[:])
+    monkeypatch.setattr(braket_container, "_import_profiler", None)
+    monkeypatch.setattr(
+        braket_container, "IMPORT_PROFILE_FILE", str(tmp_path / "output" / "imports.json")
+    )
+    modules = tmp_path / "modules"
+    (modules / "slowpkg").mkdir(parents=True)
+    (modules / "slowpkg" / "__init__.py").write_text("from slowpkg import sub\n")
+    (modules / "slowpkg" / "sub.py").write_text(
+        "import time\ntime.sleep(0.05)\nimport otherpkg\n"
+    )
+    (modules / "otherpkg.py").write_text("import time\ntime.sleep(0.05)\n")
+    (modules / "customerpkg.py").write_text("import time\ntime.sleep(0.02)\n")
+    monkeypatch.syspath_prepend(str(modules))
+    yield braket_container.start_import_profiler()
+    for name in ("slowpkg", "slowpkg.sub", "otherpkg", "customerpkg"):
+        sys.modules.pop(name, None)
+
+
+def test_import_profiler(import_profiler):
+    importlib.import_module("slowpkg")
+
+    modules = import_profiler.modules
+    packages = import_profiler.packages
+    assert modules["slowpkg.sub"]["cumulative"] >= 0.1
+    assert 0.05 <= modules["slowpkg.sub"]["self"] < modules["slowpkg.sub"]["cumulative"]
+    assert modules["slowpkg"]["cumulative"] >= modules["slowpkg.sub"]["cumulative"]
+    assert packages["slowpkg"]["cumulative"] >= 0.1
+    assert packages["slowpkg"]["self"] < packages["slowpkg"]["cumulative"]
+    assert packages["otherpkg"]["cumulative"] >= 0.05
+
+
+class SharedLoaderFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+    """Finds fake_a and fake_b with one loader instance, like a zipimporter."""
+
+    def find_spec(self, name, path, target=None):
+        if name in ("fake_a", "fake_b"):
+            return importlib.util.spec_from_loader(name, self)
+        return None
+
+    def exec_module(self, module):
+        time.sleep(0.2 if module.__name__ == "fake_b" else 0.0)
+
+
+def test_import_profiler_shared_loader(import_profiler, monkeypatch):
+    sys.meta_path.append(SharedLoaderFinder())
+    try:
+        importlib.import_module("fake_a")
+        importlib.import_module("fake_b")
+    finally:
+        sys.modules.pop("fake_a", None)
+        sys.modules.pop("fake_b", None)
+
+    assert import_profiler.modules["fake_b"]["self"] >= 0.2
+    assert import_profiler.modules["fake_a"]["self"] < 0.2
+
+
+def customer_method_importing():
+    importlib.import_module("customerpkg")
+
+
+def test_write_import_profile_includes_customer_process(import_profiler, monkeypatch):
+    monkeypatch.setenv("AMZN_BRAKET_IMPORT_PROFILE_TOP", "2")
+    importlib.import_module("slowpkg")
+    process = multiprocessing.get_context("fork").Process(
+        target=wrap_customer_code, args=(customer_method_importing,)
+    )
+    process.start()
+    process.join(30)
+    assert process.exitcode == 0
+
+    report = braket_container.write_import_profile()
+
+    assert report == json.loads(Path(braket_container.IMPORT_PROFILE_FILE).read_text())
+    container_packages = [package["package"] for package in report["container"]["packages"]]
+    assert container_packages == ["slowpkg", "otherpkg"]
+    assert len(report["container"]["modules"]) == 2
+    customer_packages = [package["package"] for package in report["customer"]["packages"]]
+    assert customer_packages[0] == "customerpkg"
+    assert "slowpkg" not in customer_packages
+
+
+def busy_customer_method(fail: bool = False):
+    data = []
+    deadline = time.time() + 0.2
+    while time.time() < deadline:
+        data.append(sum(range(1000)))
+    if fail:
+        raise RuntimeError("customer failure")
+    return len(data)
+
+
+@pytest.mark.parametrize("fail", (False, True))
+def test_wrap_customer_code_profilers(fail, code_paths, tmp_path, monkeypatch):
+    profile_path = tmp_path / "profile"
+    monkeypatch.setattr(braket_container, "PROFILE_OUTPUT_PATH", str(profile_path))
+    monkeypatch.setenv("AMZN_BRAKET_PROFILER", "cprofile, sampler,tracemalloc,unknown")
+
+    if fail:
+        with pytest.raises(RuntimeError):
+            wrap_customer_code(busy_customer_method, fail=True)
+    else:
+        assert wrap_customer_code(busy_customer_method) > 0
+
+    prefix = profile_path / f"{os.getpid()}-"
+    stats = pstats.Stats(f"{prefix}cprofile.pstats")
+    assert any(function[2] == "busy_customer_method" for function in stats.stats)
+    stacks = Path(f"{prefix}stacks.txt").read_text().splitlines()
+    assert stacks and "busy_customer_method" in stacks[0]
+    assert re.fullmatch(r"\S+ \d+", stacks[0])
+    tracemalloc_report = Path(f"{prefix}tracemalloc.txt").read_text()
+    assert tracemalloc_report.startswith("Current traced memory:")
+    assert "test_braket_container.py" in tracemalloc_report
+    assert not tracemalloc.is_tracing()
+
+
+def test_wrap_customer_code_without_profiler(code_paths, tmp_path, monkeypatch):
+    monkeypatch.setattr(braket_container, "PROFILE_OUTPUT_PATH", str(tmp_path / "profile"))
+    assert wrap_customer_code(busy_customer_method) > 0
+    assert not (tmp_path / "profile").exists()